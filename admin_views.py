@@ -0,0 +1,167 @@
+# Admin pages: users, audit log, dashboard, metrics, reorder suggestions,
+# data export and backups
+
+import hmac
+import os
+import tempfile
+from datetime import datetime
+from flask import Blueprint, current_app, request, render_template, redirect, url_for, session, flash, Response, stream_with_context, jsonify, abort, send_file
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from models import db, User, AuditLog, Supplier, SupplierOrder
+from auth import login_required
+from dashboard import dashboard_context
+import audit
+import backup
+import exports
+import metrics
+import refdata
+import reorder
+
+bp = Blueprint('admin', __name__)
+
+@bp.route('/admin/users')
+@login_required(role='admin')
+def user_list():
+    users = User.query.all()
+    return render_template('user_list.html', users=users)
+
+@bp.route('/admin/users/edit/<int:user_id>', methods=['GET', 'POST'])
+@login_required(role='admin')
+def edit_user(user_id):
+    user = User.query.get_or_404(user_id)
+    if request.method == 'POST':
+        if user.id == session['user_id']:
+            flash("You can't change your own role.", 'danger')
+            return redirect(url_for('admin.user_list'))
+        user.role = request.form['role']
+        db.session.commit()
+        audit.log(f'Changed role of {user.username} to {user.role}')
+        flash('User role updated.', 'success')
+        return redirect(url_for('admin.user_list'))
+    return render_template('edit_user.html', user=user)
+
+@bp.route('/admin/users/delete/<int:user_id>')
+@login_required(role='admin')
+def delete_user(user_id):
+    user = User.query.get_or_404(user_id)
+    if user.id == session['user_id']:
+        flash("You can't delete your own account.", 'danger')
+        return redirect(url_for('admin.user_list'))
+    db.session.delete(user)
+    db.session.commit()
+    audit.log(f'Deleted user {user.username}')
+    flash('User deleted.', 'success')
+    return redirect(url_for('admin.user_list'))
+
+AUDIT_PAGE_SIZE = 50
+
+@bp.route('/admin/audit-logs')
+@login_required(role='admin')
+def audit_logs():
+    # Keyset pagination on id, newest first: ?before=<id of the last row shown>
+    query = AuditLog.query.options(joinedload(AuditLog.user)).order_by(AuditLog.id.desc())
+    before = request.args.get('before', type=int)
+    if before:
+        query = query.filter(AuditLog.id < before)
+    logs = query.limit(AUDIT_PAGE_SIZE + 1).all()
+    next_before = logs[AUDIT_PAGE_SIZE - 1].id if len(logs) > AUDIT_PAGE_SIZE else None
+    return render_template('audit_logs.html', logs=logs[:AUDIT_PAGE_SIZE], next_before=next_before, before=before)
+
+@bp.route('/admin/dashboard')
+@login_required(role='admin')
+def admin_dashboard():
+    return render_template('admin_dashboard.html', **dashboard_context())
+
+def metrics_response():
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+    if request.args.get('format') == 'json':
+        return jsonify(metrics.to_dict())
+    return Response(metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/admin/metrics')
+def admin_metrics():
+    # Admins, or a Prometheus scraper sending the METRICS_TOKEN bearer token
+    token = current_app.config['METRICS_TOKEN']
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return metrics_response()
+    return login_required(role='admin')(metrics_response)()
+
+@bp.route('/admin/reorder')
+@login_required(role='admin')
+def reorder_page():
+    # Draft orders are listed separately so they can be placed per supplier
+    drafts = dict(db.session.query(SupplierOrder.supplier_id, func.count(SupplierOrder.id)).filter(
+        SupplierOrder.status == 'Draft'
+    ).group_by(SupplierOrder.supplier_id).all())
+    return render_template('reorder.html', groups=reorder.suggestions(), drafts=drafts, suppliers=refdata.get().supplier_names)
+
+@bp.route('/admin/reorder/drafts', methods=['POST'])
+@login_required(role='admin')
+def create_reorder_drafts():
+    supplier_id = request.form.get('supplier_id', type=int)
+    created = reorder.create_drafts([supplier_id] if supplier_id else None)
+    total = sum(created.values())
+    if total:
+        audit.log(f'Created {total} draft supplier orders for {len(created)} suppliers')
+        flash(f'Created {total} draft orders for {len(created)} suppliers.', 'success')
+    else:
+        flash('Nothing to reorder.', 'info')
+    return redirect(url_for('admin.reorder_page'))
+
+@bp.route('/admin/reorder/place/<int:supplier_id>', methods=['POST'])
+@login_required(role='admin')
+def place_reorder_drafts(supplier_id):
+    supplier = Supplier.query.get_or_404(supplier_id)
+    placed = reorder.place_drafts(supplier.id)
+    audit.log(f'Placed {placed} draft orders with supplier #{supplier.id} {supplier.name}')
+    flash(f'Placed {placed} orders with {supplier.name}.', 'success')
+    return redirect(url_for('admin.reorder_page'))
+
+@bp.route('/admin/export')
+@login_required(role='admin')
+def export_data():
+    columns, header = ['id', 'name', 'selling_price', 'stock', 'unit'], ['ID', 'Name', 'Price', 'Stock', 'Unit']
+    if request.args.get('columns'):
+        try:
+            columns = header = exports.parse_columns(request.args['columns'], exports.PRODUCT_COLUMNS, columns)
+        except ValueError as e:
+            return str(e), 400
+    return exports.product_export(columns, header=header, filename='products_export.csv', gzip=request.args.get('gzip') == '1')
+
+@bp.route('/admin/backup')
+@login_required(role='admin')
+def backup_data():
+    stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+    if request.args.get('format') == 'sqlite':
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        try:
+            backup.snapshot(path)
+            return send_file(open(path, 'rb'), mimetype='application/vnd.sqlite3', as_attachment=True, download_name=f'duka_{stamp}.db')
+        finally:
+            os.remove(path)
+
+    since_ids = {
+        table: request.args[f'since_{table}_id']
+        for table in backup.INCREMENTAL if request.args.get(f'since_{table}_id', '').isdigit()
+    }
+    since = None
+    if request.args.get('since'):
+        try:
+            since = datetime.fromisoformat(request.args['since'])
+        except ValueError:
+            return 'since must be an ISO date or timestamp', 400
+    lines = backup.dump(since_ids=since_ids, since=since)
+    filename = f"duka_backup_{'incremental' if since_ids or since else 'full'}_{stamp}.ndjson"
+    mimetype = 'application/x-ndjson'
+    if request.args.get('gzip') == '1':
+        lines = exports.gzip_chunks(lines)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    return Response(
+        stream_with_context(lines),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
@@ -0,0 +1,155 @@
+# Audit logging
+# log() only puts an entry on a bounded in-process queue, so recording an
+# action never adds a write or a lock to the request that performed it.
+# Entries are written in batches, one multi-row INSERT on a separate
+# connection, either by a background writer thread (AUDIT_MODE='thread') or
+# at the end of each request (AUDIT_MODE='teardown'). When the queue is full,
+# log() waits briefly and then writes a batch itself (backpressure), so
+# entries are never dropped. A batch that cannot be written (the database is
+# locked past the retries, or down) is kept in memory and goes first in the
+# next batch. Whatever is still queued is written at exit; only entries that
+# still cannot be written then are lost, and they are logged.
+# Each app has its own queue and writer (AuditWriter) bound to its engine.
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from flask import current_app, has_app_context, has_request_context, session
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from models import db, AuditLog
+from stock import is_lock_error, LOCK_RETRIES, LOCK_BACKOFF
+
+logger = logging.getLogger(__name__)
+
+
+class AuditWriter:
+    # The queue and writer of one app, kept in app.extensions['audit'] so
+    # every app writes to its own database
+
+    def __init__(self, app):
+        with app.app_context():
+            self.engine = db.engine
+        self.queue = queue.Queue(maxsize=app.config['AUDIT_QUEUE_SIZE'])
+        self.mode = app.config['AUDIT_MODE']
+        self.batch_size = app.config['AUDIT_BATCH_SIZE']
+        self.flush_interval = app.config['AUDIT_FLUSH_INTERVAL']
+        self.put_timeout = app.config['AUDIT_PUT_TIMEOUT']
+        self.failed = []  # entries of a batch that could not be written, retried first
+        self.thread = None
+        self.thread_pid = None
+        self.stopping = threading.Event()
+        self.write_lock = threading.Lock()
+
+    def log(self, entry):
+        if self.mode == 'thread':
+            self._ensure_thread()
+        try:
+            self.queue.put(entry, timeout=self.put_timeout)
+        except queue.Full:
+            # The writer is behind: make room by writing a batch on this thread
+            self.flush(limit=self.batch_size)
+            self.queue.put(entry)
+
+    def _take(self, limit):
+        entries = []
+        while len(entries) < limit:
+            try:
+                entries.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return entries
+
+    def _write(self, entries):
+        # Called with write_lock held; entries that cannot be written are
+        # kept in self.failed. Returns whether they were written.
+        entries = self.failed + entries
+        self.failed = []
+        for attempt in range(LOCK_RETRIES + 1):
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(insert(AuditLog), entries)
+                return True
+            except Exception as e:
+                if not (isinstance(e, OperationalError) and is_lock_error(e)) or attempt == LOCK_RETRIES:
+                    logger.exception('Could not write %d audit log entries; retrying with the next batch', len(entries))
+                    self.failed = entries
+                    return False
+                time.sleep(LOCK_BACKOFF * (2 ** attempt))
+
+    def flush(self, limit=None):
+        # Writes queued entries (at most limit) and returns how many were written
+        written = 0
+        with self.write_lock:
+            while limit is None or written < limit:
+                entries = self._take(self.batch_size if limit is None else min(self.batch_size, limit - written))
+                if not entries and not self.failed:
+                    break
+                count = len(self.failed) + len(entries)
+                if not self._write(entries):
+                    break
+                written += count
+        return written
+
+    def _run(self):
+        while not self.stopping.is_set():
+            try:
+                entries = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                if not self.failed:
+                    continue
+                entries = []
+            with self.write_lock:
+                self._write(entries + self._take(self.batch_size - len(entries)))
+
+    def _ensure_thread(self):
+        # Started lazily so each forked worker process gets its own thread
+        if self.thread is not None and self.thread_pid == os.getpid() and self.thread.is_alive():
+            return
+        with self.write_lock:
+            if self.thread is None or self.thread_pid != os.getpid() or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self.thread_pid = os.getpid()
+                self.thread.start()
+
+    def shutdown(self):
+        self.stopping.set()
+        if self.thread is not None and self.thread_pid == os.getpid():
+            self.thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+        if self.failed:
+            logger.error('Dropping %d audit log entries that could not be written', len(self.failed))
+
+
+def init_app(app):
+    writer = app.extensions['audit'] = AuditWriter(app)
+    if writer.mode == 'teardown':
+        app.teardown_request(lambda exc: writer.flush())
+    atexit.register(writer.shutdown)
+
+
+def _writer():
+    return current_app.extensions.get('audit') if has_app_context() else None
+
+
+def log(action, user_id=None):
+    writer = _writer()
+    if writer is None:
+        return
+    if user_id is None and has_request_context():
+        user_id = session.get('user_id')
+    writer.log({'user_id': user_id, 'action': action[:255], 'timestamp': datetime.utcnow()})
+
+
+def flush(limit=None):
+    writer = _writer()
+    return writer.flush(limit) if writer is not None else 0
+
+
+def pending():
+    writer = _writer()
+    return writer.queue.qsize() + len(writer.failed) if writer is not None else 0
@@ -0,0 +1,65 @@
+# Sign-up, login and logout, and the login_required decorator every other
+# blueprint uses
+
+from functools import wraps
+from flask import Blueprint, request, render_template, redirect, url_for, session, flash
+from models import db, User
+import audit
+
+bp = Blueprint('auth', __name__)
+
+
+def login_required(role=None):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if 'user_id' not in session:
+                return redirect(url_for('auth.login'))
+            if role and session.get('role') != role:
+                flash('You do not have permission to access this page.', 'danger')
+                return redirect(url_for('home'))
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+@bp.route('/signup', methods=['GET', 'POST'])
+def signup():
+    if request.method == 'POST':
+        username = request.form['username']
+        password = request.form['password']
+        role = request.form.get('role', 'staff')
+        if User.query.filter_by(username=username).first():
+            flash('Username already exists.', 'danger')
+            return redirect(url_for('auth.signup'))
+        user = User(username=username, role=role)
+        user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+        audit.log(f'Signed up as {username} ({role})', user_id=user.id)
+        flash('Account created! Please log in.', 'success')
+        return redirect(url_for('auth.login'))
+    return render_template('signup.html')
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form['username']
+        password = request.form['password']
+        user = User.query.filter_by(username=username).first()
+        if user and user.check_password(password):
+            session['user_id'] = user.id
+            session['username'] = user.username
+            session['role'] = user.role
+            audit.log('Logged in')
+            flash('Logged in successfully!', 'success')
+            return redirect(url_for('products.products_page'))
+        flash('Invalid username or password.', 'danger')
+    return render_template('login.html')
+
+@bp.route('/logout')
+def logout():
+    if 'user_id' in session:
+        audit.log('Logged out')
+    session.clear()
+    flash('Logged out.', 'info')
+    return redirect(url_for('home'))
@@ -0,0 +1,290 @@
+# Backup and restore
+# dump() streams the database as NDJSON, one table at a time, from a single
+# read transaction so the backup is a consistent snapshot. Each table starts
+# with a header line naming its columns, followed by one JSON array per row:
+#
+#   {"type": "meta", "format": 1, "mode": "full", "created_at": "...", ...}
+#   {"type": "table", "table": "product", "columns": ["id", "name", ...]}
+#   [1, "Milk", ...]
+#   {"type": "end", "max_ids": {"sale": 812, ...}, "rows": 1234}
+#
+# An incremental dump holds only the append-only rows (sales, audit log,
+# product history) newer than a given id or timestamp, plus full copies of
+# the small reference tables. restore() loads a full dump and then any
+# incrementals in order, optionally stopping at a point in time. Each file
+# is read twice: once to check every line, then to load it in a single
+# transaction, so a corrupt or truncated file changes nothing. Under WAL that
+# transaction needs free disk space of about the size of the restored data.
+# Rows keep their ids; on PostgreSQL the id sequences are then moved past
+# them.
+# snapshot() copies a live SQLite database with the online backup API.
+
+import gzip
+import io
+import json
+import sqlite3
+import time
+from datetime import datetime, date
+from sqlalchemy import select, insert, delete, DateTime, Date
+from database import IN_CHUNK
+from models import db, Category, Supplier, User, Setting, Product, Sale, SupplierOrder, ProductHistory, AuditLog
+import rollups
+import reorder
+import search
+import settings
+import refdata
+import supplier_analytics
+import product_model
+
+FORMAT_VERSION = 1
+BATCH_SIZE = 1000
+YIELD_PER = 1000
+
+# Restore order respects foreign keys; rollups, reorder points and the
+# search index are rebuilt after a restore instead of being backed up
+TABLES = [Category, Supplier, User, Setting, Product, Sale, SupplierOrder, ProductHistory, AuditLog]
+
+# Append-only tables and the column used for time-based increments
+INCREMENTAL = {
+    'sale': 'timestamp',
+    'audit_log': 'timestamp',
+    'product_history': 'timestamp',
+}
+
+# Columns compared against restore(until=...)
+POINT_IN_TIME = dict(INCREMENTAL, supplier_order='order_date')
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Cannot serialise {type(value).__name__}')
+
+
+def _line(obj):
+    return (json.dumps(obj, default=_json_default, separators=(',', ':')) + '\n').encode()
+
+
+def dump(since_ids=None, since=None):
+    # Yields NDJSON lines as bytes. since_ids maps table name -> last id
+    # already backed up; since is a datetime. Either makes the dump incremental.
+    since_ids = since_ids or {}
+    incremental = bool(since_ids or since)
+    started = time.perf_counter()
+    with db.engine.connect() as conn:
+        if conn.dialect.name == 'sqlite':
+            # pysqlite does not open a transaction for SELECTs on its own
+            conn.exec_driver_sql('BEGIN')
+        else:
+            conn = conn.execution_options(isolation_level='REPEATABLE READ')
+        yield _line({
+            'type': 'meta',
+            'format': FORMAT_VERSION,
+            'mode': 'incremental' if incremental else 'full',
+            'created_at': datetime.utcnow(),
+            'since_ids': since_ids,
+            'since': since,
+        })
+        max_ids = {}
+        total = 0
+        for model in TABLES:
+            table = model.__table__
+            statement = select(table).order_by(*table.primary_key.columns)
+            name = table.name
+            if incremental and name in INCREMENTAL:
+                if name in since_ids:
+                    statement = statement.where(table.c.id > int(since_ids[name]))
+                if since is not None:
+                    statement = statement.where(table.c[INCREMENTAL[name]] >= since)
+            yield _line({'type': 'table', 'table': name, 'columns': [c.name for c in table.columns]})
+            result = conn.execution_options(yield_per=YIELD_PER, stream_results=True).execute(statement)
+            for row in result:
+                total += 1
+                yield _line(list(row))
+            if 'id' in table.c:
+                max_ids[name] = conn.execute(select(db.func.max(table.c.id))).scalar() or 0
+        conn.rollback()
+    yield _line({'type': 'end', 'max_ids': max_ids, 'rows': total, 'seconds': round(time.perf_counter() - started, 3)})
+
+
+def snapshot(path):
+    # Consistent copy of a live SQLite database using the online backup API
+    if db.engine.dialect.name != 'sqlite':
+        raise RuntimeError('Snapshots are only available for SQLite databases.')
+    started = time.perf_counter()
+    raw = db.engine.raw_connection()
+    try:
+        target = sqlite3.connect(path)
+        try:
+            # Copy in steps so writers are not blocked for the whole backup
+            raw.driver_connection.backup(target, pages=4096)
+        finally:
+            target.close()
+    finally:
+        raw.close()
+    return time.perf_counter() - started
+
+
+def open_backup(fileobj):
+    # Text line iterator over a plain or gzip-compressed NDJSON backup
+    head = fileobj.read(2)
+    fileobj.seek(0)
+    if head == b'\x1f\x8b':
+        fileobj = gzip.GzipFile(fileobj=fileobj)
+    return io.TextIOWrapper(fileobj, encoding='utf-8')
+
+
+def _converters(table, columns):
+    converters = []
+    for name in columns:
+        column_type = table.c[name].type
+        if isinstance(column_type, DateTime):
+            converters.append(lambda v: datetime.fromisoformat(v) if v else None)
+        elif isinstance(column_type, Date):
+            converters.append(lambda v: date.fromisoformat(v) if v else None)
+        else:
+            converters.append(None)
+    return converters
+
+
+def _records(fileobj, until=None):
+    # Parses a backup file, yielding ('meta', record), ('table', table) and
+    # ('row', {column: value}) in file order. Raises ValueError naming the
+    # line for anything malformed, including a file cut short before its
+    # end record. Rows newer than `until` are skipped.
+    tables = {model.__table__.name: model.__table__ for model in TABLES}
+    lines = open_backup(fileobj)
+    meta = table = columns = converters = time_column = None
+    rows = 0
+    try:
+        for number, text_line in enumerate(lines, 1):
+            try:
+                record = json.loads(text_line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f'Line {number}: {e.msg}') from None
+            if isinstance(record, dict):
+                kind = record.get('type')
+                if kind == 'meta':
+                    if record.get('format') != FORMAT_VERSION:
+                        raise ValueError(f"Unsupported backup format {record.get('format')!r}")
+                    meta = record
+                    yield 'meta', record
+                elif kind == 'table':
+                    if meta is None:
+                        raise ValueError(f'Line {number}: table header found before the meta line')
+                    table = tables.get(record.get('table'))
+                    if table is None:
+                        raise ValueError(f"Line {number}: unknown table {record.get('table')!r} in backup")
+                    columns = record.get('columns') or []
+                    unknown = [name for name in columns if name not in table.c]
+                    if unknown:
+                        raise ValueError(f"Line {number}: unknown columns {', '.join(map(str, unknown))} for {table.name}")
+                    converters = _converters(table, columns)
+                    time_column = POINT_IN_TIME.get(table.name) if until is not None else None
+                    yield 'table', table
+                elif kind == 'end':
+                    if record.get('rows') != rows:
+                        raise ValueError(f"Line {number}: backup holds {rows} rows but its end record says {record.get('rows')}")
+                    return
+                continue
+            if table is None:
+                raise ValueError(f'Line {number}: row found before any table header')
+            if not isinstance(record, list) or len(record) != len(columns):
+                raise ValueError(f'Line {number}: expected a list of {len(columns)} values for {table.name}')
+            try:
+                row = {
+                    name: (convert(value) if convert and value is not None else value)
+                    for name, value, convert in zip(columns, record, converters)
+                }
+            except (TypeError, ValueError) as e:
+                raise ValueError(f'Line {number}: {e}') from None
+            rows += 1
+            if time_column in row and row[time_column] is not None and row[time_column] > until:
+                continue
+            yield 'row', row
+        raise ValueError('Backup is incomplete: it ends before its end record')
+    finally:
+        # Leave the caller's file open
+        lines.detach()
+
+
+def _reset_sequences():
+    # Rows keep their backed-up ids, so on PostgreSQL each id sequence is
+    # moved past the highest restored id; SQLite derives the next id itself
+    dialect = db.session.get_bind().dialect
+    if dialect.name != 'postgresql':
+        return
+    for model in TABLES:
+        table = model.__table__
+        if 'id' not in table.c:
+            continue
+        db.session.execute(
+            select(db.func.setval(
+                # Quoted, since "user" is a reserved word
+                db.func.pg_get_serial_sequence(dialect.identifier_preparer.format_table(table), 'id'),
+                select(db.func.coalesce(db.func.max(table.c.id), 0) + 1).scalar_subquery(),
+                False,
+            ))
+        )
+
+
+def restore(fileobj, replace=None, until=None):
+    # Loads one backup file. A full backup replaces existing rows unless
+    # replace=False; an incremental one upserts by primary key. Rows newer
+    # than `until` (a datetime) are skipped for point-in-time restores.
+    # Returns {'tables': {name: rows}, 'rows': n, 'seconds': s}.
+    started = time.perf_counter()
+    for _ in _records(fileobj, until):
+        pass  # check the whole file before deleting anything
+    fileobj.seek(0)
+
+    counts = {}
+    table = None
+    full = True
+    batch = []
+
+    def flush():
+        if not batch:
+            return
+        if 'id' in table.c and not full:
+            ids = [row['id'] for row in batch]
+            for start in range(0, len(ids), IN_CHUNK):
+                db.session.execute(delete(table).where(table.c.id.in_(ids[start:start + IN_CHUNK])))
+        db.session.execute(insert(table), batch)
+        counts[table.name] = counts.get(table.name, 0) + len(batch)
+        batch.clear()
+
+    try:
+        for kind, value in _records(fileobj, until):
+            if kind == 'meta':
+                full = value.get('mode') == 'full'
+                if replace is None:
+                    replace = full
+                if replace:
+                    for model in reversed(TABLES):
+                        db.session.execute(delete(model.__table__))
+            elif kind == 'table':
+                flush()
+                table = value
+            else:
+                batch.append(value)
+                if len(batch) >= BATCH_SIZE:
+                    flush()
+        flush()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    _reset_sequences()
+    db.session.commit()
+
+    # Derived tables and caches are rebuilt only once the restore is committed
+    settings.invalidate()
+    refdata.invalidate()
+    supplier_analytics.invalidate()
+    product_model.invalidate()
+    rollups.rebuild()
+    reorder.refresh()
+    search.rebuild()
+    db.session.commit()
+    return {'tables': counts, 'rows': sum(counts.values()), 'seconds': time.perf_counter() - started}
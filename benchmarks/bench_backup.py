@@ -0,0 +1,124 @@
+# Backup and restore timings
+# Seeds a scratch database (with the migration indexes) with the given number
+# of products and sales, then times a full NDJSON dump (plain and gzip), an
+# incremental dump, an online snapshot and a full restore of the plain dump.
+# Sizes include the -wal file, so the WAL profile reports the real database
+# size; the restore rate is NDJSON read per second. About 3.5 million sales
+# make a 1 GB database.
+#
+#   python benchmarks/bench_backup.py
+#   python benchmarks/bench_backup.py --products 100000 --sales 5000000
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from sqlalchemy import insert
+from config import Config
+from models import db, Product, Sale, Supplier
+import backup
+import database
+import exports
+import migrations
+
+BATCH = 10000
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': Config.SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    db.init_app(app)
+    database.init_app(app)
+    return app
+
+
+def seed(products, sales):
+    rng = random.Random(1)
+    db.session.execute(insert(Supplier), [{'name': f'Supplier {i}'} for i in range(1, 21)])
+    for start in range(0, products, BATCH):
+        db.session.execute(insert(Product), [
+            {'name': f'Product {i}', 'buying_price': 10.0, 'selling_price': 15.0, 'stock': 100, 'supplier_id': i % 20 + 1, 'barcode': str(i)}
+            for i in range(start, min(start + BATCH, products))
+        ])
+    first = datetime(2024, 1, 1)
+    for start in range(0, sales, BATCH):
+        db.session.execute(insert(Sale), [
+            {'product_id': rng.randint(1, products), 'quantity': 1, 'total_price': 15.0, 'profit': 5.0,
+             'payment_method': rng.choice(['Cash', 'Mpesa', 'Other']), 'timestamp': first + timedelta(minutes=i)}
+            for i in range(start, min(start + BATCH, sales))
+        ])
+        db.session.commit()
+    db.session.commit()
+
+
+def file_size(path):
+    # Bytes in a file plus its SQLite write-ahead log, if it has one
+    wal = path + '-wal'
+    return os.path.getsize(path) + (os.path.getsize(wal) if os.path.exists(wal) else 0)
+
+
+def timed(label, size_path, action):
+    started = time.perf_counter()
+    action()
+    seconds = time.perf_counter() - started
+    size = file_size(size_path) / 1e6
+    print(f'{label:>12} {seconds:>8.2f}s {size:>10.1f} MB {size / max(seconds, 1e-9):>8.1f} MB/s')
+
+
+def write(path, chunks):
+    with open(path, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--sales', type=int, default=200000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, 'bench.db')
+    app = make_app(path)
+    with app.app_context():
+        db.create_all()
+        seed(args.products, args.sales)
+        migrations.upgrade()
+        print(f'database {file_size(path) / 1e6:.1f} MB, {args.products} products, {args.sales} sales')
+        print(f"{'step':>12} {'time':>9} {'size':>13} {'rate':>13}")
+
+        dump_path = os.path.join(workdir, 'full.ndjson')
+        gzip_path = dump_path + '.gz'
+        incremental_path = os.path.join(workdir, 'incremental.ndjson')
+        snapshot_path = os.path.join(workdir, 'snapshot.db')
+        timed('dump', dump_path, lambda: write(dump_path, backup.dump()))
+        timed('dump gzip', gzip_path, lambda: write(gzip_path, exports.gzip_chunks(backup.dump())))
+        last_sale = max(args.sales - args.sales // 100, 0)
+        timed('incremental', incremental_path, lambda: write(incremental_path, backup.dump(since_ids={'sale': last_sale})))
+        timed('snapshot', snapshot_path, lambda: backup.snapshot(snapshot_path))
+
+        def restore():
+            with open(dump_path, 'rb') as f:
+                result = backup.restore(f)
+            print(f"{'':>12} restored {result['rows']} rows, {result['rows'] / result['seconds']:.0f} rows/s")
+        timed('restore', dump_path, restore)
+        print(f'database after restore {file_size(path) / 1e6:.1f} MB')
+        db.session.remove()
+        db.engine.dispose()
+
+    for name in os.listdir(workdir):
+        os.remove(os.path.join(workdir, name))
+    os.rmdir(workdir)
+
+
+if __name__ == '__main__':
+    main()
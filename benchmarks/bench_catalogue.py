@@ -0,0 +1,168 @@
+# Product catalogue benchmark
+# Seeds a scratch SQLite database (with the migration indexes on product) at
+# each size and compares the in-memory catalogue of product_model.py with
+# the indexed queries it replaces: id and barcode lookups, a category page,
+# the low-stock list and a full /products page (filter, sort and paginate),
+# plus the read that finds CATALOGUE_TTL expired (the reload runs on a
+# background thread, so that read should cost no more than a warm one).
+#
+#   python benchmarks/bench_catalogue.py
+#   python benchmarks/bench_catalogue.py --products 1000 100000 --lookups 5000
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask, current_app
+from sqlalchemy import insert, select, text
+from config import Config, _engine_options
+from models import db, Product, Category, Supplier
+from migrations import MIGRATIONS
+import product_model
+
+CATEGORIES = 50
+SUPPLIERS = 200
+PER_PAGE = 10
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = _engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['CATALOGUE_TTL'] = 3600
+    db.init_app(app)
+    return app
+
+
+def seed(products):
+    rng = random.Random(42)
+    db.session.execute(insert(Category), [{'name': f'Category {i}'} for i in range(1, CATEGORIES + 1)])
+    db.session.execute(insert(Supplier), [{'name': f'Supplier {i}'} for i in range(1, SUPPLIERS + 1)])
+    for start in range(0, products, 10000):
+        db.session.execute(insert(Product), [
+            {
+                'name': f'Product {rng.randint(0, 10 ** 9):09d}',
+                'barcode': f'{600000000000 + i}',
+                'buying_price': 10.0,
+                'selling_price': round(rng.uniform(1, 500), 2),
+                'stock': rng.choice((0, rng.randint(1, 20), rng.randint(20, 500))),
+                'unit': 'pcs',
+                'category_id': rng.randint(1, CATEGORIES),
+                'supplier_id': rng.randint(1, SUPPLIERS),
+            }
+            for i in range(start, min(start + 10000, products))
+        ])
+    for statement in MIGRATIONS[0][2]:
+        if statement.endswith(('ON product (barcode)', 'ON product (category_id)', 'ON product (supplier_id)', 'ON product (stock)')):
+            db.session.execute(text(statement))
+    db.session.commit()
+
+
+def rate(fn, keys):
+    started = time.perf_counter()
+    for key in keys:
+        fn(key)
+    return len(keys) / (time.perf_counter() - started)
+
+
+def best_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def measure(products, lookups, repeat):
+    rng = random.Random(7)
+    ids = [rng.randint(1, products) for _ in range(lookups)]
+    barcodes = [f'{600000000000 + pid - 1}' for pid in ids]
+
+    product_model.invalidate()
+    started = time.perf_counter()
+    product_model.get()
+    load_ms = (time.perf_counter() - started) * 1000
+    product_model.invalidate()
+    tracemalloc.start()
+    catalogue = product_model.get()
+    memory_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+    tracemalloc.stop()
+
+    by_id = select(*product_model.ProductRecord.COLUMNS).where(Product.id == text(':id'))
+    by_barcode = select(*product_model.ProductRecord.COLUMNS).where(Product.barcode == text(':barcode'))
+    results = {
+        'load ms': load_ms,
+        'memory MB': memory_mb,
+        'id/s cache': rate(catalogue.get, ids),
+        'id/s sql': rate(lambda pid: db.session.execute(by_id, {'id': pid}).first(), ids),
+        'barcode/s cache': rate(catalogue.get_by_barcode, barcodes),
+        'barcode/s sql': rate(lambda code: db.session.execute(by_barcode, {'barcode': code}).first(), barcodes),
+    }
+
+    def page_cache():
+        catalogue.paginate(catalogue.select(category_id=7, sort='name'), 2, PER_PAGE)
+
+    def page_sql():
+        Product.query.filter(Product.category_id == 7).order_by(Product.name).paginate(page=2, per_page=PER_PAGE).items
+
+    results['category page ms cache'] = best_ms(page_cache, repeat)
+    results['category page ms sql'] = best_ms(page_sql, repeat)
+    results['low stock ms cache'] = best_ms(lambda: catalogue.low_stock(5), repeat)
+    results['low stock ms sql'] = best_ms(lambda: db.session.execute(
+        select(*product_model.ProductRecord.COLUMNS).where(Product.stock < 5).order_by(Product.id)).all(), repeat)
+    # Unfiltered sorted page: the sort order is cached until the next change
+    results['sorted page ms cache'] = best_ms(lambda: catalogue.paginate(catalogue.select(sort='price'), 5, PER_PAGE), repeat)
+    results['sorted page ms sql'] = best_ms(
+        lambda: Product.query.order_by(Product.selling_price).paginate(page=5, per_page=PER_PAGE).items, repeat)
+
+    # A read after the TTL runs out serves the current copy and reloads in
+    # the background; the next measurement waits for the swap
+    catalogue.loaded_at -= current_app.config['CATALOGUE_TTL']
+    started = time.perf_counter()
+    product_model.get()
+    results['expired get ms'] = (time.perf_counter() - started) * 1000
+    for thread in threading.enumerate():
+        if thread.name == 'catalogue-reload':
+            thread.join()
+    db.session.expunge_all()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--lookups', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = []
+    for products in args.products:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        try:
+            app = make_app(path)
+            with app.app_context():
+                db.create_all()
+                seed(products)
+                rows.append((products, measure(products, args.lookups, args.repeat)))
+                db.session.remove()
+                db.engine.dispose()
+        finally:
+            os.remove(path)
+
+    print(f"{'':<24}" + ''.join(f'{products:>14}' for products, _ in rows))
+    for name in rows[0][1]:
+        print(f'{name:<24}' + ''.join(f'{results[name]:>14,.1f}' for _, results in rows))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+# Dashboard benchmark
+# Seeds a scratch SQLite database at increasing sizes and reports how many SQL
+# statements and how much time dashboard_context() needs at each size.
+#
+#   python benchmarks/bench_dashboard.py
+#   python benchmarks/bench_dashboard.py --suppliers 50 200 --months 12 36 --repeat 5
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from sqlalchemy import event, insert
+from config import Config, _engine_options
+from models import db, Product, Sale, Supplier, SupplierOrder
+from dashboard import dashboard_context
+import rollups
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = _engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    db.init_app(app)
+    return app
+
+
+def seed(suppliers, months, products_per_supplier=5, sales_per_month=300, orders_per_month=2):
+    rng = random.Random(42)
+    start = datetime.utcnow() - timedelta(days=30 * months)
+    db.session.execute(insert(Supplier), [{'name': f'Supplier {i}'} for i in range(1, suppliers + 1)])
+    db.session.execute(insert(Product), [
+        {
+            'name': f'Product {s}-{p}',
+            'buying_price': 10.0,
+            'selling_price': 15.0,
+            'stock': rng.randint(0, 100),
+            'supplier_id': s,
+        }
+        for s in range(1, suppliers + 1) for p in range(products_per_supplier)
+    ])
+    product_count = suppliers * products_per_supplier
+    sales = []
+    orders = []
+    for m in range(months):
+        month_start = start + timedelta(days=30 * m)
+        for _ in range(sales_per_month):
+            quantity = rng.randint(1, 5)
+            sales.append({
+                'product_id': rng.randint(1, product_count),
+                'quantity': quantity,
+                'total_price': quantity * 15.0,
+                'profit': quantity * 5.0,
+                'payment_method': rng.choice(['Cash', 'Mpesa', 'Other']),
+                'timestamp': month_start + timedelta(minutes=rng.randint(0, 30 * 24 * 60)),
+            })
+        for s in range(1, suppliers + 1):
+            for _ in range(orders_per_month):
+                order_date = month_start + timedelta(days=rng.randint(0, 29))
+                delivered = rng.random() < 0.7
+                orders.append({
+                    'supplier_id': s,
+                    'product_id': (s - 1) * products_per_supplier + 1,
+                    'quantity': rng.randint(10, 100),
+                    'cost': rng.uniform(100, 1000),
+                    'status': 'Delivered' if delivered else 'Pending',
+                    'order_date': order_date,
+                    'delivery_date': order_date + timedelta(days=rng.randint(0, 5)) if delivered else None,
+                })
+    db.session.execute(insert(Sale), sales)
+    db.session.execute(insert(SupplierOrder), orders)
+    db.session.commit()
+    rollups.rebuild()
+
+
+def measure(repeat):
+    statements = []
+
+    def count(*args):
+        statements.append(1)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        timings = []
+        for _ in range(repeat):
+            db.session.expunge_all()
+            statements.clear()
+            started = time.perf_counter()
+            dashboard_context()
+            timings.append(time.perf_counter() - started)
+        return len(statements), min(timings), sum(timings) / len(timings)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--suppliers', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--months', type=int, nargs='+', default=[6, 12, 36])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'suppliers':>9} {'months':>6} {'sales':>8} {'queries':>7} {'best ms':>8} {'mean ms':>8}")
+    for suppliers in args.suppliers:
+        for months in args.months:
+            fd, path = tempfile.mkstemp(suffix='.db')
+            os.close(fd)
+            try:
+                app = make_app(path)
+                with app.app_context():
+                    db.create_all()
+                    seed(suppliers, months)
+                    sales = db.session.query(Sale).count()
+                    queries, best, mean = measure(args.repeat)
+                    db.session.remove()
+                    db.engine.dispose()
+                print(f'{suppliers:>9} {months:>6} {sales:>8} {queries:>7} {best * 1000:>8.1f} {mean * 1000:>8.1f}')
+            finally:
+                os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
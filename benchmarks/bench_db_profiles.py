@@ -0,0 +1,114 @@
+# Mixed read/write throughput per SQLite profile
+# For each profile in database.PROFILES, reader processes render the
+# dashboard and a sales page while writer processes record sales, all against
+# the same scratch database for a fixed duration.
+#
+#   python benchmarks/bench_db_profiles.py
+#   python benchmarks/bench_db_profiles.py --readers 4 --writers 2 --seconds 10
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from config import Config
+from models import db, Product, Supplier
+import database
+import rollups
+from checkout import checkout, CheckoutError
+from dashboard import dashboard_context
+from sales_queries import sales_page
+from stock import run_with_retry
+
+
+def make_app(path, profile):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': Config.SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    app.config['DB_PROFILE'] = profile
+    db.init_app(app)
+    database.init_app(app)
+    return app
+
+
+def seed(products):
+    db.session.execute(insert(Supplier), [{'name': f'Supplier {i}'} for i in range(1, 21)])
+    db.session.execute(insert(Product), [
+        {'name': f'Product {i}', 'buying_price': 10.0, 'selling_price': 15.0, 'stock': 10 ** 9, 'supplier_id': i % 20 + 1}
+        for i in range(products)
+    ])
+    db.session.commit()
+
+
+def run(args):
+    path, profile, role, seed_value, seconds, products = args
+    rng = random.Random(seed_value)
+    app = make_app(path, profile)
+    done = errors = 0
+    with app.app_context():
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            try:
+                if role == 'reader':
+                    dashboard_context()
+                    sales_page({})
+                    db.session.rollback()
+                else:
+                    item = {'product_id': rng.randint(1, products), 'quantity': 1}
+                    run_with_retry(lambda: checkout([item], 'Cash'))
+                done += 1
+            except (OperationalError, CheckoutError):
+                db.session.rollback()
+                errors += 1
+        db.session.remove()
+    return role, done, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profiles', nargs='+', default=list(database.PROFILES))
+    parser.add_argument('--readers', type=int, default=3)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--products', type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'profile':>8} {'reads/s':>8} {'writes/s':>8} {'errors':>6}")
+    for profile in args.profiles:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        try:
+            app = make_app(path, profile)
+            with app.app_context():
+                db.create_all()
+                seed(args.products)
+                rollups.rebuild()
+                db.session.remove()
+                db.engine.dispose()
+
+            jobs = [(path, profile, 'reader', i, args.seconds, args.products) for i in range(args.readers)]
+            jobs += [(path, profile, 'writer', 1000 + i, args.seconds, args.products) for i in range(args.writers)]
+            with multiprocessing.Pool(len(jobs)) as pool:
+                results = pool.map(run, jobs)
+
+            reads = sum(done for role, done, _ in results if role == 'reader')
+            writes = sum(done for role, done, _ in results if role == 'writer')
+            errors = sum(err for _, _, err in results)
+            print(f'{profile:>8} {reads / args.seconds:>8.1f} {writes / args.seconds:>8.1f} {errors:>6}')
+        finally:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# Receipt rendering throughput
+# Seeds a scratch database with sales and a business logo, then measures
+# receipts per second for single downloads (cold and cached), one multi-page
+# batch PDF and a batch ZIP through the Flask test client, and the time to
+# generate ESC/POS receipts for a thermal printer.
+#
+#   python benchmarks/bench_receipts.py
+#   python benchmarks/bench_receipts.py --sales 2000 --workers 4
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image
+from sqlalchemy import insert
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sales', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['DUKA_DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['DUKA_RECEIPT_WORKERS'] = str(args.workers)
+    os.environ['DUKA_RECEIPT_CACHE_SIZE'] = str(args.sales * 2)
+    os.environ['DUKA_RECEIPT_BATCH_LIMIT'] = str(args.sales)
+    from app import create_app
+    from models import db, User, Product, Sale
+    import migrations
+    import settings
+    import receipts
+    import escpos
+
+    logo = os.path.join(workdir, 'logo.png')
+    Image.new('RGB', (600, 300), (30, 120, 200)).save(logo)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        migrations.upgrade()
+        user = User(username='bench', role='admin')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.add(Product(name='Milk', buying_price=40, selling_price=50, stock=10, unit='Liters'))
+        db.session.commit()
+        first = datetime(2024, 5, 1, 8)
+        db.session.execute(insert(Sale), [
+            {'product_id': 1, 'quantity': 2, 'total_price': 100.0, 'profit': 20.0, 'payment_method': 'Cash',
+             'customer_name': f'Customer {i}', 'timestamp': first + timedelta(seconds=10 * i)}
+            for i in range(args.sales)
+        ])
+        settings.update({'business_name': 'Bench Duka', 'business_address': '1 Market St', 'business_logo': logo, 'receipt_footer': 'Thank you!'})
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': 'bench'})
+
+    def timed(label, count, action):
+        started = time.perf_counter()
+        size = action()
+        seconds = time.perf_counter() - started
+        print(f'{label:>16} {count:>6} {seconds:>8.2f}s {count / seconds:>10.0f}/s {size / 1e3:>10.0f} kB')
+
+    def downloads():
+        size = 0
+        for sale_id in range(1, args.sales + 1):
+            response = client.get(f'/download_receipt/{sale_id}')
+            assert response.status_code == 200
+            size += len(response.data)
+        return size
+
+    def batch(fmt):
+        response = client.get(f'/receipts/batch?start=2024-05-01&end=2024-05-02&format={fmt}')
+        assert response.status_code == 200, response.data
+        return len(response.data)
+
+    print(f"{'step':>16} {'count':>6} {'time':>9} {'receipts':>11} {'size':>13}")
+    timed('download cold', args.sales, downloads)
+    timed('download cached', args.sales, downloads)
+    timed('batch pdf', args.sales, lambda: batch('pdf'))
+    timed('batch zip cached', args.sales, lambda: batch('zip'))
+
+    with app.test_request_context():
+        sales = receipts.fetch(list(range(1, args.sales + 1)))
+        for paper in (58, 80):
+            for qr in ('native', 'raster'):
+                printer_layout = escpos.escpos_layout(receipts.layout(), paper, qr)
+                started = time.perf_counter()
+                size = sum(len(printer_layout.render(sale)) for sale in sales)
+                seconds = time.perf_counter() - started
+                print(f'escpos {paper}mm {qr:>6}: {seconds / len(sales) * 1e3:.3f} ms/receipt, {size / len(sales):.0f} bytes/receipt')
+
+
+if __name__ == '__main__':
+    main()
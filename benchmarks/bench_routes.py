@@ -0,0 +1,330 @@
+# Route benchmark
+# Serves a synthetic shop (see seed.py) and times the POS routes: /products
+# with search, filters and sorting, /sales, /sales/list, the dashboard, the
+# CSV exports and PDF receipts. Requests go through the Flask test client in
+# this process, or with --gunicorn through real workers over HTTP. For each
+# route it reports p50/p95/p99 latency, SQL statements per request and
+# overall peak RSS. Statements come from metrics.py: its counters with the
+# test client, its Server-Timing header with gunicorn (the header is sent
+# before a streamed body runs, so streamed exports show fewer there).
+#
+# --save keeps the results as a JSON baseline; --compare prints the change
+# against one and exits with status 1 when a route's p95 got slower by more
+# than --tolerance or it runs more queries than before.
+#
+#   python benchmarks/bench_routes.py --save /tmp/before.json
+#   python benchmarks/bench_routes.py --compare /tmp/before.json
+#   python benchmarks/bench_routes.py --db /tmp/shop.db --gunicorn 4 --concurrency 8
+
+import argparse
+import http.cookiejar
+import json
+import logging
+import math
+import os
+import platform
+import random
+import re
+import resource
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import seed
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+# p95 changes smaller than this are noise however large the ratio
+NOISE_MS = 2.0
+
+
+def routes(requests, sale_ids, rng):
+    # [(name, [url, ...])]; each route cycles through its urls
+    month_ago = (datetime.utcnow() - timedelta(days=30)).strftime('%Y-%m-%d')
+    return [
+        ('products', ['/products']),
+        ('products search', [f'/products?search={word}' for word in seed.WORDS]),
+        ('products filter', [f'/products?category={c}&stock_status=low' for c in range(1, 6)] +
+                            [f'/products?supplier={s}&stock_status=out' for s in range(1, 6)]),
+        ('products sort', ['/products?sort=name&page=2', '/products?sort=price&page=5', '/products?sort=stock']),
+        ('sales', ['/sales']),
+        ('sales list', ['/sales/list']),
+        ('sales list filter', [f'/sales/list?payment_method={method}&start={month_ago}' for method in seed.PAYMENT_METHODS]),
+        ('dashboard', ['/admin/dashboard']),
+        ('export products', ['/products/export']),
+        ('export sales', [f'/sales/export?start={month_ago}']),
+        # Distinct sales, so most receipts are rendered rather than cached
+        ('receipt', [f'/download_receipt/{sale_id}' for sale_id in rng.sample(sale_ids, min(len(sale_ids), requests))]),
+    ]
+
+
+def _count(path, table):
+    with sqlite3.connect(path) as connection:
+        return connection.execute(f'SELECT count(*) FROM {table}').fetchone()[0]
+
+
+def percentile(values, q):
+    # Nearest-rank percentile of a sorted list
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+def summarize(timings, queries, errors, wall=None):
+    # queries: mean statements per request, None when unknown
+    timings = sorted(timings)
+    result = {
+        'requests': len(timings),
+        'errors': errors,
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 2),
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+        'queries': None if queries is None else round(queries, 1),
+    }
+    if wall is not None:
+        result['requests_per_second'] = round(len(timings) / wall, 1)
+    return result
+
+
+def _queries(header):
+    match = QUERIES.search(header or '')
+    return int(match.group(1)) if match else None
+
+
+# Test client
+
+def run_client(path, plan, requests, warmup):
+    from app import create_app
+    import metrics
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + path})
+    logging.getLogger('metrics').setLevel(logging.ERROR)  # no slow query log lines
+
+    def statements():
+        data = metrics.snapshot()
+        return sum(stats.statements for stats in data['endpoints'].values()) + data['background']['statements']
+
+    client = app.test_client()
+    response = client.post('/login', data={'username': seed.ADMIN[0], 'password': seed.ADMIN[1]})
+    if response.status_code != 302:
+        raise SystemExit('Could not log in to the benchmark database')
+    results = {}
+    for name, urls in plan:
+        for i in range(warmup):
+            client.get(urls[i % len(urls)]).get_data()
+        timings, errors = [], 0
+        before = statements()
+        for i in range(requests):
+            started = time.perf_counter()
+            response = client.get(urls[i % len(urls)])
+            response.get_data()  # streamed bodies are produced here
+            timings.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+        count = statements() - before
+        results[name] = summarize(timings, count / requests if app.config['METRICS_ENABLED'] else None, errors)
+    return results, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Gunicorn
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _children(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    stat = f.read()
+            except OSError:
+                continue
+            if int(stat.rsplit(')', 1)[1].split()[1]) == pid:
+                children.append(int(entry))
+    return children
+
+
+def _peak_rss_mb(pid):
+    # VmHWM (peak resident set) in MB, Linux only
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def run_gunicorn(path, plan, requests, warmup, workers, concurrency):
+    port = _free_port()
+    base = f'http://127.0.0.1:{port}'
+    env = dict(os.environ, DUKA_DATABASE_URL='sqlite:///' + path)
+    log = tempfile.TemporaryFile()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', '1',
+         '--bind', f'127.0.0.1:{port}', 'wsgi:app'],
+        cwd=ROOT, env=env, stdout=log, stderr=log
+    )
+    try:
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                opener.open(base + '/login', timeout=5).read()
+                break
+            except OSError:
+                if server.poll() is not None or time.monotonic() > deadline:
+                    log.seek(0)
+                    raise SystemExit('gunicorn did not start:\n' + log.read().decode(errors='replace')[-2000:])
+                time.sleep(0.2)
+        login = urllib.parse.urlencode({'username': seed.ADMIN[0], 'password': seed.ADMIN[1]}).encode()
+        opener.open(base + '/login', data=login, timeout=30).read()
+
+        def fetch(url):
+            started = time.perf_counter()
+            try:
+                with opener.open(base + url, timeout=120) as response:
+                    response.read()
+                    status, header = response.status, response.headers.get('Server-Timing')
+            except urllib.error.HTTPError as e:
+                status, header = e.code, None
+            return time.perf_counter() - started, status, _queries(header)
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for name, urls in plan:
+                list(pool.map(fetch, [urls[i % len(urls)] for i in range(max(warmup, workers))]))
+                started = time.perf_counter()
+                samples = list(pool.map(fetch, [urls[i % len(urls)] for i in range(requests)]))
+                wall = time.perf_counter() - started
+                counts = [count for _, _, count in samples if count is not None]
+                results[name] = summarize(
+                    [seconds for seconds, _, _ in samples],
+                    sum(counts) / len(counts) if counts else None,
+                    sum(1 for _, status, _ in samples if status != 200),
+                    wall
+                )
+        peak = sum(_peak_rss_mb(pid) for pid in [server.pid] + _children(server.pid))
+        return results, peak
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        log.close()
+
+
+# Baselines
+
+def compare(current, baseline, tolerance):
+    # Prints the change per route; returns the names of regressed routes
+    if current['data'] != baseline['data'] or current['mode'] != baseline['mode']:
+        print(f"warning: baseline used {baseline['mode']} / {baseline['data']}, this run {current['mode']} / {current['data']}")
+    print(f"\n{'route':<20} {'p95 ms':>9} {'baseline':>9} {'change':>8} {'queries':>8} {'baseline':>9}")
+    regressed = []
+    for name, result in current['routes'].items():
+        before = baseline['routes'].get(name)
+        if before is None:
+            print(f"{name:<20} {result['p95_ms']:>9.1f} {'-':>9}")
+            continue
+        change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0.0
+        slower = change > tolerance and result['p95_ms'] - before['p95_ms'] > NOISE_MS
+        more_queries = result['queries'] is not None and before['queries'] is not None and result['queries'] > before['queries']
+        if slower or more_queries:
+            regressed.append(name)
+        print(f"{name:<20} {result['p95_ms']:>9.1f} {before['p95_ms']:>9.1f} {change:>+8.0%} "
+              f"{_format(result['queries']):>8} {_format(before['queries']):>9}{'  REGRESSED' if slower or more_queries else ''}")
+    print(f"\npeak RSS {current['peak_rss_mb']:.0f} MB (baseline {baseline['peak_rss_mb']:.0f} MB)")
+    return regressed
+
+
+def _format(value):
+    return '-' if value is None else f'{value:g}'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', help='existing database from seed.py; by default a scratch one is seeded')
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--sales', type=int, default=100000)
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--requests', type=int, default=50, help='timed requests per route')
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--routes', nargs='+', help='only routes whose name contains one of these')
+    parser.add_argument('--gunicorn', type=int, metavar='WORKERS', help='serve with this many gunicorn workers')
+    parser.add_argument('--concurrency', type=int, default=4, help='concurrent clients with --gunicorn')
+    parser.add_argument('--save', metavar='FILE', help='write the results as a baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare with a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 slowdown (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    scratch = None
+    path = args.db
+    if path is None:
+        scratch = tempfile.mkdtemp()
+        path = os.path.join(scratch, 'bench.db')
+        started = time.perf_counter()
+        # Seeded in a child process so its memory does not count as peak RSS here
+        subprocess.run([sys.executable, os.path.join(os.path.dirname(__file__), 'seed.py'), path,
+                        '--products', str(args.products), '--sales', str(args.sales), '--months', str(args.months)],
+                       check=True, stdout=subprocess.DEVNULL)
+        print(f'Seeded {args.products} products and {args.sales} sales in {time.perf_counter() - started:.1f}s')
+    try:
+        product_count, sale_count = _count(path, 'product'), _count(path, 'sale')
+        plan = routes(args.requests, list(range(1, sale_count + 1)), random.Random(1))
+        if args.routes:
+            plan = [(name, urls) for name, urls in plan if any(part in name for part in args.routes)]
+        if args.gunicorn:
+            mode = f'gunicorn workers={args.gunicorn} concurrency={args.concurrency}'
+            results, peak = run_gunicorn(path, plan, args.requests, args.warmup, args.gunicorn, args.concurrency)
+        else:
+            mode = 'test client'
+            results, peak = run_client(path, plan, args.requests, args.warmup)
+    finally:
+        if scratch:
+            shutil.rmtree(scratch)
+
+    current = {
+        'mode': mode,
+        'data': {'products': product_count, 'sales': sale_count},
+        'python': platform.python_version(),
+        'at': datetime.utcnow().isoformat(timespec='seconds'),
+        'peak_rss_mb': round(peak, 1),
+        'routes': results,
+    }
+    print(f"{mode}, {product_count} products, {sale_count} sales, {args.requests} requests per route")
+    print(f"{'route':<20} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}" +
+          (f" {'req/s':>7}" if args.gunicorn else ''))
+    for name, result in results.items():
+        print(f"{name:<20} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+              f"{_format(result['queries']):>8} {result['errors']:>7}" +
+              (f" {result['requests_per_second']:>7.1f}" if args.gunicorn else ''))
+    print(f'peak RSS {peak:.0f} MB' + (' (master and workers)' if args.gunicorn else ''))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f'Baseline written to {args.save}')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressed = compare(current, baseline, args.tolerance)
+        if regressed:
+            print(f"Regressed: {', '.join(regressed)}")
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+# Startup benchmark
+# What a new process pays before it can serve: the import time of the app
+# module (python -X importtime, with the heaviest imports listed and whether
+# the optional rendering packages were loaded), the wall time of a fresh
+# interpreter creating the app (what every CLI command pays), and gunicorn
+# worker boot latency, from spawning the server to its first response.
+#
+# --root measures another checkout (e.g. a `git worktree` of an older
+# commit) for a before/after comparison; trees without create_app() are
+# imported and served as app:app.
+#
+#   python benchmarks/bench_startup.py
+#   python benchmarks/bench_startup.py --root /tmp/old-checkout --runs 10 --workers 4
+
+import argparse
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import seed
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+OPTIONAL = ('reportlab', 'qrcode', 'barcode', 'PIL')
+
+
+def entry_points(root):
+    # (python statement that builds the app, gunicorn app spec)
+    with open(os.path.join(root, 'app.py')) as f:
+        factory = 'def create_app' in f.read()
+    if factory:
+        return 'from app import create_app; create_app()', 'wsgi:app'
+    return 'import app', 'app:app'
+
+
+def import_times(root, env, statement):
+    # ({module: cumulative microseconds}, {module imported by app.py: ...})
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            cwd=root, env=env, capture_output=True, text=True, check=True)
+    lines = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            lines.append((len(match.group(3)), match.group(4), int(match.group(2))))
+    modules = {name: cumulative for _, name, cumulative in lines}
+    # A module's imports are listed before it, one level deeper
+    position = [name for _, name, _ in lines].index('app')
+    depth = lines[position][0]
+    direct = {}
+    for indent, name, cumulative in reversed(lines[:position]):
+        if indent <= depth:
+            break
+        if indent == depth + 2:
+            direct[name] = cumulative
+    return modules, direct
+
+
+def process_seconds(root, env, statement, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], cwd=root, env=env, check=True)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def boot_seconds(root, env, app_spec, workers, runs):
+    # Median time from starting gunicorn to its first 200 response
+    timings = []
+    for _ in range(runs):
+        port = _free_port()
+        started = time.perf_counter()
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--bind', f'127.0.0.1:{port}', app_spec],
+                                  cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            deadline = started + 60
+            while True:
+                try:
+                    urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=5).read()
+                    break
+                except OSError:
+                    if server.poll() is not None or time.perf_counter() > deadline:
+                        raise SystemExit(f'gunicorn did not start in {root}')
+                    time.sleep(0.01)
+            timings.append(time.perf_counter() - started)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--root', default=os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--top', type=int, default=8, help='heaviest imports to list')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, 'startup.db')
+    seed.create(path, products=100, sales=1000, months=2)
+    env = dict(os.environ, DUKA_DATABASE_URL='sqlite:///' + path)
+    statement, app_spec = entry_points(args.root)
+    try:
+        modules, direct = import_times(args.root, env, statement)
+        print(f'{args.root}: {statement}')
+        print(f"import time of app: {modules['app'] / 1000:.0f} ms, {len(modules)} modules; heaviest imports:")
+        for name, micros in sorted(direct.items(), key=lambda item: -item[1])[:args.top]:
+            print(f'  {name:<28} {micros / 1000:>7.1f} ms')
+        loaded = [name for name in OPTIONAL if name in modules]
+        print(f"optional packages imported at startup: {', '.join(loaded) or 'none'}")
+        print(f'new process creating the app: {process_seconds(args.root, env, statement, args.runs) * 1000:.0f} ms (median of {args.runs})')
+        print(f'gunicorn {args.workers} workers, spawn to first response: '
+              f'{boot_seconds(args.root, env, app_spec, args.workers, args.runs) * 1000:.0f} ms (median of {args.runs})')
+    finally:
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+
+if __name__ == '__main__':
+    main()
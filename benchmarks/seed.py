@@ -0,0 +1,197 @@
+# Synthetic shop data
+# Writes a reproducible shop into a SQLite file with bulk inserts: categories,
+# suppliers, products with barcodes, sales spread over the last months (a
+# few products sell far more than the rest, as in a real shop), supplier
+# orders, product history and two users. The rollups are rebuilt and the
+# migrations applied (search index, reorder points), so the app can serve
+# the file as it is. bench_routes.py seeds through this module; it can also
+# be run on its own to keep a data set around.
+#
+#   python benchmarks/seed.py /tmp/shop.db
+#   python benchmarks/seed.py /tmp/shop.db --products 20000 --sales 500000 --months 24
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from sqlalchemy import insert
+from config import Config
+from models import db, Category, Product, ProductHistory, Sale, Supplier, SupplierOrder, User
+import database
+import migrations
+import rollups
+
+BATCH_SIZE = 20000
+PAYMENT_METHODS = ('Cash', 'Mpesa', 'Card', 'Other')
+UNITS = ('pcs', 'kg', 'litre', 'pack')
+WORDS = ('sugar', 'flour', 'rice', 'milk', 'bread', 'soap', 'salt', 'tea', 'maize', 'oil', 'beans',
+         'juice', 'water', 'butter', 'eggs', 'matches', 'candles', 'biscuits', 'sweets', 'coffee')
+BRANDS = ('Kapa', 'Jogoo', 'Pembe', 'Mumias', 'Daawat', 'Fresha', 'Menengai', 'Ketepa', 'Elianto', 'Brookside')
+# Logins created in every data set
+ADMIN = ('bench-admin', 'bench')
+STAFF = ('bench-staff', 'bench')
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    db.init_app(app)
+    database.init_app(app)
+    return app
+
+
+def _batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed(products=5000, sales=100000, months=12, categories=20, suppliers=30, orders_per_month=4, seed=42):
+    # Fills an empty schema; returns {table: rows written}
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=30 * months)
+    span = int((now - start).total_seconds())
+
+    for (username, password), role in ((ADMIN, 'admin'), (STAFF, 'staff')):
+        user = User(username=username, role=role)
+        user.set_password(password)
+        db.session.add(user)
+    db.session.flush()
+
+    db.session.execute(insert(Category), [{'name': f'Category {i}'} for i in range(1, categories + 1)])
+    db.session.execute(insert(Supplier), [
+        {'name': f'Supplier {i}', 'company': f'{rng.choice(BRANDS)} Distributors', 'contact_phone': f'07{rng.randint(0, 10 ** 8):08d}'}
+        for i in range(1, suppliers + 1)
+    ])
+    product_rows = []
+    for i in range(1, products + 1):
+        buying_price = round(rng.uniform(5, 800), 2)
+        product_rows.append({
+            'name': f'{rng.choice(BRANDS)} {rng.choice(WORDS)} {i}',
+            'barcode': f'{600000000000 + i}',
+            'buying_price': buying_price,
+            'selling_price': round(buying_price * rng.uniform(1.1, 1.5), 2),
+            'stock': rng.choice((0, rng.randint(1, 15), rng.randint(15, 300))),
+            'unit': rng.choice(UNITS),
+            'category_id': rng.randint(1, categories),
+            'supplier_id': rng.randint(1, suppliers),
+        })
+    for batch in _batches(product_rows):
+        db.session.execute(insert(Product), batch)
+
+    # Popularity falls off with rank, so rollups and top lists are skewed
+    weights = [1 / rank for rank in range(1, products + 1)]
+    rng.shuffle(weights)
+    product_ids = list(range(1, products + 1))
+
+    def sale_rows():
+        for product_id in rng.choices(product_ids, weights=weights, k=sales):
+            product = product_rows[product_id - 1]
+            quantity = rng.randint(1, 5)
+            yield {
+                'product_id': product_id,
+                'quantity': quantity,
+                'total_price': round(product['selling_price'] * quantity, 2),
+                'profit': round((product['selling_price'] - product['buying_price']) * quantity, 2),
+                'payment_method': rng.choice(PAYMENT_METHODS),
+                'customer_name': f'Customer {rng.randint(1, 500)}' if rng.random() < 0.3 else None,
+                'timestamp': start + timedelta(seconds=rng.randint(0, span)),
+            }
+
+    for batch in _batches(sale_rows()):
+        batch.sort(key=lambda row: row['timestamp'])
+        db.session.execute(insert(Sale), batch)
+
+    orders = []
+    for supplier_id in range(1, suppliers + 1):
+        supplied = [i for i in range(supplier_id, products + 1, suppliers)] or [1]
+        for month in range(months):
+            for _ in range(orders_per_month):
+                order_date = start + timedelta(days=30 * month + rng.randint(0, 29), hours=rng.randint(8, 18))
+                product_id = rng.choice(supplied)
+                quantity = rng.randint(10, 200)
+                delivered = order_date < now - timedelta(days=14) or rng.random() < 0.5
+                orders.append({
+                    'supplier_id': supplier_id,
+                    'product_id': product_id,
+                    'quantity': quantity,
+                    'cost': round(product_rows[product_id - 1]['buying_price'] * quantity, 2),
+                    'status': 'Delivered' if delivered else 'Pending',
+                    'order_date': order_date,
+                    'delivery_date': order_date + timedelta(days=rng.randint(1, 12)) if delivered else None,
+                })
+    for batch in _batches(orders):
+        db.session.execute(insert(SupplierOrder), batch)
+
+    def history_rows():
+        for product_id in rng.sample(product_ids, k=min(products, max(1, products // 2))):
+            for _ in range(rng.randint(1, 4)):
+                change_type = rng.choice(('price', 'stock'))
+                yield {
+                    'product_id': product_id,
+                    'change_type': change_type,
+                    'old_value': str(rng.randint(1, 500)),
+                    'new_value': str(rng.randint(1, 500)),
+                    'timestamp': start + timedelta(seconds=rng.randint(0, span)),
+                    'user_id': 1,
+                }
+
+    history = 0
+    for batch in _batches(history_rows()):
+        db.session.execute(insert(ProductHistory), batch)
+        history += len(batch)
+    db.session.commit()
+    rollups.rebuild()
+    db.session.commit()
+    return {'products': products, 'sales': sales, 'supplier_orders': len(orders), 'product_history': history}
+
+
+def create(path, **options):
+    # Seeds a new database file at path and brings it to the current schema
+    if os.path.exists(path):
+        raise SystemExit(f'{path} already exists')
+    app = make_app(path)
+    with app.app_context():
+        db.create_all()
+        counts = seed(**options)
+        migrations.upgrade()
+        db.session.remove()
+        db.engine.dispose()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path')
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--sales', type=int, default=100000)
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--suppliers', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = create(args.path, products=args.products, sales=args.sales, months=args.months,
+                    categories=args.categories, suppliers=args.suppliers, seed=args.seed)
+    print(', '.join(f'{rows} {table}' for table, rows in counts.items()) +
+          f' written to {args.path} in {time.perf_counter() - started:.1f}s '
+          f'({os.path.getsize(args.path) / 1e6:.1f} MB); log in as {ADMIN[0]} / {ADMIN[1]}')
+
+
+if __name__ == '__main__':
+    main()
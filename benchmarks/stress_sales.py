@@ -0,0 +1,109 @@
+# Concurrent sales stress test
+# Several processes (standing in for gunicorn workers) sell from a small set
+# of products in a scratch SQLite database at the same time. Afterwards every
+# product must satisfy: final stock == initial stock - units in Sale rows,
+# stock never negative, and the rollups must agree with the Sale table.
+#
+#   python benchmarks/stress_sales.py
+#   python benchmarks/stress_sales.py --workers 8 --sales 300 --products 3 --stock 500
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from config import Config, _engine_options
+from models import db, Product, Sale, SalesDailyProduct
+from checkout import checkout, CheckoutError
+from stock import run_with_retry
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = _engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    db.init_app(app)
+    return app
+
+
+def worker(args):
+    path, worker_id, sales, product_ids, max_quantity = args
+    rng = random.Random(worker_id)
+    counts = {'sold': 0, 'rejected': 0, 'lock_errors': 0}
+    app = make_app(path)
+    with app.app_context():
+        for _ in range(sales):
+            item = {'product_id': rng.choice(product_ids), 'quantity': rng.randint(1, max_quantity)}
+            try:
+                run_with_retry(lambda: checkout([item], 'Cash'))
+                counts['sold'] += 1
+            except CheckoutError:
+                db.session.rollback()
+                counts['rejected'] += 1
+            except OperationalError:
+                counts['lock_errors'] += 1
+        db.session.remove()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--sales', type=int, default=200, help='sales attempted per worker')
+    parser.add_argument('--products', type=int, default=3)
+    parser.add_argument('--stock', type=int, default=300, help='initial stock per product')
+    parser.add_argument('--max-quantity', type=int, default=3)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        app = make_app(path)
+        with app.app_context():
+            db.create_all()
+            for i in range(args.products):
+                db.session.add(Product(name=f'Product {i}', buying_price=10, selling_price=15, stock=args.stock))
+            db.session.commit()
+            product_ids = [p.id for p in Product.query.all()]
+            db.session.remove()
+            db.engine.dispose()
+
+        started = time.perf_counter()
+        with multiprocessing.Pool(args.workers) as pool:
+            results = pool.map(worker, [(path, w, args.sales, product_ids, args.max_quantity) for w in range(args.workers)])
+        elapsed = time.perf_counter() - started
+
+        totals = {key: sum(r[key] for r in results) for key in results[0]}
+        attempted = args.workers * args.sales
+        print(f'{attempted} sales attempted by {args.workers} workers in {elapsed:.2f}s ({attempted / elapsed:.0f}/s)')
+        print(f"sold {totals['sold']}, rejected for stock {totals['rejected']}, lock errors after retries {totals['lock_errors']}")
+
+        ok = True
+        with app.app_context():
+            sold = dict(db.session.query(Sale.product_id, func.sum(Sale.quantity)).group_by(Sale.product_id).all())
+            rolled = dict(db.session.query(SalesDailyProduct.product_id, func.sum(SalesDailyProduct.quantity)).group_by(SalesDailyProduct.product_id).all())
+            for product in Product.query.order_by(Product.id):
+                units = sold.get(product.id, 0)
+                consistent = product.stock == args.stock - units and product.stock >= 0 and rolled.get(product.id, 0) == units
+                ok = ok and consistent
+                print(f"  product {product.id}: stock {product.stock}, sold {units}, rollup {rolled.get(product.id, 0)} -> {'ok' if consistent else 'INCONSISTENT'}")
+            db.session.remove()
+            db.engine.dispose()
+        print('PASS' if ok else 'FAIL')
+        if not ok:
+            raise SystemExit(1)
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
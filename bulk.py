@@ -0,0 +1,133 @@
+# Set-based bulk product operations
+# Each action is one UPDATE (or DELETE) per chunk of selected ids, with the
+# chunk size kept under SQLite's bound-parameter limit. Changes that
+# history.py would capture for ORM edits are recorded first with one
+# INSERT ... SELECT per chunk that reads the old value and computes the new
+# one in SQL, so no product rows are loaded into Python.
+
+import time
+from datetime import datetime
+from sqlalchemy import cast, delete, insert, literal, select, update, Numeric, String
+from models import db, Product, ProductHistory
+from database import IN_CHUNK
+from history import current_user_id
+import reorder
+import search
+
+
+class BulkResult:
+    def __init__(self, action, selected):
+        self.action = action
+        self.selected = selected
+        self.rows = 0
+        self.seconds = 0.0
+
+    def to_dict(self):
+        return {
+            'action': self.action,
+            'selected': self.selected,
+            'rows': self.rows,
+            'seconds': round(self.seconds, 4),
+        }
+
+
+def _parse_float(value, name):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a number.')
+
+
+def _parse_int(value, name, minimum=None):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a whole number.')
+    if minimum is not None and number < minimum:
+        raise ValueError(f'{name} cannot be below {minimum}.')
+    return number
+
+
+def parse_action(action, form, category_ids=(), supplier_ids=()):
+    # Returns (column, new value expression, history change_type), or None
+    # for delete; raises ValueError for unknown actions or bad input
+    if action == 'delete':
+        return None
+    if action == 'update_stock':
+        return Product.stock, literal(_parse_int(form.get('new_stock'), 'Stock', minimum=0)), 'stock'
+    if action == 'update_price':
+        price = _parse_float(form.get('new_price'), 'Price')
+        if price < 0:
+            raise ValueError('Price cannot be negative.')
+        return Product.selling_price, literal(price), 'price'
+    if action == 'adjust_price_percent':
+        percent = _parse_float(form.get('percent'), 'Percentage')
+        if percent <= -100:
+            raise ValueError('Percentage must be above -100.')
+        # NUMERIC so round() also works on PostgreSQL double precision
+        new_price = cast(db.func.round(cast(Product.selling_price * (1 + percent / 100), Numeric), 2), Product.selling_price.type)
+        return Product.selling_price, new_price, 'price'
+    if action == 'set_category':
+        category_id = _parse_int(form.get('category_id'), 'Category')
+        if category_id not in category_ids:
+            raise ValueError('Unknown category.')
+        return Product.category_id, literal(category_id), 'category'
+    if action == 'set_supplier':
+        supplier_id = _parse_int(form.get('supplier_id'), 'Supplier')
+        if supplier_id not in supplier_ids:
+            raise ValueError('Unknown supplier.')
+        return Product.supplier_id, literal(supplier_id), 'supplier'
+    raise ValueError(f'Unknown bulk action: {action}.')
+
+
+def _record_history(ids, column, new_value, change_type, timestamp, user_id):
+    changed = column.is_distinct_from(new_value)
+    rows = select(
+        Product.id,
+        literal(change_type),
+        cast(column, String),
+        cast(new_value, String),
+        literal(timestamp, ProductHistory.timestamp.type),
+        literal(user_id, ProductHistory.user_id.type),
+    ).where(Product.id.in_(ids), changed)
+    db.session.execute(
+        insert(ProductHistory).from_select(
+            ['product_id', 'change_type', 'old_value', 'new_value', 'timestamp', 'user_id'], rows
+        )
+    )
+
+
+def apply(action, product_ids, form, category_ids=(), supplier_ids=()):
+    # Runs the action over the ids in one transaction; returns a BulkResult
+    try:
+        ids = sorted({int(pid) for pid in product_ids})
+    except ValueError:
+        raise ValueError('Product ids must be whole numbers.')
+    change = parse_action(action, form, category_ids, supplier_ids)
+    result = BulkResult(action, len(ids))
+    started = time.perf_counter()
+    timestamp = datetime.utcnow()
+    user_id = current_user_id()
+    for start in range(0, len(ids), IN_CHUNK):
+        chunk = ids[start:start + IN_CHUNK]
+        if change is None:
+            # Same effect as deleting loaded Products: history rows are kept
+            # and detached from the product
+            db.session.execute(
+                update(ProductHistory).where(ProductHistory.product_id.in_(chunk)).values(product_id=None),
+                execution_options={'synchronize_session': False}
+            )
+            reorder.remove(chunk)
+            statement = delete(Product).where(Product.id.in_(chunk))
+        else:
+            column, new_value, change_type = change
+            _record_history(chunk, column, new_value, change_type, timestamp, user_id)
+            statement = update(Product).where(Product.id.in_(chunk), column.is_distinct_from(new_value)).values({column: new_value})
+        result.rows += db.session.execute(statement, execution_options={'synchronize_session': False, 'changed_ids': chunk}).rowcount
+        if change is not None and change[2] in ('stock', 'supplier'):
+            reorder.refresh(chunk)
+    if change is None:
+        search.remove_products(ids)
+    db.session.commit()
+    result.seconds = time.perf_counter() - started
+    return result
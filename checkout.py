@@ -0,0 +1,138 @@
+# Multi-line checkout
+# A basket scanned at the till is resolved and sold in one transaction: all
+# barcodes are looked up with one indexed IN query, every line is validated
+# before anything is written, and the sales, stock decrements, rollups and
+# reorder points are committed together. Stock is decremented with stock.decrement_stock so
+# concurrent tills cannot oversell; callers wrap checkout() in
+# stock.run_with_retry to ride out SQLite lock contention.
+
+from models import db, Product, Sale
+import rollups
+import reorder
+import settings
+from stock import decrement_stock
+
+MAX_LINES = 500
+
+
+class CheckoutError(Exception):
+    def __init__(self, message, status=400, lines=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.lines = lines or []
+
+    def to_dict(self):
+        data = {'error': self.message}
+        if self.lines:
+            data['lines'] = self.lines
+        return data
+
+
+def product_by_barcode(barcode):
+    # Single lookup through ix_product_barcode
+    return Product.query.filter(Product.barcode == barcode).first()
+
+
+def resolve_products(barcodes=(), product_ids=()):
+    # Returns ({barcode: Product}, {id: Product}) using at most two queries
+    by_barcode, by_id = {}, {}
+    if barcodes:
+        for product in Product.query.filter(Product.barcode.in_(list(barcodes))):
+            by_barcode.setdefault(product.barcode, product)
+    if product_ids:
+        for product in Product.query.filter(Product.id.in_(list(product_ids))):
+            by_id[product.id] = product
+    return by_barcode, by_id
+
+
+def _parse_lines(items):
+    if not isinstance(items, list) or not items:
+        raise CheckoutError('Cart is empty.')
+    if len(items) > MAX_LINES:
+        raise CheckoutError(f'A cart can hold at most {MAX_LINES} lines.')
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise CheckoutError('Each cart line must be an object.', lines=[{'line': index}])
+        try:
+            quantity = int(item.get('quantity', 1))
+            product_id = int(item['product_id']) if item.get('product_id') not in (None, '') else None
+        except (TypeError, ValueError):
+            raise CheckoutError('Quantity and product_id must be integers.', lines=[{'line': index}])
+        barcode = str(item['barcode']).strip() if item.get('barcode') not in (None, '') else None
+        if quantity < 1:
+            raise CheckoutError('Quantity must be at least 1.', lines=[{'line': index}])
+        if barcode is None and product_id is None:
+            raise CheckoutError('Each cart line needs a barcode or a product_id.', lines=[{'line': index}])
+        parsed.append((index, barcode, product_id, quantity))
+    return parsed
+
+
+def checkout(items, payment_method, customer_name='', customer_contact=''):
+    # Returns one receipt line per product sold; raises CheckoutError
+    if payment_method not in settings.get('payment_methods'):
+        raise CheckoutError(f'Unknown payment method: {payment_method}.')
+    lines = _parse_lines(items)
+
+    by_barcode, by_id = resolve_products(
+        {barcode for _, barcode, _, _ in lines if barcode},
+        {product_id for _, barcode, product_id, _ in lines if not barcode}
+    )
+
+    # Merge repeated scans of the same product into one sale line
+    quantities = {}
+    products = {}
+    unknown = []
+    for index, barcode, product_id, quantity in lines:
+        product = by_barcode.get(barcode) if barcode else by_id.get(product_id)
+        if product is None:
+            unknown.append({'line': index, 'barcode': barcode, 'product_id': product_id})
+            continue
+        products[product.id] = product
+        quantities[product.id] = quantities.get(product.id, 0) + quantity
+    if unknown:
+        raise CheckoutError('Unknown product in cart.', status=404, lines=unknown)
+
+    short = [
+        {'product_id': pid, 'name': products[pid].name, 'requested': qty, 'in_stock': products[pid].stock}
+        for pid, qty in quantities.items() if products[pid].stock < qty
+    ]
+    if short:
+        raise CheckoutError('Insufficient stock!', status=409, lines=short)
+
+    sales = []
+    for pid, quantity in quantities.items():
+        product = products[pid]
+        if not decrement_stock(pid, quantity):
+            # Another till sold it between our read and this UPDATE
+            db.session.rollback()
+            raise CheckoutError('Insufficient stock!', status=409, lines=[{'product_id': pid, 'requested': quantity}])
+        sale = Sale(
+            product_id=pid,
+            quantity=quantity,
+            payment_method=payment_method,
+            total_price=product.selling_price * quantity,
+            profit=(product.selling_price - product.buying_price) * quantity,
+            customer_name=customer_name,
+            customer_contact=customer_contact
+        )
+        db.session.add(sale)
+        rollups.record_sale(sale)
+        sales.append((product, sale))
+    reorder.refresh(quantities)
+    db.session.flush()
+
+    # Build the receipt before commit expires the rows
+    receipt = [
+        {
+            'sale_id': sale.id,
+            'product_id': product.id,
+            'name': product.name,
+            'quantity': sale.quantity,
+            'total_price': sale.total_price
+        }
+        for product, sale in sales
+    ]
+    db.session.commit()
+    return receipt
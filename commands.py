@@ -0,0 +1,145 @@
+# Flask CLI commands (flask --app app <command>)
+# The app no longer touches the schema when it starts: run `flask init-db`
+# (also available as db-upgrade) once per deployment, before the workers.
+
+import os
+import time
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from models import db, Product
+import backup
+import database
+import exports
+import images
+import migrations
+import reorder
+import rollups
+import search as product_search
+import settings
+
+@click.command('rebuild-rollups')
+@with_appcontext
+def rebuild_rollups_command():
+    daily, monthly = rollups.rebuild()
+    print(f'Rebuilt sales rollups: {daily} daily product rows, {monthly} monthly payment rows.')
+
+@click.command('refresh-reorder')
+@with_appcontext
+def refresh_reorder_command():
+    rows = reorder.refresh()
+    db.session.commit()
+    print(f'Refreshed reorder points for {rows} products ({reorder.low_stock_count()} need reordering).')
+
+@click.command('process-images')
+@with_appcontext
+def process_images_command():
+    values = {('product', product_id): image for product_id, image in db.session.query(Product.id, Product.image).filter(Product.image.isnot(None), Product.image != '')}
+    logo = settings.get('business_logo')
+    if logo:
+        values[('setting', 'business_logo')] = logo
+    changed, report = images.backfill(values)
+    for (kind, key), value in changed.items():
+        if kind == 'product':
+            db.session.get(Product, key).image = value
+        else:
+            settings.update({key: value})
+    db.session.commit()
+    print(f"Processed {report['images']} images: {report['renamed']} moved to content-hash names, "
+          f"{report['variants']} variants created, {report['missing']} missing files, {report['invalid']} invalid.")
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    # Creates missing tables and applies pending migrations; safe to rerun,
+    # so deployments run it before starting the workers
+    db.create_all()
+    applied = migrations.upgrade()
+    if applied:
+        print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+    print(f'Schema is at version {migrations.current_version()}.')
+
+@click.command('db-info')
+@with_appcontext
+def db_info_command():
+    print(f"Database: {db.engine.url.render_as_string(hide_password=True)}")
+    print(f"Profile: {current_app.config.get('DB_PROFILE')}")
+    for name, value in database.pragma_report().items():
+        print(f'  {name} = {value}')
+
+@click.command('db-check-indexes')
+@with_appcontext
+def db_check_indexes_command():
+    results = migrations.check_indexes()
+    for name, expected, plan, ok in results:
+        print(f"[{'ok' if ok else 'MISSING'}] {name}: expected {expected}")
+        print(f'    {plan}')
+    if not all(ok for *_, ok in results):
+        raise SystemExit(1)
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    product_search.rebuild()
+    db.session.commit()
+    print(f'Rebuilt product search index ({type(product_search.backend()).__name__}).')
+
+@click.command('backup')
+@with_appcontext
+@click.argument('output')
+@click.option('--gzip', 'compress', is_flag=True, help='Compress the NDJSON output.')
+@click.option('--since', help='Only rows of append-only tables at or after this ISO timestamp.')
+@click.option('--since-id', multiple=True, help='TABLE=ID; only rows of TABLE with a larger id.')
+@click.option('--snapshot', is_flag=True, help='Write a SQLite database copy instead of NDJSON.')
+def backup_command(output, compress, since, since_id, snapshot):
+    if snapshot:
+        seconds = backup.snapshot(output)
+        size = os.path.getsize(output)
+        print(f'Snapshot written to {output}: {size / 1e6:.1f} MB in {seconds:.2f}s ({size / 1e6 / max(seconds, 1e-9):.1f} MB/s)')
+        return
+    since_ids = dict(item.split('=', 1) for item in since_id)
+    started = time.perf_counter()
+    lines = backup.dump(since_ids=since_ids, since=datetime.fromisoformat(since) if since else None)
+    if compress:
+        lines = exports.gzip_chunks(lines)
+    with open(output, 'wb') as f:
+        for chunk in lines:
+            f.write(chunk)
+    seconds = time.perf_counter() - started
+    size = os.path.getsize(output)
+    print(f'Backup written to {output}: {size / 1e6:.1f} MB in {seconds:.2f}s ({size / 1e6 / max(seconds, 1e-9):.1f} MB/s)')
+
+
+@click.command('restore')
+@with_appcontext
+@click.argument('files', nargs=-1, required=True)
+@click.option('--until', help='Skip rows timestamped after this ISO timestamp (point-in-time restore).')
+def restore_command(files, until):
+    # Pass a full backup followed by any incremental backups, oldest first
+    until = datetime.fromisoformat(until) if until else None
+    for path in files:
+        with open(path, 'rb') as f:
+            result = backup.restore(f, until=until)
+        print(f"Restored {path}: {result['rows']} rows in {result['seconds']:.2f}s ({result['rows'] / max(result['seconds'], 1e-9):.0f} rows/s)")
+        for table, rows in result['tables'].items():
+            print(f'  {table}: {rows}')
+
+
+COMMANDS = [
+    rebuild_rollups_command,
+    refresh_reorder_command,
+    process_images_command,
+    init_db_command,
+    db_info_command,
+    db_check_indexes_command,
+    rebuild_search_index_command,
+    backup_command,
+    restore_command,
+]
+
+
+def init_app(app):
+    for command in COMMANDS:
+        app.cli.add_command(command)
+    app.cli.add_command(init_db_command, 'db-upgrade')
@@ -2,7 +2,90 @@ import os
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+
+def _database_url():
+    # DUKA_DATABASE_URL (or DATABASE_URL) switches to e.g. PostgreSQL without code changes
+    url = os.environ.get('DUKA_DATABASE_URL') or os.environ.get('DATABASE_URL')
+    if not url:
+        return 'sqlite:///' + os.path.join(basedir, 'duka.db')
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def _engine_options(url):
+    pool_size = int(os.environ.get('DUKA_DB_POOL_SIZE', 5))
+    max_overflow = int(os.environ.get('DUKA_DB_MAX_OVERFLOW', 10))
+    if url.startswith('sqlite'):
+        if url in ('sqlite://', 'sqlite:///:memory:'):
+            return {}
+        # Writers queue behind each other, so a small pool is enough; the
+        # driver timeout matches busy_timeout so lock waits happen in SQLite
+        return {
+            'pool_size': pool_size,
+            'max_overflow': max_overflow,
+            'connect_args': {'timeout': int(os.environ.get('DUKA_SQLITE_BUSY_TIMEOUT_MS', 5000)) / 1000},
+        }
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.environ.get('DUKA_DB_POOL_RECYCLE', 1800)),
+    }
+
+
 class Config:
     SECRET_KEY = 'your-secret-key'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'duka.db')
+    SQLALCHEMY_DATABASE_URI = _database_url()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
+
+    # SQLite tuning applied to every new connection (see database.py)
+    DB_PROFILE = os.environ.get('DUKA_DB_PROFILE', 'wal')  # 'wal' or 'default'
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('DUKA_SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('DUKA_SQLITE_CACHE_SIZE_KB', 64 * 1024))
+    SQLITE_MMAP_SIZE = int(os.environ.get('DUKA_SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+
+    # Receipt rendering (see receipts.py)
+    RECEIPT_WORKERS = int(os.environ.get('DUKA_RECEIPT_WORKERS', 2))
+    RECEIPT_CACHE_SIZE = int(os.environ.get('DUKA_RECEIPT_CACHE_SIZE', 1000))
+    RECEIPT_BATCH_LIMIT = int(os.environ.get('DUKA_RECEIPT_BATCH_LIMIT', 5000))
+
+    # Thermal printer output (see escpos.py): 'file:/path', 'spool:/dir',
+    # 'tcp:host:port' or 'unix:/path'; empty disables /receipts/<id>/print
+    RECEIPT_PRINTER = os.environ.get('DUKA_RECEIPT_PRINTER', '')
+    RECEIPT_PAPER_MM = int(os.environ.get('DUKA_RECEIPT_PAPER_MM', 80))
+    RECEIPT_QR_MODE = os.environ.get('DUKA_RECEIPT_QR_MODE', 'native')  # or 'raster'
+
+    # Audit log pipeline (see audit.py)
+    AUDIT_MODE = os.environ.get('DUKA_AUDIT_MODE', 'thread')  # or 'teardown'
+    AUDIT_QUEUE_SIZE = int(os.environ.get('DUKA_AUDIT_QUEUE_SIZE', 10000))
+    AUDIT_BATCH_SIZE = int(os.environ.get('DUKA_AUDIT_BATCH_SIZE', 500))
+    AUDIT_FLUSH_INTERVAL = float(os.environ.get('DUKA_AUDIT_FLUSH_INTERVAL', 1.0))  # seconds
+    AUDIT_PUT_TIMEOUT = float(os.environ.get('DUKA_AUDIT_PUT_TIMEOUT', 0.05))  # seconds
+
+    # Request and SQL metrics (see metrics.py); METRICS_TOKEN lets a scraper
+    # read /admin/metrics with "Authorization: Bearer <token>"
+    METRICS_ENABLED = os.environ.get('DUKA_METRICS_ENABLED', '1') == '1'
+    METRICS_SLOW_QUERY_MS = float(os.environ.get('DUKA_METRICS_SLOW_QUERY_MS', 100))
+    METRICS_SLOW_QUERY_KEEP = int(os.environ.get('DUKA_METRICS_SLOW_QUERY_KEEP', 50))
+    METRICS_TOKEN = os.environ.get('DUKA_METRICS_TOKEN', '')
+
+    # Uploaded images (see images.py); UPLOAD_FOLDER is relative to the app root
+    UPLOAD_FOLDER = 'static/uploads'
+    IMAGE_WORKERS = int(os.environ.get('DUKA_IMAGE_WORKERS', 1))
+    IMAGE_MAX_BYTES = int(os.environ.get('DUKA_IMAGE_MAX_BYTES', 15 * 1024 * 1024))
+
+    # In-process caches, in seconds: a commit invalidates the committing
+    # process's copy at once, other worker processes reload after the TTL
+    SETTINGS_TTL = float(os.environ.get('DUKA_SETTINGS_TTL', 30))  # settings.py
+    REFDATA_TTL = float(os.environ.get('DUKA_REFDATA_TTL', 60))  # refdata.py
+    SCORECARD_TTL = float(os.environ.get('DUKA_SCORECARD_TTL', 60))  # supplier_analytics.py
+    CATALOGUE_TTL = float(os.environ.get('DUKA_CATALOGUE_TTL', 30))  # product_model.py
+    SEARCH_INDEX_TTL = float(os.environ.get('DUKA_SEARCH_INDEX_TTL', 60))  # search.py fallback index
+
+    # Reorder suggestions (see reorder.py); all values in days
+    REORDER_VELOCITY_DAYS = int(os.environ.get('DUKA_REORDER_VELOCITY_DAYS', 28))
+    REORDER_LEAD_DAYS = int(os.environ.get('DUKA_REORDER_LEAD_DAYS', 7))
+    REORDER_SAFETY_DAYS = int(os.environ.get('DUKA_REORDER_SAFETY_DAYS', 3))
+    REORDER_COVER_DAYS = int(os.environ.get('DUKA_REORDER_COVER_DAYS', 14))
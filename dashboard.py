@@ -0,0 +1,114 @@
+# Dashboard aggregation layer
+# Every widget on /admin/dashboard is computed from a fixed set of grouped
+# queries (GROUP BY month, GROUP BY supplier, ...), so the number of round
+# trips stays the same no matter how many suppliers or months are stored.
+# Sales figures are read from the rollup tables maintained by rollups.py and
+# the low-stock count from the ReorderPoint table maintained by reorder.py;
+# supplier widgets reuse the scorecards cached by supplier_analytics.py.
+
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from models import db, Product, User, AuditLog, SupplierOrder, SalesMonthlyPayment
+import rollups
+import reorder
+import supplier_analytics
+from database import month_key
+
+TOP_PRODUCTS_LIMIT = 5
+RECENT_ORDERS_LIMIT = 5
+RECENT_LOGS_LIMIT = 10
+
+
+def _totals():
+    # One round trip for all the summary cards
+    row = db.session.query(
+        db.session.query(func.count(Product.id)).scalar_subquery(),
+        db.session.query(func.count(User.id)).scalar_subquery(),
+        db.session.query(func.sum(SalesMonthlyPayment.revenue)).scalar_subquery(),
+        db.session.query(func.sum(SupplierOrder.cost)).filter(SupplierOrder.status == 'Delivered').scalar_subquery(),
+        db.session.query(func.sum(Product.selling_price * Product.stock)).scalar_subquery(),
+    ).one()
+    return {
+        'total_products': row[0] or 0,
+        'total_users': row[1] or 0,
+        'total_sales': row[2] or 0,
+        'total_expenses': row[3] or 0,
+        'inventory_value': row[4] or 0,
+    }
+
+
+def _expenses_by_month():
+    month = month_key(SupplierOrder.order_date).label('month')
+    rows = db.session.query(month, func.sum(SupplierOrder.cost)).filter(
+        SupplierOrder.status == 'Delivered'
+    ).group_by(month).all()
+    return {row[0]: row[1] or 0 for row in rows}
+
+
+def _supplier_stats():
+    # Outstanding payments and performance from the cached supplier scorecards
+    cards = supplier_analytics.scorecards().values()
+    outstanding_payments = [(card, card.outstanding_value) for card in cards if card.outstanding_value > 0]
+    supplier_performance = [
+        {'name': card.name, 'total_supplied': card.delivered_quantity, 'on_time_percent': card.on_time_percent}
+        for card in cards
+    ]
+    return outstanding_payments, supplier_performance
+
+
+def dashboard_context():
+    totals = _totals()
+
+    sales_trends = rollups.revenue_by_month()
+    sales_trends_labels = [row[0] for row in sales_trends]
+    sales_trends_data = [row[1] for row in sales_trends]
+
+    # Inventory value over time (simulate with current value)
+    inventory_value_labels = sales_trends_labels
+    inventory_value_data = [totals['inventory_value'] for _ in inventory_value_labels]
+
+    top_products = [(name, total_sold) for name, total_sold, _ in rollups.best_products(TOP_PRODUCTS_LIMIT)]
+    payment_methods = rollups.revenue_by_payment_method()
+
+    recent_supplier_orders = SupplierOrder.query.options(
+        joinedload(SupplierOrder.supplier), joinedload(SupplierOrder.product)
+    ).order_by(SupplierOrder.order_date.desc()).limit(RECENT_ORDERS_LIMIT).all()
+
+    outstanding_payments, supplier_performance = _supplier_stats()
+
+    # Cash flow summary (monthly revenue/expenses/profit)
+    expenses_by_month = _expenses_by_month()
+    cash_flow = []
+    for month, revenue in sales_trends:
+        revenue = revenue or 0
+        expenses = expenses_by_month.get(month, 0)
+        cash_flow.append({'month': month, 'revenue': revenue, 'expenses': expenses, 'profit': revenue - expenses})
+
+    low_stock_count = reorder.low_stock_count()
+    recent_logs = AuditLog.query.options(joinedload(AuditLog.user)).order_by(AuditLog.timestamp.desc()).limit(RECENT_LOGS_LIMIT).all()
+
+    return dict(
+        total_products=totals['total_products'],
+        total_users=totals['total_users'],
+        total_sales=totals['total_sales'],
+        total_expenses=totals['total_expenses'],
+        sales_trends=list(zip(sales_trends_labels, sales_trends_data)),
+        sales_trends_labels=sales_trends_labels,
+        sales_trends_data=sales_trends_data,
+        inventory_value=list(zip(inventory_value_labels, inventory_value_data)),
+        inventory_value_labels=inventory_value_labels,
+        inventory_value_data=inventory_value_data,
+        top_products=top_products,
+        top_products_labels=[row[0] for row in top_products],
+        top_products_data=[row[1] for row in top_products],
+        payment_methods=payment_methods,
+        payment_method_labels=[row[0] for row in payment_methods],
+        payment_method_data=[row[1] for row in payment_methods],
+        recent_supplier_orders=recent_supplier_orders,
+        outstanding_payments=outstanding_payments,
+        supplier_performance=supplier_performance,
+        cash_flow=cash_flow,
+        low_stock_count=low_stock_count,
+        recent_logs=recent_logs,
+        best_products=top_products
+    )
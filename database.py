@@ -0,0 +1,160 @@
+# Engine profiles and portable SQL helpers
+# init_app() applies the configured SQLite profile as PRAGMAs on every new
+# DBAPI connection. The 'wal' profile lets dashboard readers run while a sale
+# is being written; 'default' keeps SQLite's rollback journal. Other
+# databases are configured through SQLALCHEMY_ENGINE_OPTIONS in config.py.
+#
+# The in-process caches (settings, refdata, supplier_analytics,
+# product_model, search, receipts) keep their state per app with app_state()
+# and learn that a commit changed their rows through invalidate_on_commit().
+
+import threading
+from flask import current_app
+from sqlalchemy import event, func, text, Float, String
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+from models import db
+
+# Ids per IN (...) list, kept under SQLite's bound-parameter limit
+IN_CHUNK = 500
+
+_state_lock = threading.Lock()
+
+PROFILES = {
+    # journal_mode is persistent in the database file, so 'default' resets it
+    'default': [('journal_mode', 'DELETE')],
+    'wal': [
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('temp_store', 'MEMORY'),
+    ],
+}
+
+
+def sqlite_pragmas(config):
+    profile = config.get('DB_PROFILE', 'wal')
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE {profile!r}; expected one of {', '.join(PROFILES)}")
+    pragmas = [('busy_timeout', int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000)))] + PROFILES[profile]
+    if profile != 'default':
+        # Negative cache_size is in KiB rather than pages
+        pragmas.append(('cache_size', -int(config.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))))
+        pragmas.append(('mmap_size', int(config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))))
+    return pragmas
+
+
+def init_app(app):
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(app.config)
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+
+def pragma_report():
+    # Current values of the tuned PRAGMAs on a pooled connection
+    if db.session.get_bind().dialect.name != 'sqlite':
+        return {}
+    names = ['journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size', 'temp_store']
+    return {name: db.session.execute(text(f'PRAGMA {name}')).scalar() for name in names}
+
+
+class Cached:
+    # A lock and one cached value: the usual app_state() factory
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = None
+
+
+def app_state(name, factory):
+    # The current app's instance of a cache module's state, created with
+    # factory() on first use and kept in app.extensions, so two apps in one
+    # process (each with its own database) never share cached rows
+    extensions = current_app.extensions
+    state = extensions.get(name)
+    if state is None:
+        with _state_lock:
+            state = extensions.setdefault(name, factory())
+    return state
+
+
+def invalidate_on_commit(models, callback):
+    # Calls callback(ids) after each commit that changed rows of the given
+    # models. ids is the set of ids of the objects flushed, or None
+    # when a set-based INSERT, UPDATE or DELETE (which the unit of work does
+    # not see) may have changed any row; such statements can name the rows
+    # they touch with execution_options={'changed_ids': ids}. Changes that are
+    # rolled back are dropped.
+    models = tuple(models)
+    tables = {model.__tablename__ for model in models}
+    key = object()  # this registration's entry in session.info
+
+    def mark(session, ids):
+        pending = session.info.get(key, set())
+        if pending is not None:
+            session.info[key] = None if ids is None else pending | set(ids)
+
+    @event.listens_for(Session, 'after_flush')
+    def _record_flushed(session, flush_context):
+        ids = [obj.id for obj in (*session.new, *session.dirty, *session.deleted) if isinstance(obj, models)]
+        if ids:
+            mark(session, ids)
+
+    @event.listens_for(Session, 'do_orm_execute')
+    def _record_statement(orm_execute_state):
+        if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+            return
+        # ORM statements carry an annotated copy of the table, so compare names
+        if getattr(getattr(orm_execute_state.statement, 'table', None), 'name', None) in tables:
+            mark(orm_execute_state.session, orm_execute_state.execution_options.get('changed_ids'))
+
+    @event.listens_for(Session, 'after_commit')
+    def _apply_after_commit(session):
+        if key in session.info:
+            callback(session.info.pop(key))
+
+    @event.listens_for(Session, 'after_rollback')
+    def _discard_after_rollback(session):
+        session.info.pop(key, None)
+
+
+class month_key(FunctionElement):
+    # 'YYYY-MM' for a timestamp column, on SQLite and PostgreSQL
+    type = String()
+    inherit_cache = True
+
+
+@compiles(month_key)
+def _month_key_sqlite(element, compiler, **kw):
+    return compiler.process(func.strftime('%Y-%m', *element.clauses), **kw)
+
+
+@compiles(month_key, 'postgresql')
+def _month_key_postgresql(element, compiler, **kw):
+    return compiler.process(func.to_char(*element.clauses, 'YYYY-MM'), **kw)
+
+
+class days_between(FunctionElement):
+    # Fractional days from the first timestamp to the second
+    type = Float()
+    inherit_cache = True
+
+
+@compiles(days_between)
+def _days_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return compiler.process(func.julianday(end) - func.julianday(start), **kw)
+
+
+@compiles(days_between, 'postgresql')
+def _days_between_postgresql(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return 'EXTRACT(EPOCH FROM (%s - %s)) / 86400' % (compiler.process(end, **kw), compiler.process(start, **kw))
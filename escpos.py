@@ -0,0 +1,198 @@
+# ESC/POS receipts for 58/80mm thermal printers
+# Prints the same ReceiptLayout as the PDF receipts (receipts.py), so the two
+# cannot drift. The static header and footer are encoded once per app,
+# layout and paper width; per sale only the field lines, the QR code and the
+# barcode are encoded. The QR code uses the printer's native QR command by default
+# (qr='raster' draws it with the qrcode package for printers without one, at
+# a few ms per receipt); the Code 128 barcode of the receipt number is
+# rasterised from python-barcode's module pattern.
+#
+# Output goes to a file, a spool directory picked up by a print daemon, or a
+# socket (tcp:host:port for network printers, unix:/path for a local stand-in).
+# python-barcode and qrcode are imported on first use.
+
+import os
+import socket
+import tempfile
+import threading
+from database import app_state
+
+ESC = b'\x1b'
+GS = b'\x1d'
+INIT = ESC + b'@' + ESC + b't\x00'  # reset, code page PC437
+CENTER = ESC + b'a\x01'
+LEFT = ESC + b'a\x00'
+BOLD_ON = ESC + b'E\x01'
+BOLD_OFF = ESC + b'E\x00'
+DOUBLE_ON = GS + b'!\x11'
+DOUBLE_OFF = GS + b'!\x00'
+CUT = GS + b'V\x42\x03'  # feed three lines and partial cut
+
+# Paper width in mm -> (characters per line in font A, printable dots)
+WIDTHS = {58: (32, 384), 80: (48, 576)}
+
+BARCODE_MODULE_DOTS = 2
+BARCODE_HEIGHT_DOTS = 60
+QR_MODULE_DOTS = 4
+
+
+def _encode(text):
+    return text.encode('cp437', errors='replace')
+
+
+def _wrap(text, width):
+    lines = []
+    while len(text) > width:
+        cut = text.rfind(' ', 0, width + 1)
+        cut = cut if cut > 0 else width
+        lines.append(text[:cut])
+        text = text[cut:].lstrip()
+    lines.append(text)
+    return lines
+
+
+def _row(pixels, width_bytes):
+    # '0'/'1' pixel string -> packed bytes, padded to width_bytes
+    return int(pixels.ljust(width_bytes * 8, '0'), 2).to_bytes(width_bytes, 'big')
+
+
+def _raster(rows, width_dots):
+    # GS v 0: packed rows, each width_dots wide
+    width_bytes = (width_dots + 7) // 8
+    height = len(rows) // width_bytes
+    return GS + b'v0\x00' + bytes((width_bytes & 0xFF, width_bytes >> 8, height & 0xFF, height >> 8)) + rows
+
+
+def barcode_raster(data):
+    import barcode
+    modules = barcode.get('code128', data).build()[0]
+    pixels = ''.join(bit * BARCODE_MODULE_DOTS for bit in modules)
+    width_bytes = (len(pixels) + 7) // 8
+    return _raster(_row(pixels, width_bytes) * BARCODE_HEIGHT_DOTS, len(pixels))
+
+
+def qr_native(data):
+    # GS ( k: model 2, module size, error correction M, store, print
+    payload = data.encode()
+    length = len(payload) + 3
+    return b''.join((
+        GS + b'(k\x04\x001A2\x00',
+        GS + b'(k\x03\x001C' + bytes((QR_MODULE_DOTS + 2,)),
+        GS + b'(k\x03\x001E1',
+        GS + b'(k' + bytes((length & 0xFF, length >> 8)) + b'1P0' + payload,
+        GS + b'(k\x03\x001Q0',
+    ))
+
+
+def qr_raster(data):
+    import qrcode
+    qr = qrcode.QRCode(border=0, error_correction=qrcode.constants.ERROR_CORRECT_M)
+    qr.add_data(data)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+    width_dots = len(matrix) * QR_MODULE_DOTS
+    width_bytes = (width_dots + 7) // 8
+    rows = b''.join(
+        _row(''.join(('1' if cell else '0') * QR_MODULE_DOTS for cell in matrix_row), width_bytes) * QR_MODULE_DOTS
+        for matrix_row in matrix
+    )
+    return _raster(rows, width_dots)
+
+
+class EscPosLayout:
+    def __init__(self, layout, paper=80, qr='native'):
+        if paper not in WIDTHS:
+            raise ValueError(f"Unsupported paper width {paper}mm; expected one of {', '.join(map(str, WIDTHS))}")
+        self.layout = layout
+        self.columns = WIDTHS[paper][0]
+        self.qr = qr_raster if qr == 'raster' else qr_native
+        rule = _encode('-' * self.columns + '\n')
+        header = [INIT, CENTER, DOUBLE_ON, BOLD_ON]
+        # Double width halves the characters per line
+        header += [_encode(line + '\n') for line in _wrap(layout.title, self.columns // 2)]
+        header += [BOLD_OFF, DOUBLE_OFF]
+        header += [_encode(wrapped + '\n') for line in layout.header_lines for wrapped in _wrap(line, self.columns)]
+        header += [LEFT, rule]
+        self.header = b''.join(header)
+        footer = [rule, CENTER]
+        footer += [_encode(wrapped + '\n') for line in layout.footer_lines for wrapped in _wrap(line, self.columns)]
+        self.footer = b''.join(footer)
+
+    def _field(self, label, value):
+        text = f'{label}: '
+        if len(text) + len(value) <= self.columns:
+            return _encode(text + value.rjust(self.columns - len(text)) + '\n')
+        return _encode(text + '\n' + '\n'.join(line.rjust(self.columns) for line in _wrap(value, self.columns)) + '\n')
+
+    def render(self, sale):
+        parts = [self.header]
+        parts += [self._field(label, value) for label, value in self.layout.field_lines(sale)]
+        parts.append(self.footer)
+        parts.append(self.qr(self.layout.qr_payload(sale)))
+        parts.append(b'\n')
+        parts.append(barcode_raster(self.layout.barcode_value(sale)))
+        parts.append(_encode('\n' + self.layout.barcode_value(sale) + '\n'))
+        parts.append(CUT)
+        return b''.join(parts)
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.layouts = {}  # (layout key, paper, qr) -> EscPosLayout
+
+
+def escpos_layout(layout, paper=80, qr='native'):
+    # Kept per app, like the PDF layout in receipts.py
+    state = app_state('escpos', _State)
+    key = (layout.key, paper, qr)
+    with state.lock:
+        if key not in state.layouts:
+            state.layouts.clear()  # only the current receipt settings are kept
+            state.layouts[key] = EscPosLayout(layout, paper, qr)
+        return state.layouts[key]
+
+
+def write_file(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def spool(directory, name, data):
+    # Written under a temporary name and renamed so a print daemon watching
+    # the directory never picks up a partial job
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    path = os.path.join(directory, name)
+    os.replace(tmp, path)
+    return path
+
+
+def send_socket(address, data, timeout=5):
+    # address: 'tcp:host:port' or 'unix:/path/to/socket'
+    kind, _, target = address.partition(':')
+    if kind == 'tcp':
+        host, _, port = target.rpartition(':')
+        connection = socket.create_connection((host, int(port)), timeout=timeout)
+    elif kind == 'unix':
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(timeout)
+        connection.connect(target)
+    else:
+        raise ValueError(f'Unknown printer socket {address!r}; use tcp:host:port or unix:/path')
+    with connection:
+        connection.sendall(data)
+    return address
+
+
+def send(target, name, data):
+    # target: 'file:/path', 'spool:/dir', 'tcp:host:port' or 'unix:/path'
+    kind, _, location = target.partition(':')
+    if kind == 'file':
+        return write_file(location, data)
+    if kind == 'spool':
+        return spool(location, name, data)
+    return send_socket(target, data)
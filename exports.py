@@ -0,0 +1,91 @@
+# Streaming CSV exports
+# Rows come from a column-only query read in yield_per batches (a server-side
+# cursor where the driver supports one), are written to CSV in small chunks
+# and optionally gzip-compressed on the fly, so an export holds one batch and
+# one chunk in memory however large the catalogue is.
+
+import csv
+import io
+import zlib
+from flask import Response, stream_with_context
+from sqlalchemy import select
+from models import db, Product
+
+CHUNK_SIZE = 16 * 1024
+YIELD_PER = 1000
+
+PRODUCT_COLUMNS = {
+    'id': Product.id,
+    'name': Product.name,
+    'buying_price': Product.buying_price,
+    'selling_price': Product.selling_price,
+    'stock': Product.stock,
+    'unit': Product.unit,
+    'category_id': Product.category_id,
+    'supplier_id': Product.supplier_id,
+    'barcode': Product.barcode,
+    'image': Product.image,
+    'description': Product.description,
+}
+
+
+def parse_columns(value, available, default):
+    # Returns the requested column names; raises ValueError for unknown ones
+    if not value:
+        return list(default)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}. Available: {', '.join(available)}")
+    return names
+
+
+def stream_rows(columns, order_by=None):
+    # Yields tuples for the given column expressions without loading them all
+    statement = select(*columns).order_by(order_by if order_by is not None else columns[0])
+    result = db.session.execute(statement.execution_options(yield_per=YIELD_PER, stream_results=True))
+    try:
+        yield from result
+    finally:
+        result.close()
+
+
+def csv_chunks(header, rows):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if output.tell() >= CHUNK_SIZE:
+            yield output.getvalue().encode()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue().encode()
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def csv_response(filename, header, rows, gzip=False):
+    chunks = csv_chunks(header, rows)
+    mimetype = 'text/csv'
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+def product_export(columns, header=None, filename='products.csv', gzip=False):
+    rows = stream_rows([PRODUCT_COLUMNS[name] for name in columns], order_by=Product.id)
+    return csv_response(filename, header or columns, rows, gzip=gzip)
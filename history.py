@@ -0,0 +1,94 @@
+# Product change history
+# Price, stock and name changes made through the ORM are captured at flush
+# time from each dirty Product's attribute history, and all the history rows
+# of one flush are written with a single executemany INSERT on the flush's
+# own connection, so they commit or roll back with the change itself.
+# Set-based UPDATEs bypass the unit of work and are not seen here: checkout
+# stock decrements are already recorded as sales, bulk.py writes its own
+# history rows with INSERT ... SELECT, and importer.py passes the rows of its
+# executemany UPDATE to record_updates() before running it.
+
+from datetime import datetime
+from flask import has_request_context, session
+from sqlalchemy import event, insert, inspect, select
+from sqlalchemy.orm import Session
+from models import db, Product, ProductHistory
+from database import IN_CHUNK
+
+# Product attribute -> ProductHistory.change_type
+TRACKED = {
+    'selling_price': 'price',
+    'buying_price': 'buying_price',
+    'stock': 'stock',
+    'name': 'name',
+    'category_id': 'category',
+    'supplier_id': 'supplier',
+}
+
+
+def current_user_id():
+    return session.get('user_id') if has_request_context() else None
+
+
+def _value(value):
+    return None if value is None else str(value)[:100]
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_changes(session, flush_context):
+    rows = []
+    timestamp = datetime.utcnow()
+    user_id = None
+    for obj in session.dirty:
+        if not isinstance(obj, Product):
+            continue
+        state = inspect(obj)
+        for attribute, change_type in TRACKED.items():
+            added, _, deleted = state.attrs[attribute].history
+            if not added or not deleted or added[0] == deleted[0]:
+                continue
+            if user_id is None:
+                user_id = current_user_id()
+            rows.append({
+                'product_id': obj.id,
+                'change_type': change_type,
+                'old_value': _value(deleted[0]),
+                'new_value': _value(added[0]),
+                'timestamp': timestamp,
+                'user_id': user_id,
+            })
+    if rows:
+        session.connection().execute(insert(ProductHistory), rows)
+
+
+def record_updates(updates):
+    # Writes history rows for a pending UPDATE given as executemany
+    # parameters ({'id': ..., column: new value, ...}); call it before the
+    # UPDATE so the current values can be read with one SELECT per chunk
+    attributes = [attribute for attribute in TRACKED if any(attribute in values for values in updates)]
+    if not attributes:
+        return
+    ids = [values['id'] for values in updates]
+    current = {}
+    for start in range(0, len(ids), IN_CHUNK):
+        statement = select(Product.id, *(getattr(Product, attribute) for attribute in attributes)).where(Product.id.in_(ids[start:start + IN_CHUNK]))
+        current.update((row[0], row[1:]) for row in db.session.execute(statement))
+    rows = []
+    timestamp = datetime.utcnow()
+    user_id = current_user_id()
+    for values in updates:
+        old = current.get(values['id'])
+        if old is None:
+            continue
+        for attribute, old_value in zip(attributes, old):
+            if attribute in values and values[attribute] != old_value:
+                rows.append({
+                    'product_id': values['id'],
+                    'change_type': TRACKED[attribute],
+                    'old_value': _value(old_value),
+                    'new_value': _value(values[attribute]),
+                    'timestamp': timestamp,
+                    'user_id': user_id,
+                })
+    if rows:
+        db.session.execute(insert(ProductHistory), rows)
@@ -0,0 +1,208 @@
+# Uploaded images
+# An upload is checked with Pillow and stored once under the hash of its
+# contents (static/uploads/<hash>.<ext>), so the same photo uploaded twice is
+# one file and two different photos called IMG_0001.jpg no longer overwrite
+# each other. Resized variants for each of SIZES are written in WebP and
+# JPEG next to it (<hash>-thumb.webp, <hash>-thumb.jpg, ...) by a small
+# thread pool, so the request that uploaded the image does not wait for the
+# resizing. Until a variant exists, image_url() returns None and templates
+# fall back to the original. Hash-named files never change, so
+# /images/<name> serves them with a one-year immutable Cache-Control.
+#
+# Product.image and the business_logo setting keep storing the path relative
+# to the app root, which is what receipts.py and older rows already use;
+# `flask process-images` moves older uploads to hash names and creates any
+# missing variants.
+#
+# Pillow is imported on first use, so processes that never handle an image
+# do not pay for it.
+
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+from flask import current_app, send_from_directory, url_for
+import workers
+
+# Upload file names accepted by the forms; the contents are checked by store()
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+# Pillow format -> stored extension
+FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+# Variant name -> bounding box; the image keeps its aspect ratio
+SIZES = {'thumb': (96, 96), 'display': (800, 800)}
+# Written in this order, so an existing .jpg means the .webp is there too
+VARIANT_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+HASH_LENGTH = 20
+HASHED_NAME = re.compile(r'^[0-9a-f]{%d}(-[a-z]+)?\.[a-z]+$' % HASH_LENGTH)
+CACHE_MAX_AGE = 365 * 24 * 3600
+
+logger = logging.getLogger(__name__)
+
+
+def init_app(app):
+    app.jinja_env.globals['image_url'] = image_url
+    app.add_url_rule('/images/<path:filename>', 'uploaded_image', uploaded_image)
+
+
+def uploaded_image(filename):
+    # Hash-named uploads and their variants never change
+    immutable = is_immutable(filename)
+    response = send_from_directory(folder(), filename, max_age=CACHE_MAX_AGE if immutable else 0)
+    if immutable:
+        response.headers['Cache-Control'] = f'public, max-age={CACHE_MAX_AGE}, immutable'
+    return response
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def folder():
+    return os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
+
+
+def is_immutable(filename):
+    return HASHED_NAME.match(filename) is not None
+
+
+def _write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def store(data):
+    # Validates the bytes as an image and stores them under their hash;
+    # returns the stored file name. Raises ValueError for non-images.
+    from PIL import Image, UnidentifiedImageError
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image_format = image.format
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise ValueError('The uploaded file is not a valid image.')
+    if image_format not in FORMATS:
+        raise ValueError(f"Unsupported image format {image_format}; use {', '.join(FORMATS)}.")
+    name = f'{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}.{FORMATS[image_format]}'
+    directory = folder()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        _write_atomic(path, data)
+    return name
+
+
+def save_upload(file):
+    # Stores an uploaded FileStorage and schedules its variants; returns the
+    # value to keep in Product.image or the business_logo setting
+    limit = current_app.config['IMAGE_MAX_BYTES']
+    data = file.read(limit + 1)
+    if len(data) > limit:
+        raise ValueError(f'Images must be smaller than {limit // (1024 * 1024)} MB.')
+    name = store(data)
+    schedule(os.path.join(folder(), name))
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], name)
+
+
+def variant_name(name, size, extension):
+    return f'{os.path.splitext(name)[0]}-{size}.{extension}'
+
+
+def make_variants(path):
+    # Writes the missing variants of one stored image; returns how many
+    directory, name = os.path.split(path)
+    missing = [
+        (size, extension, image_format, options)
+        for size in SIZES
+        for extension, image_format, options in VARIANT_FORMATS
+        if not os.path.exists(os.path.join(directory, variant_name(name, size, extension)))
+    ]
+    if not missing:
+        return 0
+    from PIL import Image, ImageOps
+    with Image.open(path) as original:
+        original.seek(0)  # first frame of animated images
+        source = ImageOps.exif_transpose(original)
+        source = source.convert('RGBA' if 'A' in source.getbands() or 'transparency' in source.info else 'RGB')
+    resized = {}
+    for size, extension, image_format, options in missing:
+        if size not in resized:
+            resized[size] = source.copy()
+            resized[size].thumbnail(SIZES[size], Image.LANCZOS)
+        image = resized[size]
+        if image_format == 'JPEG' and image.mode == 'RGBA':
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        buffer = io.BytesIO()
+        image.save(buffer, image_format, **options)
+        _write_atomic(os.path.join(directory, variant_name(name, size, extension)), buffer.getvalue())
+    return len(missing)
+
+
+def _process(path):
+    try:
+        make_variants(path)
+    except Exception:
+        logger.exception('Could not create variants of %s', path)
+
+
+def schedule(path):
+    # Variants are created in the background; failures are only logged, the
+    # original keeps being served
+    workers.executor('image').submit(_process, path)
+
+
+def image_url(value, size=None, extension='jpg'):
+    # URL of a stored image (size=None) or of one of its variants; None when
+    # there is no image or the variant has not been created yet
+    if not value:
+        return None
+    name = os.path.basename(value)
+    if size is not None:
+        name = variant_name(name, size, extension)
+        if not os.path.exists(os.path.join(folder(), name)):
+            return None
+    return url_for('uploaded_image', filename=name)
+
+
+def _resolve(value):
+    # Stored paths are relative to the app root; some older rows hold only
+    # the file name inside the upload folder
+    path = value if os.path.isabs(value) else os.path.join(current_app.root_path, value)
+    if not os.path.exists(path):
+        path = os.path.join(folder(), os.path.basename(value))
+    return path
+
+
+def backfill(values):
+    # values: {key: stored path}. Moves files that are not hash-named yet to
+    # their hash name and creates missing variants, synchronously. Returns
+    # ({key: new stored path}, report counts).
+    report = {'images': 0, 'renamed': 0, 'variants': 0, 'missing': 0, 'invalid': 0}
+    changed = {}
+    for key, value in values.items():
+        path = _resolve(value)
+        if not os.path.exists(path):
+            report['missing'] += 1
+            continue
+        report['images'] += 1
+        name = os.path.basename(path)
+        if not is_immutable(name) or os.path.dirname(path) != folder():
+            with open(path, 'rb') as f:
+                data = f.read()
+            try:
+                name = store(data)
+            except ValueError:
+                report['invalid'] += 1
+                continue
+            changed[key] = os.path.join(current_app.config['UPLOAD_FOLDER'], name)
+            report['renamed'] += 1
+        report['variants'] += make_variants(os.path.join(folder(), name))
+    return changed, report
@@ -0,0 +1,152 @@
+# Streaming product CSV import
+# The upload is decoded and parsed row by row and written in batches: each
+# batch looks up its barcodes with one IN query, updates the matching
+# products with one executemany UPDATE (recording their price, stock, name,
+# category and supplier changes in ProductHistory first), inserts the rest
+# with one executemany INSERT and commits. Bad rows are reported, not fatal.
+
+import csv
+import io
+import time
+from sqlalchemy import insert, update
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, Product
+from database import IN_CHUNK
+import history
+import reorder
+import search
+
+BATCH_SIZE = 1000
+
+FLOAT_COLUMNS = ('buying_price', 'selling_price')
+INT_COLUMNS = ('stock', 'category_id', 'supplier_id')
+TEXT_COLUMNS = ('name', 'unit', 'barcode', 'image', 'description')
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.errors = []  # (line number, message)
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'errors': [{'line': line, 'message': message} for line, message in self.errors],
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+def parse_row(row):
+    # Returns the product columns present in the row; raises ValueError
+    values = {}
+    if row.get('selling_price') in (None, '') and row.get('price') not in (None, ''):
+        row = dict(row, selling_price=row['price'])  # older exports used 'price'
+    for column in FLOAT_COLUMNS:
+        if row.get(column) not in (None, ''):
+            try:
+                values[column] = float(row[column])
+            except ValueError:
+                raise ValueError(f'{column} must be a number, got {row[column]!r}')
+    for column in INT_COLUMNS:
+        if row.get(column) not in (None, ''):
+            try:
+                values[column] = int(row[column])
+            except ValueError:
+                raise ValueError(f'{column} must be a whole number, got {row[column]!r}')
+    for column in TEXT_COLUMNS:
+        if row.get(column) not in (None, ''):
+            values[column] = row[column].strip()
+    if values.get('stock', 0) < 0:
+        raise ValueError('stock cannot be negative')
+    return values
+
+
+def _new_product(values):
+    if not values.get('name'):
+        raise ValueError('name is required for new products')
+    if 'stock' not in values:
+        raise ValueError('stock is required for new products')
+    return dict({'buying_price': 0.0, 'selling_price': 0.0}, **values)
+
+
+def _write_batch(batch, report):
+    # batch: [(line, values)]; later rows win for a repeated barcode
+    by_barcode = {}
+    plain = []
+    for line, values in batch:
+        if values.get('barcode'):
+            by_barcode[values['barcode']] = (line, values)
+        else:
+            plain.append((line, values))
+
+    existing = {}
+    barcodes = list(by_barcode)
+    for start in range(0, len(barcodes), IN_CHUNK):
+        existing.update(db.session.query(Product.barcode, Product.id).filter(Product.barcode.in_(barcodes[start:start + IN_CHUNK])))
+
+    updates, inserts = [], []
+    for barcode, (line, values) in by_barcode.items():
+        if barcode in existing:
+            updates.append(dict(values, id=existing[barcode]))
+        else:
+            plain.append((line, values))
+    for line, values in plain:
+        try:
+            inserts.append(_new_product(values))
+        except ValueError as e:
+            report.errors.append((line, str(e)))
+
+    try:
+        if updates:
+            history.record_updates(updates)
+            db.session.execute(update(Product), updates)
+        new_ids = []
+        if inserts:
+            new_ids = list(db.session.execute(insert(Product).returning(Product.id), inserts).scalars())
+        changed_ids = [row['id'] for row in updates] + new_ids
+        search.index_products(changed_ids)
+        reorder.refresh(changed_ids)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        lines = [line for line, _ in batch]
+        report.errors.append((min(lines), f'batch of rows {min(lines)}-{max(lines)} failed: {e.__class__.__name__}'))
+        return
+    report.updated += len(updates)
+    report.inserted += len(inserts)
+
+
+def import_csv(stream, batch_size=BATCH_SIZE):
+    # stream is a binary file object, e.g. request.files['csv'].stream
+    report = ImportReport()
+    started = time.perf_counter()
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    batch = []
+    try:
+        for line, row in enumerate(reader, start=2):
+            report.rows += 1
+            try:
+                batch.append((line, parse_row(row)))
+            except ValueError as e:
+                report.errors.append((line, str(e)))
+            if len(batch) >= batch_size:
+                _write_batch(batch, report)
+                batch = []
+    except (UnicodeDecodeError, csv.Error) as e:
+        report.errors.append((reader.line_num, f'could not read CSV: {e}'))
+    if batch:
+        _write_batch(batch, report)
+    # A batch failure is reported after the parse errors of its later lines
+    report.errors.sort(key=lambda error: error[0])
+    report.seconds = time.perf_counter() - started
+    return report
@@ -0,0 +1,247 @@
+# Request and SQL instrumentation
+# Every request is timed from before_request to teardown, and every SQL
+# statement is timed with engine cursor events; statements run during a
+# request are counted against its endpoint (one counter bump in flask.g per
+# statement, no lock), and the totals are folded into the per-endpoint
+# histograms once per request. Statements slower than METRICS_SLOW_QUERY_MS
+# are logged and the latest few kept for /admin/metrics. Figures are per
+# process: with several workers each one reports its own since it started.
+
+import copy
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BACKGROUND = '-'  # endpoint label for statements run outside a request
+STATEMENT_LOG_LENGTH = 500
+
+_lock = threading.Lock()
+_endpoints = {}  # (endpoint, method) -> EndpointStats
+_statuses = {}  # (endpoint, method, status) -> requests
+_background = {'statements': 0, 'seconds': 0.0}
+_slow_queries = deque(maxlen=50)
+_slow_query_total = 0
+_slow_query_seconds = 0.1
+_started = datetime.utcnow()
+
+
+class EndpointStats:
+    __slots__ = ('buckets', 'count', 'seconds', 'statements', 'sql_seconds', 'max_statements')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.max_statements = 0
+
+    def observe(self, seconds, statements, sql_seconds):
+        index = 0
+        while index < len(BUCKETS) and seconds > BUCKETS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.seconds += seconds
+        self.statements += statements
+        self.sql_seconds += sql_seconds
+        self.max_statements = max(self.max_statements, statements)
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th request; None past the last bound
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+
+def init_app(app):
+    global _slow_query_seconds, _slow_queries
+    if not app.config['METRICS_ENABLED']:
+        return
+    _slow_query_seconds = app.config['METRICS_SLOW_QUERY_MS'] / 1000
+    _slow_queries = deque(maxlen=app.config['METRICS_SLOW_QUERY_KEEP'])
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    global _slow_query_total
+    seconds = time.perf_counter() - conn.info['metrics_started'].pop()
+    in_request = has_request_context() and 'metrics_started' in g
+    if in_request:
+        g.metrics_statements += 1
+        g.metrics_sql_seconds += seconds
+    else:
+        with _lock:
+            _background['statements'] += 1
+            _background['seconds'] += seconds
+    if seconds >= _slow_query_seconds:
+        endpoint = _endpoint() if in_request else BACKGROUND
+        logger.warning('Slow query (%.1f ms, %s): %s', seconds * 1000, endpoint, statement[:STATEMENT_LOG_LENGTH])
+        with _lock:
+            _slow_query_total += 1
+            _slow_queries.append({
+                'at': datetime.utcnow().isoformat(timespec='seconds'),
+                'endpoint': endpoint,
+                'ms': round(seconds * 1000, 2),
+                'executemany': executemany,
+                'statement': statement[:STATEMENT_LOG_LENGTH],
+            })
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    started = context.connection.info.get('metrics_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def _endpoint():
+    # Route names only, so unknown URLs cannot grow the label set
+    return request.url_rule.endpoint if request.url_rule is not None else 'unmatched'
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_statements = 0
+    g.metrics_sql_seconds = 0.0
+
+
+def _after_request(response):
+    g.metrics_status = response.status_code
+    if 'metrics_started' in g:
+        # Time until the response is returned; streamed bodies are still
+        # being sent at this point and are timed fully at teardown
+        response.headers['Server-Timing'] = (
+            f'app;dur={(time.perf_counter() - g.metrics_started) * 1000:.1f}, '
+            f'db;dur={g.metrics_sql_seconds * 1000:.1f};desc="{g.metrics_statements} queries"'
+        )
+    return response
+
+
+def _teardown_request(exc):
+    if 'metrics_started' not in g:
+        return
+    seconds = time.perf_counter() - g.pop('metrics_started')
+    key = (_endpoint(), request.method)
+    status = 500 if exc is not None else g.get('metrics_status', 500)
+    with _lock:
+        stats = _endpoints.get(key)
+        if stats is None:
+            stats = _endpoints[key] = EndpointStats()
+        stats.observe(seconds, g.metrics_statements, g.metrics_sql_seconds)
+        _statuses[key + (status,)] = _statuses.get(key + (status,), 0) + 1
+
+
+def snapshot():
+    with _lock:
+        endpoints = {key: _copy(stats) for key, stats in _endpoints.items()}
+        return {
+            'endpoints': endpoints,
+            'statuses': dict(_statuses),
+            'background': dict(_background),
+            'slow_queries': list(_slow_queries),
+            'slow_query_total': _slow_query_total,
+        }
+
+
+def _copy(stats):
+    copied = copy.copy(stats)
+    copied.buckets = list(stats.buckets)
+    return copied
+
+
+def to_dict():
+    data = snapshot()
+    endpoints = []
+    for (endpoint, method), stats in sorted(data['endpoints'].items()):
+        endpoints.append({
+            'endpoint': endpoint,
+            'method': method,
+            'requests': stats.count,
+            'statuses': {str(status): count for (e, m, status), count in data['statuses'].items() if (e, m) == (endpoint, method)},
+            'mean_ms': round(stats.seconds / stats.count * 1000, 2),
+            'p50_ms': _ms(stats.quantile(0.5)),
+            'p95_ms': _ms(stats.quantile(0.95)),
+            'p99_ms': _ms(stats.quantile(0.99)),
+            'sql_statements': stats.statements,
+            'sql_per_request': round(stats.statements / stats.count, 2),
+            'sql_max_per_request': stats.max_statements,
+            'sql_ms': round(stats.sql_seconds * 1000, 2),
+        })
+    return {
+        'pid': os.getpid(),
+        'since': _started.isoformat(timespec='seconds'),
+        'slow_query_ms': _slow_query_seconds * 1000,
+        'endpoints': endpoints,
+        'background_sql': {'statements': data['background']['statements'], 'ms': round(data['background']['seconds'] * 1000, 2)},
+        'slow_query_total': data['slow_query_total'],
+        'slow_queries': data['slow_queries'],
+    }
+
+
+def _ms(seconds):
+    # Percentiles are bucket upper bounds; None means above the last bucket
+    return None if seconds is None else seconds * 1000
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels.items()) + '}'
+
+
+def prometheus():
+    # Prometheus text exposition format 0.0.4
+    data = snapshot()
+    lines = [
+        '# HELP duka_request_duration_seconds Request latency by endpoint.',
+        '# TYPE duka_request_duration_seconds histogram',
+    ]
+    endpoints = sorted(data['endpoints'].items())
+    for (endpoint, method), stats in endpoints:
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), stats.buckets):
+            cumulative += count
+            lines.append(f'duka_request_duration_seconds_bucket{_labels(endpoint=endpoint, method=method, le=bound)} {cumulative}')
+        lines.append(f'duka_request_duration_seconds_sum{_labels(endpoint=endpoint, method=method)} {stats.seconds:.6f}')
+        lines.append(f'duka_request_duration_seconds_count{_labels(endpoint=endpoint, method=method)} {stats.count}')
+    lines += ['# HELP duka_requests_total Requests by endpoint and status.', '# TYPE duka_requests_total counter']
+    for (endpoint, method, status), count in sorted(data['statuses'].items()):
+        lines.append(f'duka_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+    lines += ['# HELP duka_sql_statements_total SQL statements by endpoint.', '# TYPE duka_sql_statements_total counter']
+    for (endpoint, method), stats in endpoints:
+        lines.append(f'duka_sql_statements_total{_labels(endpoint=endpoint, method=method)} {stats.statements}')
+    lines.append(f"duka_sql_statements_total{_labels(endpoint=BACKGROUND, method=BACKGROUND)} {data['background']['statements']}")
+    lines += ['# HELP duka_sql_duration_seconds_total Time spent in SQL by endpoint.', '# TYPE duka_sql_duration_seconds_total counter']
+    for (endpoint, method), stats in endpoints:
+        lines.append(f'duka_sql_duration_seconds_total{_labels(endpoint=endpoint, method=method)} {stats.sql_seconds:.6f}')
+    lines.append(f"duka_sql_duration_seconds_total{_labels(endpoint=BACKGROUND, method=BACKGROUND)} {data['background']['seconds']:.6f}")
+    lines += [
+        '# HELP duka_sql_slow_queries_total SQL statements slower than the slow query threshold.',
+        '# TYPE duka_sql_slow_queries_total counter',
+        f"duka_sql_slow_queries_total {data['slow_query_total']}",
+    ]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,119 @@
+# Versioned schema migrations
+# db.create_all() only creates missing tables; it never changes a table that
+# already exists in duka.db. Schema changes for existing tables are listed
+# here instead, each under a version number, and upgrade() applies the ones
+# not yet recorded in SchemaMigration. Every step is written to be idempotent
+# so upgrade() is safe to run on each start and from several workers at once.
+
+import re
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+import reorder
+import rollups
+import search
+from models import db, SchemaMigration, Product, Sale, SupplierOrder, ProductHistory, AuditLog, ReorderPoint
+
+# (version, description, steps); a step is an SQL string or a callable
+# taking the session
+MIGRATIONS = [
+    (1, 'Indexes for hot filter and sort columns', [
+        'CREATE INDEX IF NOT EXISTS ix_sale_timestamp_id ON sale (timestamp, id)',
+        'CREATE INDEX IF NOT EXISTS ix_sale_product_id_timestamp ON sale (product_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_sale_payment_method_timestamp ON sale (payment_method, timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_supplier_order_supplier_id_status ON supplier_order (supplier_id, status)',
+        'CREATE INDEX IF NOT EXISTS ix_supplier_order_status_order_date ON supplier_order (status, order_date)',
+        'CREATE INDEX IF NOT EXISTS ix_supplier_order_order_date ON supplier_order (order_date)',
+        'CREATE INDEX IF NOT EXISTS ix_product_history_product_id_timestamp ON product_history (product_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_audit_log_timestamp ON audit_log (timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_product_barcode ON product (barcode)',
+        'CREATE INDEX IF NOT EXISTS ix_product_category_id ON product (category_id)',
+        'CREATE INDEX IF NOT EXISTS ix_product_supplier_id ON product (supplier_id)',
+        'CREATE INDEX IF NOT EXISTS ix_product_stock ON product (stock)',
+    ]),
+    (2, 'Full-text search table for products (SQLite FTS5 only)', [
+        search.create_fts_table,
+    ]),
+    # Reorder velocities are read from the rollups, so fill those first
+    (3, 'Reorder points for existing products', [
+        rollups.backfill,
+        reorder.backfill,
+    ]),
+    (4, 'Index for paging a supplier\'s orders by date', [
+        'CREATE INDEX IF NOT EXISTS ix_supplier_order_supplier_id_order_date ON supplier_order (supplier_id, order_date)',
+    ]),
+    (5, 'Sales rollups for databases upgraded before they were backfilled', [
+        rollups.backfill,
+        reorder.backfill,
+    ]),
+]
+
+
+def applied_versions():
+    return {row[0] for row in db.session.query(SchemaMigration.version)}
+
+
+def upgrade():
+    # Returns the list of versions applied by this call
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    done = applied_versions()
+    applied = []
+    for version, description, steps in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in done:
+            continue
+        try:
+            for step in steps:
+                if callable(step):
+                    step(db.session)
+                else:
+                    db.session.execute(text(step))
+            db.session.add(SchemaMigration(version=version, description=description))
+            db.session.commit()
+        except IntegrityError:
+            # Another worker recorded this version first
+            db.session.rollback()
+            continue
+        applied.append(version)
+    return applied
+
+
+def current_version():
+    return max(applied_versions(), default=0)
+
+
+# EXPLAIN-based index check
+
+def _key_queries():
+    from sales_queries import sales_query
+    from supplier_analytics import scorecard_query
+    return [
+        ('sales list page', sales_query({}), 'ix_sale_timestamp_id'),
+        ('sales by payment method', sales_query({'payment_method': 'Cash'}), 'ix_sale_payment_method_timestamp'),
+        ('sales of a product', Sale.query.filter(Sale.product_id == 1).order_by(Sale.timestamp), 'ix_sale_product_id_timestamp'),
+        ('product by barcode', Product.query.filter(Product.barcode == '0'), 'ix_product_barcode'),
+        ('products by category', Product.query.filter(Product.category_id == 1), 'ix_product_category_id'),
+        ('products by supplier', Product.query.filter(Product.supplier_id == 1), 'ix_product_supplier_id'),
+        ('low stock products', Product.query.filter(Product.stock < 5), 'ix_product_stock'),
+        ('pending supplier orders', SupplierOrder.query.filter(SupplierOrder.supplier_id == 1, SupplierOrder.status == 'Pending'), 'ix_supplier_order_supplier_id_status'),
+        ('supplier scorecards', scorecard_query(current_app.config['REORDER_LEAD_DAYS']), 'ix_supplier_order_supplier_id_order_date'),
+        ('supplier order history', SupplierOrder.query.filter(SupplierOrder.supplier_id == 1).order_by(SupplierOrder.order_date.desc()).limit(50), 'ix_supplier_order_supplier_id_order_date'),
+        ('delivered expenses', SupplierOrder.query.filter(SupplierOrder.status == 'Delivered').order_by(SupplierOrder.order_date), 'ix_supplier_order_status_order_date'),
+        ('recent supplier orders', SupplierOrder.query.order_by(SupplierOrder.order_date.desc()).limit(5), 'ix_supplier_order_order_date'),
+        ('product history', ProductHistory.query.filter(ProductHistory.product_id == 1).order_by(ProductHistory.timestamp.desc()), 'ix_product_history_product_id_timestamp'),
+        ('products to reorder', db.session.query(db.func.count()).select_from(ReorderPoint).filter(ReorderPoint.needs_reorder.is_(True)), 'ix_reorder_point_needs_reorder_supplier_id'),
+        ('recent audit logs', AuditLog.query.order_by(AuditLog.timestamp.desc()).limit(10), 'ix_audit_log_timestamp'),
+    ]
+
+
+def check_indexes():
+    # Returns [(name, expected_index, plan_text, ok)] for the key queries
+    bind = db.session.get_bind()
+    explain = 'EXPLAIN QUERY PLAN ' if bind.dialect.name == 'sqlite' else 'EXPLAIN '
+    results = []
+    for name, query, expected in _key_queries():
+        statement = getattr(query, 'statement', query)
+        sql = str(statement.compile(dialect=bind.dialect, compile_kwargs={'literal_binds': True}))
+        plan = ' | '.join(str(row[-1]) for row in db.session.execute(text(explain + sql)))
+        # Whole index names only: ix_a must not match ix_a_b
+        results.append((name, expected, plan, re.search(rf'\b{re.escape(expected)}\b', plan) is not None))
+    return results
@@ -4,6 +4,9 @@ from flask_sqlalchemy import SQLAlchemy
 db = SQLAlchemy()
 
 class ProductHistory(db.Model):
+    __table_args__ = (
+        db.Index('ix_product_history_product_id_timestamp', 'product_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'))
     change_type = db.Column(db.String(50))  # e.g. 'price', 'stock'
@@ -18,12 +21,12 @@ class Product(db.Model):
     name = db.Column(db.String(100), nullable=False)
     buying_price = db.Column(db.Float, nullable=False, default=0.0)
     selling_price = db.Column(db.Float, nullable=False, default=0.0)
-    stock = db.Column(db.Integer, nullable=False)
+    stock = db.Column(db.Integer, nullable=False, index=True)
     unit = db.Column(db.String(50))
-    category_id = db.Column(db.Integer, db.ForeignKey('category.id'))
-    supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.id'))
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), index=True)
+    supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.id'), index=True)
     image = db.Column(db.String(200))
-    barcode = db.Column(db.String(100))
+    barcode = db.Column(db.String(100), index=True)
     description = db.Column(db.Text)
     histories = db.relationship('ProductHistory', backref='product', lazy=True)
 
@@ -43,6 +46,11 @@ class User(db.Model):
         return check_password_hash(self.password_hash, password)
 
 class Sale(db.Model):
+    __table_args__ = (
+        db.Index('ix_sale_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_sale_product_id_timestamp', 'product_id', 'timestamp'),
+        db.Index('ix_sale_payment_method_timestamp', 'payment_method', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
@@ -58,7 +66,7 @@ class AuditLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     action = db.Column(db.String(255), nullable=False)
-    timestamp = db.Column(db.DateTime, server_default=db.func.now())
+    timestamp = db.Column(db.DateTime, server_default=db.func.now(), index=True)
     user = db.relationship('User')
 
 class Category(db.Model):
@@ -84,12 +92,57 @@ class Supplier(db.Model):
     orders = db.relationship('SupplierOrder', backref='supplier', lazy=True)
 
 class SupplierOrder(db.Model):
+    __table_args__ = (
+        db.Index('ix_supplier_order_supplier_id_status', 'supplier_id', 'status'),
+        db.Index('ix_supplier_order_status_order_date', 'status', 'order_date'),
+        db.Index('ix_supplier_order_supplier_id_order_date', 'supplier_id', 'order_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     cost = db.Column(db.Float, nullable=False)
-    status = db.Column(db.String(50), default='Pending')  # Pending, Delivered, Cancelled
-    order_date = db.Column(db.DateTime, server_default=db.func.now())
+    status = db.Column(db.String(50), default='Pending')  # Draft, Pending, Delivered, Cancelled
+    order_date = db.Column(db.DateTime, server_default=db.func.now(), index=True)
     delivery_date = db.Column(db.DateTime)
     product = db.relationship('Product')
+
+class SalesDailyProduct(db.Model):
+    # Rollup of Sale rows per (day, product); maintained by rollups.record_sale
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    profit = db.Column(db.Float, nullable=False, default=0.0)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    product = db.relationship('Product')
+
+class ReorderPoint(db.Model):
+    # Reorder suggestion per product; maintained by reorder.refresh
+    __table_args__ = (
+        db.Index('ix_reorder_point_needs_reorder_supplier_id', 'needs_reorder', 'supplier_id'),
+    )
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True, autoincrement=False)
+    supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.id'))
+    stock = db.Column(db.Integer, nullable=False, default=0)
+    on_order = db.Column(db.Integer, nullable=False, default=0)
+    daily_velocity = db.Column(db.Float, nullable=False, default=0.0)
+    reorder_point = db.Column(db.Integer, nullable=False, default=0)
+    suggested_quantity = db.Column(db.Integer, nullable=False, default=0)
+    needs_reorder = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime)
+    product = db.relationship('Product')
+    supplier = db.relationship('Supplier')
+
+class SalesMonthlyPayment(db.Model):
+    # Rollup of Sale rows per (month, payment method); month is 'YYYY-MM'
+    month = db.Column(db.String(7), primary_key=True)
+    payment_method = db.Column(db.String(20), primary_key=True)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+
+class SchemaMigration(db.Model):
+    # Versions applied by migrations.upgrade()
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, server_default=db.func.now())
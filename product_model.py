@@ -1,42 +1,278 @@
-# Product data model and storage
-# For simplicity, we'll use an in-memory list. Later, you can switch to a database.
+# In-memory product catalogue
+# A read-through cache of the Product table for the pages that list or look
+# up products on every request (/products, /sales, barcode lookups). Rows
+# are loaded once into compact __slots__ records and indexed by id, barcode,
+# category, supplier and stock level, so a lookup or a filtered page costs
+# dict and set operations instead of a query.
+#
+# Writes are tracked through the session with database.invalidate_on_commit():
+# ORM flushes record the Product ids they touch, set-based INSERT/UPDATE/
+# DELETE statements on product record the ids passed as
+# execution_options={'changed_ids': ids} (or mark the whole catalogue stale
+# when they pass none), and the ids are applied when the session commits. The
+# next read reloads just those rows with one IN query.
+#
+# Commits made by other worker processes show up once CATALOGUE_TTL seconds
+# have passed: the first read after that starts a full reload on a
+# background thread and keeps serving the current copy, and the new copy is
+# swapped in under the lock when it is ready (ids committed meanwhile are
+# reloaded on top of it). Their stock and prices can lag by the TTL plus the
+# reload time; checkout keeps reading the database and decrements stock with
+# a conditional UPDATE, so a stale figure can never oversell or misprice a
+# sale.
 
-class Product:
-    def __init__(self, id, name, price, stock):
+import logging
+import math
+import threading
+import time
+from flask import current_app
+from sqlalchemy import select
+from models import db, Product
+from database import IN_CHUNK, app_state, invalidate_on_commit
+
+# Stock levels at or above this share the last bucket
+STOCK_BUCKETS = 100
+
+logger = logging.getLogger(__name__)
+
+
+class ProductRecord:
+    __slots__ = ('id', 'name', 'barcode', 'buying_price', 'selling_price', 'stock', 'unit', 'category_id', 'supplier_id', 'image')
+
+    COLUMNS = (Product.id, Product.name, Product.barcode, Product.buying_price, Product.selling_price,
+               Product.stock, Product.unit, Product.category_id, Product.supplier_id, Product.image)
+
+    def __init__(self, id, name, barcode, buying_price, selling_price, stock, unit, category_id, supplier_id, image):
         self.id = id
         self.name = name
-        self.price = price
+        self.barcode = barcode
+        self.buying_price = buying_price
+        self.selling_price = selling_price
         self.stock = stock
+        self.unit = unit
+        self.category_id = category_id
+        self.supplier_id = supplier_id
+        self.image = image
+
+    @property
+    def price(self):
+        return self.selling_price
+
+
+class Page:
+    # The attributes of Flask-SQLAlchemy's Pagination used by the templates
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.pages = max(1, math.ceil(total / per_page))
+        self.has_prev = page > 1
+        self.has_next = page < self.pages
+        self.prev_num = page - 1 if self.has_prev else None
+        self.next_num = page + 1 if self.has_next else None
+
+
+def _bucket(stock):
+    return min(max(stock, 0), STOCK_BUCKETS)
+
+
+SORT_KEYS = {
+    'name': lambda record: (record.name or '', record.id),
+    'price': lambda record: (record.selling_price, record.id),
+    'stock': lambda record: (record.stock, record.id),
+}
+
+
+class Catalogue:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded_at = time.monotonic()
+        self.by_id = {}
+        self.by_barcode = {}
+        self.by_category = {}
+        self.by_supplier = {}
+        self.by_stock = {}
+        self._orders = {}  # sort -> (ids), rebuilt after any change
+
+    def _add(self, record):
+        self.by_id[record.id] = record
+        if record.barcode:
+            self.by_barcode.setdefault(record.barcode, set()).add(record.id)
+        self.by_category.setdefault(record.category_id, set()).add(record.id)
+        self.by_supplier.setdefault(record.supplier_id, set()).add(record.id)
+        self.by_stock.setdefault(_bucket(record.stock), set()).add(record.id)
+
+    def _remove(self, product_id):
+        record = self.by_id.pop(product_id, None)
+        if record is None:
+            return
+        if record.barcode:
+            self.by_barcode[record.barcode].discard(product_id)
+        self.by_category[record.category_id].discard(product_id)
+        self.by_supplier[record.supplier_id].discard(product_id)
+        self.by_stock[_bucket(record.stock)].discard(product_id)
+
+    def load(self, rows):
+        for row in rows:
+            self._add(ProductRecord(*row))
+        return self
+
+    def replace(self, product_ids, rows):
+        # product_ids were reloaded; rows holds those that still exist
+        with self.lock:
+            for product_id in product_ids:
+                self._remove(product_id)
+            for row in rows:
+                self._add(ProductRecord(*row))
+            self._orders.clear()
+
+    # Lookups
+
+    def get(self, product_id):
+        return self.by_id.get(product_id)
+
+    def get_by_barcode(self, barcode):
+        # Lowest id when several products share a barcode
+        with self.lock:
+            ids = self.by_barcode.get(barcode)
+            return self.by_id[min(ids)] if ids else None
+
+    def all(self):
+        with self.lock:
+            return [self.by_id[product_id] for product_id in self._ordered('')]
+
+    def low_stock(self, threshold):
+        # Products with stock below threshold, from the stock buckets
+        with self.lock:
+            ids = set()
+            for bucket in range(min(threshold, STOCK_BUCKETS)):
+                ids |= self.by_stock.get(bucket, set())
+            if threshold > STOCK_BUCKETS:
+                ids |= {pid for pid in self.by_stock.get(STOCK_BUCKETS, ()) if self.by_id[pid].stock < threshold}
+            return [self.by_id[product_id] for product_id in sorted(ids)]
+
+    def _ordered(self, sort):
+        order = self._orders.get(sort)
+        if order is None:
+            key = SORT_KEYS.get(sort)
+            records = sorted(self.by_id.values(), key=key) if key else sorted(self.by_id.values(), key=lambda record: record.id)
+            order = self._orders[sort] = tuple(record.id for record in records)
+        return order
+
+    def select(self, ids=None, category_id=None, supplier_id=None, stock_ids=None, sort=''):
+        # Ids of the records matching every given filter, in sort order (a
+        # shared tuple when nothing is filtered); without a sort, ids keeps
+        # its own order (search rank) and otherwise id order
+        with self.lock:
+            candidates = None
+            for subset in (
+                None if ids is None else set(ids),
+                None if category_id is None else self.by_category.get(category_id, set()),
+                None if supplier_id is None else self.by_supplier.get(supplier_id, set()),
+                None if stock_ids is None else set(stock_ids),
+            ):
+                if subset is not None:
+                    candidates = set(subset) if candidates is None else candidates & subset
+            if candidates is None:
+                return self._ordered(sort)
+            candidates &= self.by_id.keys()
+            if sort in SORT_KEYS:
+                return [record.id for record in sorted((self.by_id[pid] for pid in candidates), key=SORT_KEYS[sort])]
+            if ids is not None:
+                return [pid for pid in dict.fromkeys(ids) if pid in candidates]
+            return sorted(candidates)
+
+    def paginate(self, ids, page, per_page):
+        start = (page - 1) * per_page
+        with self.lock:
+            items = [self.by_id[pid] for pid in ids[start:start + per_page] if pid in self.by_id]
+        return Page(items, page, per_page, len(ids))
+
+    def out_of_stock_ids(self):
+        with self.lock:
+            return {pid for pid in self.by_stock.get(0, ()) if self.by_id[pid].stock == 0}
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.catalogue = None
+        self.stale = set()
+        self.all_stale = False
+        self.generation = 0  # bumped by every load in the requesting thread
+        self.reloading = None  # ids invalidated while a background reload runs
+
+
+def _state():
+    return app_state('product_model', _State)
+
+
+def _query(ids=None):
+    query = select(*ProductRecord.COLUMNS)
+    if ids is not None:
+        query = query.where(Product.id.in_(ids))
+    return db.session.execute(query)
+
+
+def _reload_in_background(app, state, generation):
+    try:
+        with app.app_context():
+            try:
+                catalogue = Catalogue().load(_query())
+            finally:
+                db.session.remove()
+    except Exception:
+        logger.exception('Could not reload the product catalogue')
+        catalogue = None
+    with state.lock:
+        if state.generation == generation:
+            if catalogue is None:
+                # Keep the current copy and try again after another TTL
+                state.catalogue.loaded_at = time.monotonic()
+            else:
+                # Rows committed while the reload ran may be missing from it
+                state.catalogue = catalogue
+                state.stale |= state.reloading
+        state.reloading = None
+
+
+def get():
+    # The app's catalogue, brought up to date with commits made by this process
+    state = _state()
+    with state.lock:
+        catalogue = state.catalogue
+        if catalogue is None or state.all_stale:
+            state.stale.clear()
+            state.all_stale = False
+            state.generation += 1
+            catalogue = state.catalogue = Catalogue().load(_query())
+        else:
+            if state.reloading is None and time.monotonic() - catalogue.loaded_at >= current_app.config['CATALOGUE_TTL']:
+                # Keep serving this copy while a fresh one loads
+                state.reloading = set()
+                threading.Thread(
+                    target=_reload_in_background, args=(current_app._get_current_object(), state, state.generation),
+                    name='catalogue-reload', daemon=True
+                ).start()
+            if state.stale:
+                ids = sorted(state.stale)
+                state.stale.clear()
+                for start in range(0, len(ids), IN_CHUNK):
+                    chunk = ids[start:start + IN_CHUNK]
+                    catalogue.replace(chunk, _query(chunk).all())
+        return catalogue
+
+
+def invalidate(product_ids=None):
+    state = _state()
+    with state.lock:
+        if product_ids is None:
+            state.all_stale = True
+        else:
+            state.stale.update(product_ids)
+            if state.reloading is not None:
+                state.reloading.update(product_ids)
 
-products = []
-
-# Helper functions
-
-def add_product(name, price, stock):
-    new_id = len(products) + 1
-    product = Product(new_id, name, price, stock)
-    products.append(product)
-    return product
-
-def get_product(product_id):
-    for product in products:
-        if product.id == product_id:
-            return product
-    return None
-
-def update_product(product_id, name=None, price=None, stock=None):
-    product = get_product(product_id)
-    if product:
-        if name is not None:
-            product.name = name
-        if price is not None:
-            product.price = price
-        if stock is not None:
-            product.stock = stock
-        return product
-    return None
-
-def delete_product(product_id):
-    global products
-    products = [p for p in products if p.id != product_id]
 
+invalidate_on_commit([Product], invalidate)
@@ -0,0 +1,239 @@
+# Product pages: the product list, add/edit/delete, CSV import and export,
+# bulk actions, change history and the product lookup APIs
+
+from flask import Blueprint, request, render_template, redirect, url_for, session, flash, jsonify, abort
+from sqlalchemy.orm import joinedload
+from models import db, Product, ProductHistory, ReorderPoint
+from auth import login_required
+import audit
+import bulk
+import exports
+import images
+import importer
+import product_model
+import refdata
+import reorder
+import search as product_search
+
+bp = Blueprint('products', __name__)
+
+@bp.route('/products', methods=['GET', 'POST'])
+@login_required()
+def products_page():
+    can_edit = session.get('role') == 'admin'
+    search = request.args.get('search', '')
+    category_id = request.args.get('category', type=int)
+    supplier_id = request.args.get('supplier', type=int)
+    stock_status = request.args.get('stock_status', '')
+    sort = request.args.get('sort', '')
+    page = request.args.get('page', 1, type=int)
+    per_page = 10
+
+    # Filtering, sorting and paging run on the in-memory catalogue; only the
+    # search and the low-stock filter and badges query the database, for ids
+    catalogue = product_model.get()
+    stock_ids = None
+    if stock_status == 'low':
+        # Same products as the dashboard's low-stock count
+        stock_ids = [row[0] for row in db.session.query(ReorderPoint.product_id).filter(ReorderPoint.needs_reorder.is_(True))]
+    elif stock_status == 'out':
+        stock_ids = catalogue.out_of_stock_ids()
+    ids = catalogue.select(
+        ids=product_search.search_products(search) if search else None,
+        category_id=category_id or None,
+        supplier_id=supplier_id or None,
+        stock_ids=stock_ids,
+        sort=sort
+    )
+    products = catalogue.paginate(ids, page, per_page)
+    if page < 1 or (page > 1 and not products.items):
+        abort(404)
+    # The low-stock badge uses the same reorder flag as the filter
+    low_stock_ids = {row[0] for row in db.session.query(ReorderPoint.product_id).filter(
+        ReorderPoint.product_id.in_([product.id for product in products.items]),
+        ReorderPoint.needs_reorder.is_(True)
+    )}
+    ref = refdata.get()
+
+    return render_template('products.html',
+        products=products,
+        categories=ref.categories,
+        suppliers=ref.suppliers,
+        units=ref.units,
+        category_names=ref.category_names,
+        supplier_names=ref.supplier_names,
+        can_edit=can_edit,
+        search=search,
+        category_id=category_id,
+        supplier_id=supplier_id,
+        stock_status=stock_status,
+        sort=sort,
+        low_stock_ids=low_stock_ids  # For low stock badge
+    )
+
+@bp.route('/products/edit/<int:product_id>', methods=['GET', 'POST'])
+@login_required(role='admin')
+def edit_product_page(product_id):
+    units = refdata.UNITS
+    product = Product.query.get_or_404(product_id)
+    if request.method == 'POST':
+        product.name = request.form['name']
+        product.selling_price = float(request.form['selling_price'])
+        product.stock = int(request.form['stock'])
+        product.unit = request.form['unit']
+        product_search.index_products([product.id])
+        reorder.refresh([product.id])
+        db.session.commit()
+        audit.log(f'Edited product #{product.id} {product.name}: price {product.selling_price}, stock {product.stock}')
+        return redirect(url_for('products.products_page'))
+    return render_template('edit_product.html', product=product, units=units)
+
+@bp.route('/products/delete/<int:product_id>')
+@login_required(role='admin')
+def delete_product_page(product_id):
+    product = Product.query.get_or_404(product_id)
+    product_search.remove_products([product.id])
+    reorder.remove([product.id])
+    db.session.delete(product)
+    db.session.commit()
+    audit.log(f'Deleted product #{product_id} {product.name}')
+    return redirect(url_for('products.products_page'))
+@bp.route('/products/import', methods=['POST'])
+@login_required(role='admin')
+def import_products():
+    file = request.files.get('csv')
+    if not file:
+        flash('No CSV file uploaded.', 'danger')
+        return redirect(url_for('products.products_page'))
+    report = importer.import_csv(file.stream)
+    reorder.refresh()
+    db.session.commit()
+    audit.log(f'Imported products from {file.filename}: {report.inserted} added, {report.updated} updated, {len(report.errors)} errors')
+    if request.args.get('format') == 'json':
+        return jsonify(report.to_dict())
+    flash(
+        f'Products imported: {report.inserted} added, {report.updated} updated, '
+        f'{len(report.errors)} rows with errors ({report.rows_per_second:.0f} rows/s).',
+        'warning' if report.errors else 'success'
+    )
+    for line, message in report.errors[:5]:
+        flash(f'Row {line}: {message}', 'danger')
+    return redirect(url_for('products.products_page'))
+
+@bp.route('/products/export')
+@login_required(role='admin')
+def export_products():
+    # Default columns match what /products/import reads back
+    default = ['id', 'name', 'buying_price', 'selling_price', 'stock', 'unit', 'category_id', 'supplier_id', 'barcode', 'image']
+    try:
+        columns = exports.parse_columns(request.args.get('columns'), exports.PRODUCT_COLUMNS, default)
+    except ValueError as e:
+        return str(e), 400
+    return exports.product_export(columns, filename='products.csv', gzip=request.args.get('gzip') == '1')
+
+HISTORY_PAGE_SIZE = 25
+
+@bp.route('/products/<int:product_id>/history')
+@login_required()
+def product_history(product_id):
+    product = Product.query.get_or_404(product_id)
+    page = request.args.get('page', 1, type=int)
+    # Served by ix_product_history_product_id_timestamp
+    changes = (
+        ProductHistory.query.options(joinedload(ProductHistory.user))
+        .filter_by(product_id=product.id)
+        .order_by(ProductHistory.timestamp.desc(), ProductHistory.id.desc())
+        .paginate(page=page, per_page=HISTORY_PAGE_SIZE)
+    )
+    return render_template('product_history.html', product=product, history=changes)
+
+@bp.route('/api/reference-data')
+@login_required()
+def api_reference_data():
+    ref = refdata.get()
+    response = jsonify(ref.to_dict())
+    response.set_etag(ref.version)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+@bp.route('/api/products/barcode/<barcode>')
+@login_required()
+def api_product_by_barcode(barcode):
+    product = product_model.get().get_by_barcode(barcode)
+    if product is None:
+        return jsonify({'error': 'Unknown barcode.'}), 404
+    return jsonify({
+        'id': product.id,
+        'name': product.name,
+        'barcode': product.barcode,
+        'selling_price': product.selling_price,
+        'stock': product.stock,
+        'unit': product.unit
+    })
+
+@bp.route('/products/add', methods=['GET', 'POST'])
+@login_required(role='admin')
+def add_product():
+    ref = refdata.get()
+    if request.method == 'POST':
+        name = request.form['name']
+        buying_price = float(request.form['buying_price'])
+        selling_price = float(request.form['selling_price'])
+        stock = int(request.form['stock'])
+        unit = request.form['unit']
+        category_id = int(request.form['category'])
+        supplier_id = int(request.form['supplier'])
+        description = request.form.get('description')
+        image = None
+        if 'image' in request.files:
+            file = request.files['image']
+            if file and images.allowed_file(file.filename):
+                try:
+                    image = images.save_upload(file)
+                except ValueError as e:
+                    flash(str(e), 'danger')
+                    return redirect(url_for('products.add_product'))
+        barcode = request.form.get('barcode')
+        product = Product(
+            name=name,
+            buying_price=buying_price,
+            selling_price=selling_price,
+            stock=stock,
+            unit=unit,
+            category_id=category_id,
+            supplier_id=supplier_id,
+            image=image,
+            barcode=barcode,
+            description=description
+        )
+        db.session.add(product)
+        db.session.flush()
+        product_search.index_products([product.id])
+        reorder.refresh([product.id])
+        db.session.commit()
+        audit.log(f'Added product #{product.id} {product.name}')
+        flash('Product added.', 'success')
+        return redirect(url_for('products.products_page'))
+    return render_template('add_product.html', categories=ref.categories, suppliers=ref.suppliers, units=ref.units)
+
+@bp.route('/products/bulk', methods=['POST'])
+@login_required(role='admin')
+def bulk_products():
+    # ?format=json returns {action, selected, rows, seconds}
+    action = request.form.get('action', '')
+    product_ids = request.form.getlist('product_ids')
+    ref = refdata.get()
+    try:
+        result = bulk.apply(action, product_ids, request.form, ref.category_names, ref.supplier_names)
+    except ValueError as e:
+        db.session.rollback()
+        if request.args.get('format') == 'json':
+            return jsonify({'error': str(e)}), 400
+        flash(str(e), 'danger')
+        return redirect(url_for('products.products_page'))
+    audit.log(f"Bulk {action} on {len(product_ids)} products: {', '.join(map(str, product_ids[:20]))}{' ...' if len(product_ids) > 20 else ''}")
+    if request.args.get('format') == 'json':
+        return jsonify(result.to_dict())
+    label = action.replace('_', ' ')
+    flash(f'Bulk {label}: {result.rows} of {result.selected} products changed in {result.seconds * 1000:.0f} ms.', 'success')
+    return redirect(url_for('products.products_page'))
@@ -0,0 +1,261 @@
+# Receipt rendering
+# A ReceiptLayout is built once per combination of the receipt settings
+# (business details, logo, footer, currency, date format): the logo is
+# decoded and the static header and footer are worked out up front, and in a
+# PDF they are drawn once as a reusable form that every page stamps. Only
+# the per-sale fields are drawn per receipt. The layout is format-neutral, so
+# the thermal-printer backend (escpos.py) prints the same lines.
+#
+# Rendering runs on a small thread pool so the number of receipts rendered
+# at once is bounded, and finished PDFs are kept in a per-app LRU cache by
+# sale id (sales never change once recorded). prerender() warms the cache right
+# after a checkout.
+#
+# Pillow and reportlab are imported on first use, so workers and CLI
+# commands that never render a receipt do not pay for them.
+
+import io
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import select
+from models import db, Sale, Product
+from database import IN_CHUNK, app_state
+import escpos
+import settings
+import workers
+from sales_queries import apply_filters
+
+LAYOUT_KEYS = ('business_name', 'business_address', 'business_phone', 'business_email', 'tax_id', 'business_logo', 'receipt_footer', 'currency_symbol', 'date_format')
+LOGO_SIZE = (120, 60)  # points
+
+
+class ReceiptLayout:
+    def __init__(self, values, root_path='.'):
+        self.key = tuple(values[key] for key in LAYOUT_KEYS)
+        self.title = values['business_name'] or 'Sale Receipt'
+        self.header_lines = [line for line in (
+            values['business_address'],
+            ' / '.join(part for part in (values['business_phone'], values['business_email']) if part),
+            f"Tax ID: {values['tax_id']}" if values['tax_id'] else '',
+        ) if line]
+        self.footer_lines = [line.strip() for line in values['receipt_footer'].splitlines() if line.strip()]
+        self.currency = values['currency_symbol']
+        self.date_format = values['date_format'] or '%Y-%m-%d %H:%M'
+        self.logo_path = None
+        if values['business_logo']:
+            path = values['business_logo']
+            path = path if os.path.isabs(path) else os.path.join(root_path, path)
+            if os.path.exists(path):
+                self.logo_path = path
+        self._logo = None
+
+    def logo(self):
+        # Decoded and scaled down to its printed size once, then shared by
+        # every PDF rendered with this layout
+        if self._logo is None and self.logo_path:
+            from PIL import Image
+            from reportlab.lib.utils import ImageReader
+            with Image.open(self.logo_path) as image:
+                image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+                image.thumbnail((LOGO_SIZE[0] * 2, LOGO_SIZE[1] * 2))
+                self._logo = ImageReader(image)
+        return self._logo
+
+    def money(self, amount):
+        return f'{self.currency} {amount:,.2f}' if self.currency else f'{amount:,.2f}'
+
+    def field_lines(self, sale):
+        # (label, value) pairs for the per-sale part of the receipt
+        unit_price = sale['total_price'] / sale['quantity'] if sale['quantity'] else sale['total_price']
+        return [
+            ('Receipt #', str(sale['id'])),
+            ('Date', sale['timestamp'].strftime(self.date_format) if sale['timestamp'] else '-'),
+            ('Product', sale['product_name'] or '-'),
+            ('Quantity', f"{sale['quantity']} {sale['unit'] or ''}".strip()),
+            ('Unit price', self.money(unit_price)),
+            ('Total', self.money(sale['total_price'])),
+            ('Payment', sale['payment_method'] or '-'),
+            ('Customer', sale['customer_name'] or '-'),
+            ('Contact', sale['customer_contact'] or '-'),
+        ]
+
+    def qr_payload(self, sale):
+        # Lets a scanned receipt be matched back to its sale
+        timestamp = sale['timestamp'].isoformat(timespec='seconds') if sale['timestamp'] else ''
+        return f"RECEIPT:{sale['id']}|{timestamp}|{sale['total_price']:.2f}"
+
+    def barcode_value(self, sale):
+        return f"S{sale['id']:08d}"
+
+    def _draw_static(self, pdf):
+        y = 750
+        logo = self.logo()
+        if logo is not None:
+            width, height = logo.getSize()
+            scale = min(LOGO_SIZE[0] / width, LOGO_SIZE[1] / height)
+            pdf.drawImage(logo, 450, 720, width * scale, height * scale, mask='auto')
+        pdf.setFont('Helvetica-Bold', 16)
+        pdf.drawString(50, y, self.title)
+        pdf.setFont('Helvetica', 10)
+        for line in self.header_lines:
+            y -= 14
+            pdf.drawString(50, y, line)
+        y = 120
+        for line in self.footer_lines:
+            pdf.drawString(50, y, line)
+            y -= 14
+
+    def render(self, sales):
+        # One page per sale; returns the PDF bytes
+        from reportlab.lib.pagesizes import letter
+        from reportlab.pdfgen import canvas
+        buffer = io.BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=letter, pageCompression=1)
+        pdf.beginForm('static')
+        self._draw_static(pdf)
+        pdf.endForm()
+        for sale in sales:
+            pdf.doForm('static')
+            y = 680
+            for label, value in self.field_lines(sale):
+                pdf.setFont('Helvetica-Bold', 12)
+                pdf.drawString(50, y, f'{label}:')
+                pdf.setFont('Helvetica', 12)
+                pdf.drawString(150, y, value)
+                y -= 20
+            pdf.showPage()
+        pdf.save()
+        return buffer.getvalue()
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.layout = None
+        self.cache = OrderedDict()  # (layout key, sale id) -> PDF bytes
+
+
+def _state():
+    return app_state('receipts', _State)
+
+
+def layout():
+    # Rebuilt only when one of the receipt settings changes
+    values = settings.raw_values()
+    key = tuple(values[key] for key in LAYOUT_KEYS)
+    state = _state()
+    with state.lock:
+        if state.layout is None or state.layout.key != key:
+            state.layout = ReceiptLayout(values, current_app.root_path)
+        return state.layout
+
+
+def _cache_get(key):
+    state = _state()
+    with state.lock:
+        pdf = state.cache.get(key)
+        if pdf is not None:
+            state.cache.move_to_end(key)
+        return pdf
+
+
+def _cache_put(key, pdf):
+    state = _state()
+    with state.lock:
+        state.cache[key] = pdf
+        state.cache.move_to_end(key)
+        while len(state.cache) > current_app.config['RECEIPT_CACHE_SIZE']:
+            state.cache.popitem(last=False)
+
+
+def _sales_query():
+    return (
+        select(
+            Sale.id, Sale.timestamp, Sale.quantity, Sale.total_price, Sale.payment_method,
+            Sale.customer_name, Sale.customer_contact,
+            Product.name.label('product_name'), Product.unit
+        )
+        .outerjoin(Product, Sale.product_id == Product.id)
+        .order_by(Sale.timestamp, Sale.id)
+    )
+
+
+def fetch(sale_ids):
+    # Plain dicts so rendering never touches the ORM session
+    rows = []
+    for start in range(0, len(sale_ids), IN_CHUNK):
+        chunk = sale_ids[start:start + IN_CHUNK]
+        rows.extend(dict(row._mapping) for row in db.session.execute(_sales_query().where(Sale.id.in_(chunk))))
+    return rows
+
+
+def fetch_range(filters, limit):
+    # Sales matching sales_queries.parse_filters() output, oldest first
+    statement = apply_filters(_sales_query(), filters).limit(limit)
+    return [dict(row._mapping) for row in db.session.execute(statement)]
+
+
+def receipt_pdf(sale_id):
+    # Returns the PDF bytes, or None for an unknown sale
+    current = layout()
+    key = (current.key, sale_id)
+    pdf = _cache_get(key)
+    if pdf is None:
+        sales = fetch([sale_id])
+        if not sales:
+            return None
+        pdf = workers.executor('receipt').submit(current.render, sales).result()
+        _cache_put(key, pdf)
+    return pdf
+
+
+def batch_pdf(sales):
+    # All receipts as pages of one PDF
+    return workers.executor('receipt').submit(layout().render, sales).result()
+
+
+def batch_zip(sales):
+    # One PDF per receipt in a ZIP; cached receipts are reused and the rest
+    # are rendered in parallel on the pool
+    current = layout()
+    pdfs = {sale['id']: _cache_get((current.key, sale['id'])) for sale in sales}
+    pool = workers.executor('receipt')
+    futures = {sale['id']: pool.submit(current.render, [sale]) for sale in sales if pdfs[sale['id']] is None}
+    for sale_id, future in futures.items():
+        pdfs[sale_id] = future.result()
+        _cache_put((current.key, sale_id), pdfs[sale_id])
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for sale in sales:
+            archive.writestr(f"receipt_{sale['id']}.pdf", pdfs[sale['id']])
+    return buffer.getvalue()
+
+
+def prerender(sale_ids):
+    # Renders new receipts in the background so a following download is a
+    # cache hit; the worker fetches the sales in its own app context
+    app = current_app._get_current_object()
+
+    def work():
+        with app.app_context():
+            try:
+                current = layout()
+                for sale in fetch(list(sale_ids)):
+                    _cache_put((current.key, sale['id']), current.render([sale]))
+            finally:
+                db.session.remove()
+
+    workers.executor('receipt').submit(work)
+
+
+def receipt_escpos(sale_id, paper=None, qr=None):
+    # ESC/POS bytes for one sale, or None for an unknown sale
+    sales = fetch([sale_id])
+    if not sales:
+        return None
+    config = current_app.config
+    printer_layout = escpos.escpos_layout(layout(), paper or config['RECEIPT_PAPER_MM'], qr or config['RECEIPT_QR_MODE'])
+    return printer_layout.render(sales[0])
@@ -0,0 +1,63 @@
+# Reference data cache
+# Categories, suppliers and units fill the dropdowns on every catalogue page
+# but rarely change, so they are loaded once into an immutable snapshot with a
+# content-hash version. Committing a change to a Category or Supplier
+# invalidates this process's snapshot; other worker processes reload after
+# REFDATA_TTL seconds. The version doubles as the ETag for /api/reference-data.
+
+import hashlib
+import json
+import time
+from collections import namedtuple
+from flask import current_app
+from models import db, Category, Supplier
+from database import Cached, app_state, invalidate_on_commit
+
+UNITS = ('KGs', 'Grams', 'Liters', 'Milliliters', 'Pieces', 'Bales', 'Packs', 'Boxes', 'Cartons', 'Dozens', 'Meters', 'Rolls', 'Bottles', 'Bags', 'Trays')
+
+Ref = namedtuple('Ref', ['id', 'name'])
+
+
+class Snapshot:
+    def __init__(self, categories, suppliers):
+        self.loaded_at = time.monotonic()
+        self.categories = categories
+        self.suppliers = suppliers
+        self.units = UNITS
+        self.category_names = {ref.id: ref.name for ref in categories}
+        self.supplier_names = {ref.id: ref.name for ref in suppliers}
+        self.version = hashlib.sha1(json.dumps(self.to_dict(include_version=False)).encode()).hexdigest()[:16]
+
+    def to_dict(self, include_version=True):
+        data = {
+            'categories': [ref._asdict() for ref in self.categories],
+            'suppliers': [ref._asdict() for ref in self.suppliers],
+            'units': list(self.units),
+        }
+        if include_version:
+            data['version'] = self.version
+        return data
+
+
+def _state():
+    # value: the current Snapshot
+    return app_state('refdata', Cached)
+
+
+def get():
+    state = _state()
+    with state.lock:
+        if state.value is None or time.monotonic() - state.value.loaded_at >= current_app.config['REFDATA_TTL']:
+            categories = tuple(Ref(*row) for row in db.session.query(Category.id, Category.name).order_by(Category.name))
+            suppliers = tuple(Ref(*row) for row in db.session.query(Supplier.id, Supplier.name).order_by(Supplier.name))
+            state.value = Snapshot(categories, suppliers)
+        return state.value
+
+
+def invalidate():
+    state = _state()
+    with state.lock:
+        state.value = None
+
+
+invalidate_on_commit([Category, Supplier], lambda ids: invalidate())
@@ -0,0 +1,176 @@
+# Low stock and reorder suggestions
+# ReorderPoint holds one precomputed row per product: its sales velocity
+# over the last REORDER_VELOCITY_DAYS (read from the SalesDailyProduct
+# rollup, not from Sale), the reorder point, the quantity already on order
+# and a suggested order quantity. refresh() recomputes the rows of the given
+# products with one grouped SELECT and one executemany upsert per chunk, in
+# the caller's transaction, so checkout and product edits keep the table
+# current as they commit; `flask refresh-reorder` recomputes every product
+# (run it daily so velocities of products that stopped selling decay).
+#
+#   reorder point  = max(low_stock_threshold, velocity * (lead + safety days))
+#   order up to    = reorder point + velocity * cover days
+#   suggested qty  = order up to - stock - quantity on order
+#
+# A product needs reordering when its stock is below its reorder point, so
+# with no sales history this is the plain low_stock_threshold check.
+
+import math
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import joinedload
+from models import db, Product, ReorderPoint, SalesDailyProduct, SupplierOrder
+from database import IN_CHUNK
+from rollups import _upsert
+import settings
+
+OPEN_STATUSES = ('Draft', 'Pending')
+COLUMNS = ['supplier_id', 'stock', 'on_order', 'daily_velocity', 'reorder_point', 'suggested_quantity', 'needs_reorder', 'updated_at']
+
+
+def _rows(ids, threshold, config, now):
+    window = config['REORDER_VELOCITY_DAYS']
+    since = now.date() - timedelta(days=window - 1)
+    sold = select(
+        SalesDailyProduct.product_id, func.sum(SalesDailyProduct.quantity).label('quantity')
+    ).where(SalesDailyProduct.day >= since)
+    on_order = select(
+        SupplierOrder.product_id, func.sum(SupplierOrder.quantity).label('quantity')
+    ).where(SupplierOrder.status.in_(OPEN_STATUSES))
+    if ids is not None:
+        sold = sold.where(SalesDailyProduct.product_id.in_(ids))
+        on_order = on_order.where(SupplierOrder.product_id.in_(ids))
+    sold = sold.group_by(SalesDailyProduct.product_id).subquery()
+    on_order = on_order.group_by(SupplierOrder.product_id).subquery()
+    query = select(
+        Product.id, Product.supplier_id, Product.stock,
+        func.coalesce(sold.c.quantity, 0), func.coalesce(on_order.c.quantity, 0)
+    ).outerjoin(sold, sold.c.product_id == Product.id).outerjoin(on_order, on_order.c.product_id == Product.id)
+    if ids is not None:
+        query = query.where(Product.id.in_(ids))
+
+    lead = config['REORDER_LEAD_DAYS'] + config['REORDER_SAFETY_DAYS']
+    cover = config['REORDER_COVER_DAYS']
+    rows = []
+    for product_id, supplier_id, stock, quantity_sold, quantity_on_order in db.session.execute(query):
+        velocity = quantity_sold / window
+        reorder_point = max(threshold, math.ceil(velocity * lead))
+        needs_reorder = stock < reorder_point
+        order_up_to = reorder_point + math.ceil(velocity * cover)
+        rows.append({
+            'product_id': product_id,
+            'supplier_id': supplier_id,
+            'stock': stock,
+            'on_order': quantity_on_order,
+            'daily_velocity': velocity,
+            'reorder_point': reorder_point,
+            'suggested_quantity': max(0, order_up_to - stock - quantity_on_order) if needs_reorder else 0,
+            'needs_reorder': needs_reorder,
+            'updated_at': now,
+        })
+    return rows
+
+
+def _write(rows):
+    stmt = _upsert(ReorderPoint)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['product_id'],
+        set_={column: stmt.excluded[column] for column in COLUMNS}
+    ), rows)
+
+
+def refresh(product_ids=None):
+    # Recomputes the rows of product_ids (every product when None) without
+    # committing; returns the number of rows written
+    config = current_app.config
+    threshold = settings.get('low_stock_threshold')
+    now = datetime.utcnow()
+    if product_ids is None:
+        db.session.execute(delete(ReorderPoint).where(ReorderPoint.product_id.notin_(select(Product.id))))
+        chunks = [None]
+    else:
+        ids = sorted({int(pid) for pid in product_ids})
+        chunks = [ids[start:start + IN_CHUNK] for start in range(0, len(ids), IN_CHUNK)]
+    written = 0
+    for chunk in chunks:
+        rows = _rows(chunk, threshold, config, now)
+        if rows:
+            _write(rows)
+        written += len(rows)
+    return written
+
+
+def remove(product_ids):
+    # Call before deleting the products themselves
+    ids = sorted({int(pid) for pid in product_ids})
+    for start in range(0, len(ids), IN_CHUNK):
+        db.session.execute(delete(ReorderPoint).where(ReorderPoint.product_id.in_(ids[start:start + IN_CHUNK])))
+
+
+def backfill(session):
+    # Migration step: fill the table for databases that predate it
+    refresh()
+
+
+def low_stock_count():
+    # Served by ix_reorder_point_needs_reorder_supplier_id
+    return db.session.query(func.count()).select_from(ReorderPoint).filter(ReorderPoint.needs_reorder.is_(True)).scalar()
+
+
+def suggestions():
+    # [(Supplier or None, [ReorderPoint, ...]), ...] for every product that
+    # needs reordering, grouped by supplier
+    rows = ReorderPoint.query.options(
+        joinedload(ReorderPoint.product), joinedload(ReorderPoint.supplier)
+    ).filter(ReorderPoint.needs_reorder.is_(True)).order_by(ReorderPoint.supplier_id, ReorderPoint.product_id).all()
+    groups = []
+    for row in rows:
+        if not groups or groups[-1][0] is not row.supplier:
+            groups.append((row.supplier, []))
+        groups[-1][1].append(row)
+    return groups
+
+
+def create_drafts(supplier_ids=None):
+    # Adds one Draft SupplierOrder per product with a suggested quantity and
+    # a supplier, priced at the product's buying price, and commits; returns
+    # {supplier_id: number of orders}. The supplier is read from Product, not
+    # from the copy in ReorderPoint, in case a write path missed a refresh.
+    query = select(
+        ReorderPoint.product_id, Product.supplier_id, ReorderPoint.suggested_quantity, Product.buying_price
+    ).join(Product, Product.id == ReorderPoint.product_id).where(
+        ReorderPoint.needs_reorder.is_(True),
+        ReorderPoint.suggested_quantity > 0,
+        Product.supplier_id.isnot(None)
+    ).order_by(Product.supplier_id, ReorderPoint.product_id)
+    if supplier_ids is not None:
+        query = query.where(Product.supplier_id.in_(list(supplier_ids)))
+    orders = [
+        {
+            'supplier_id': supplier_id,
+            'product_id': product_id,
+            'quantity': quantity,
+            'cost': round((buying_price or 0) * quantity, 2),
+            'status': 'Draft',
+        }
+        for product_id, supplier_id, quantity, buying_price in db.session.execute(query)
+    ]
+    created = {}
+    if orders:
+        db.session.execute(insert(SupplierOrder), orders)
+        refresh([order['product_id'] for order in orders])
+        for order in orders:
+            created[order['supplier_id']] = created.get(order['supplier_id'], 0) + 1
+    db.session.commit()
+    return created
+
+
+def place_drafts(supplier_id):
+    # Draft -> Pending for one supplier; returns the number of orders placed
+    placed = db.session.execute(
+        update(SupplierOrder).where(SupplierOrder.supplier_id == supplier_id, SupplierOrder.status == 'Draft').values(status='Pending'),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    db.session.commit()
+    return placed
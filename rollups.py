@@ -0,0 +1,134 @@
+# Sales rollup tables
+# SalesDailyProduct and SalesMonthlyPayment summarise the Sale table so the
+# analytic pages read a few hundred summary rows instead of every sale.
+# record_sale() must run in the same transaction as the Sale insert;
+# rebuild() recomputes both tables from existing sales, and backfill() does
+# so from a migration when they are out of step with the Sale table.
+
+from datetime import datetime
+from sqlalchemy import func, desc, delete, select, insert
+from models import db, Product, Sale, SalesDailyProduct, SalesMonthlyPayment
+from database import month_key
+
+
+def _upsert(model):
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(model)
+
+
+def record_sale(sale):
+    # Call before committing the session that adds `sale`
+    if sale.timestamp is None:
+        sale.timestamp = datetime.utcnow()
+    profit = sale.profit or 0
+
+    stmt = _upsert(SalesDailyProduct).values(
+        day=sale.timestamp.date(),
+        product_id=sale.product_id,
+        quantity=sale.quantity,
+        revenue=sale.total_price,
+        profit=profit,
+        sale_count=1
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['day', 'product_id'],
+        set_={
+            'quantity': SalesDailyProduct.quantity + stmt.excluded.quantity,
+            'revenue': SalesDailyProduct.revenue + stmt.excluded.revenue,
+            'profit': SalesDailyProduct.profit + stmt.excluded.profit,
+            'sale_count': SalesDailyProduct.sale_count + 1,
+        }
+    ))
+
+    stmt = _upsert(SalesMonthlyPayment).values(
+        month=sale.timestamp.strftime('%Y-%m'),
+        payment_method=sale.payment_method,
+        revenue=sale.total_price,
+        sale_count=1
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['month', 'payment_method'],
+        set_={
+            'revenue': SalesMonthlyPayment.revenue + stmt.excluded.revenue,
+            'sale_count': SalesMonthlyPayment.sale_count + 1,
+        }
+    ))
+
+
+def rebuild():
+    # Recompute both rollup tables from the Sale table in one transaction
+    db.session.execute(delete(SalesDailyProduct))
+    db.session.execute(delete(SalesMonthlyPayment))
+
+    day = func.date(Sale.timestamp)
+    db.session.execute(insert(SalesDailyProduct).from_select(
+        ['day', 'product_id', 'quantity', 'revenue', 'profit', 'sale_count'],
+        select(
+            day,
+            Sale.product_id,
+            func.sum(Sale.quantity),
+            func.sum(Sale.total_price),
+            func.coalesce(func.sum(Sale.profit), 0),
+            func.count(Sale.id)
+        ).where(Sale.timestamp.isnot(None)).group_by(day, Sale.product_id)
+    ))
+
+    month = month_key(Sale.timestamp)
+    db.session.execute(insert(SalesMonthlyPayment).from_select(
+        ['month', 'payment_method', 'revenue', 'sale_count'],
+        select(
+            month,
+            Sale.payment_method,
+            func.sum(Sale.total_price),
+            func.count(Sale.id)
+        ).where(Sale.timestamp.isnot(None)).group_by(month, Sale.payment_method)
+    ))
+    db.session.commit()
+    return (
+        db.session.query(func.count()).select_from(SalesDailyProduct).scalar(),
+        db.session.query(func.count()).select_from(SalesMonthlyPayment).scalar(),
+    )
+
+
+def backfill(session):
+    # Migration step: rebuild when the rollups do not account for every sale,
+    # as in a database that had sales before the rollup tables existed
+    summarised = session.query(func.coalesce(func.sum(SalesMonthlyPayment.sale_count), 0)).scalar()
+    sales = session.query(func.count(Sale.id)).filter(Sale.timestamp.isnot(None)).scalar()
+    if summarised != sales:
+        rebuild()
+
+
+# Readers used by the dashboard and the sales list
+
+def total_revenue():
+    return db.session.query(func.sum(SalesMonthlyPayment.revenue)).scalar() or 0
+
+
+def revenue_by_month():
+    return db.session.query(
+        SalesMonthlyPayment.month,
+        func.sum(SalesMonthlyPayment.revenue)
+    ).group_by(SalesMonthlyPayment.month).order_by(SalesMonthlyPayment.month).all()
+
+
+def revenue_by_payment_method():
+    return db.session.query(
+        SalesMonthlyPayment.payment_method,
+        func.sum(SalesMonthlyPayment.revenue)
+    ).group_by(SalesMonthlyPayment.payment_method).all()
+
+
+def payment_methods():
+    return [row[0] for row in db.session.query(SalesMonthlyPayment.payment_method).distinct().order_by(SalesMonthlyPayment.payment_method)]
+
+
+def best_products(limit=5):
+    return db.session.query(
+        Product.name,
+        func.sum(SalesDailyProduct.quantity).label('total_sold'),
+        func.sum(SalesDailyProduct.revenue).label('total_revenue')
+    ).join(SalesDailyProduct, SalesDailyProduct.product_id == Product.id).group_by(Product.id).order_by(desc('total_sold')).limit(limit).all()
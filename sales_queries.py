@@ -0,0 +1,118 @@
+# Keyset pagination over sales
+# Sales are listed newest first and paged on (timestamp, id), so each page is
+# an index range scan no matter how deep the user scrolls. iter_sales() walks
+# every matching sale in fixed-size pages for streamed pages and exports.
+
+import base64
+from datetime import datetime, date, time, timedelta
+from sqlalchemy import String, tuple_, type_coerce
+from models import db, Product, Sale
+
+PAGE_SIZE = 50
+STREAM_BATCH_SIZE = 500
+
+
+def _is_sqlite():
+    return db.session.get_bind().dialect.name == 'sqlite'
+
+
+def _sort_timestamp():
+    # SQLite keeps DATETIME as text, and rows written by the server default
+    # have no microseconds while SQLAlchemy-written rows do. Compare the raw
+    # text there so cursors and date bounds match the index order exactly.
+    if _is_sqlite():
+        return type_coerce(Sale.timestamp, String)
+    return Sale.timestamp
+
+
+def _day_bound(day):
+    if _is_sqlite():
+        return day.isoformat()
+    return datetime.combine(day, time.min)
+
+
+def parse_filters(args):
+    def parse_date(value):
+        try:
+            return date.fromisoformat(value) if value else None
+        except ValueError:
+            return None
+    return {
+        'start': parse_date(args.get('start', '')),
+        'end': parse_date(args.get('end', '')),
+        'payment_method': args.get('payment_method', '') or None,
+    }
+
+
+def encode_cursor(sort_ts, sale_id):
+    raw = f'{sort_ts}|{sale_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        sort_ts, sale_id = raw.rsplit('|', 1)
+        if not _is_sqlite():
+            sort_ts = datetime.fromisoformat(sort_ts)
+        return sort_ts, int(sale_id)
+    except ValueError:
+        return None
+
+
+def sales_query(filters):
+    sort_ts = _sort_timestamp()
+    query = db.session.query(
+        Sale.id,
+        Sale.timestamp,
+        sort_ts.label('sort_ts'),
+        Sale.quantity,
+        Sale.total_price,
+        Sale.payment_method,
+        Sale.customer_name,
+        Sale.customer_contact,
+        Product.name.label('product_name')
+    ).join(Product, Sale.product_id == Product.id)
+    return apply_filters(query, filters).order_by(Sale.timestamp.desc(), Sale.id.desc())
+
+
+def apply_filters(query, filters):
+    # Works on both Query and select(); the end date is inclusive
+    sort_ts = _sort_timestamp()
+    if filters.get('start'):
+        query = query.filter(sort_ts >= _day_bound(filters['start']))
+    if filters.get('end'):
+        query = query.filter(sort_ts < _day_bound(filters['end'] + timedelta(days=1)))
+    if filters.get('payment_method'):
+        query = query.filter(Sale.payment_method == filters['payment_method'])
+    return query
+
+
+def _after(query, position):
+    if position:
+        query = query.filter(tuple_(_sort_timestamp(), Sale.id) < tuple_(*position))
+    return query
+
+
+def sales_page(filters, cursor=None, limit=PAGE_SIZE):
+    # Returns (rows, next_cursor); next_cursor is None on the last page
+    query = _after(sales_query(filters), decode_cursor(cursor))
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].sort_ts, rows[-1].id)
+    return rows, next_cursor
+
+
+def iter_sales(filters, batch_size=STREAM_BATCH_SIZE):
+    # Only one batch is held in memory at a time
+    position = None
+    while True:
+        rows = _after(sales_query(filters), position).limit(batch_size).all()
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        position = (rows[-1].sort_ts, rows[-1].id)
@@ -0,0 +1,193 @@
+# Sales pages: the till, the checkout API, the sales list and export, and
+# receipts (PDF, ESC/POS and batches)
+
+import time
+from io import BytesIO
+from flask import Blueprint, current_app, request, render_template, url_for, flash, Response, stream_template, jsonify, abort, send_file
+from models import db
+from auth import login_required
+from checkout import checkout, CheckoutError
+from stock import run_with_retry
+from sales_queries import parse_filters, sales_page, iter_sales
+import audit
+import escpos
+import exports
+import product_model
+import receipts
+import rollups
+import settings
+
+bp = Blueprint('sales', __name__)
+
+def audit_sales(lines, payment_method):
+    for line in lines:
+        audit.log(f"Sale #{line['sale_id']}: {line['quantity']} x {line['name']} = {line['total_price']:.2f} ({payment_method})")
+
+@bp.route('/sales', methods=['GET', 'POST'])
+@login_required()
+def make_sale():
+    payment_methods = settings.get('payment_methods')
+
+    def render(**extra):
+        # Read after the sale so the page shows the new stock levels
+        return render_template('make_sale.html', products=product_model.get().all(), payment_methods=payment_methods, **extra)
+
+    if request.method == 'POST':
+        product_id = request.form['product_id']
+        quantity = int(request.form['quantity'])
+        payment_method = request.form['payment_method']
+        customer_name = request.form.get('customer_name', '')
+        customer_contact = request.form.get('customer_contact', '')
+        try:
+            lines = run_with_retry(lambda: checkout(
+                [{'product_id': product_id, 'quantity': quantity}],
+                payment_method,
+                customer_name=customer_name,
+                customer_contact=customer_contact
+            ))
+        except CheckoutError as e:
+            db.session.rollback()
+            flash(e.message, 'danger')
+            return render()
+        receipts.prerender([line['sale_id'] for line in lines])
+        audit_sales(lines, payment_method)
+        line = lines[0]
+        # Generate receipt data for preview (could be extended for PDF/print)
+        receipt = {
+            'product': line['name'],
+            'quantity': quantity,
+            'total': line['total_price'],
+            'customer': customer_name,
+            'contact': customer_contact,
+            'payment_method': payment_method,
+            'sale_id': line['sale_id']
+        }
+        flash('Sale completed successfully!', 'success')
+        return render(receipt=receipt)
+    return render()
+
+@bp.route('/api/checkout', methods=['POST'])
+@login_required()
+def api_checkout():
+    data = request.get_json(silent=True) or {}
+    try:
+        lines = run_with_retry(lambda: checkout(
+            data.get('items'),
+            data.get('payment_method', ''),
+            customer_name=data.get('customer_name', ''),
+            customer_contact=data.get('customer_contact', '')
+        ))
+    except CheckoutError as e:
+        db.session.rollback()
+        return jsonify(e.to_dict()), e.status
+    receipts.prerender([line['sale_id'] for line in lines])
+    audit_sales(lines, data.get('payment_method', ''))
+    for line in lines:
+        line['receipt_url'] = url_for('sales.download_receipt', sale_id=line['sale_id'])
+    return jsonify({
+        'sales': lines,
+        'total': sum(line['total_price'] for line in lines)
+    }), 201
+
+@bp.route('/sales/list')
+@login_required(role='admin')
+def sales_list():
+    filters = parse_filters(request.args)
+    filter_args = {key: request.args[key] for key in ('start', 'end', 'payment_method') if request.args.get(key)}
+    stream_all = request.args.get('all') == '1'
+
+    # One keyset page by default; ?all=1 streams every matching sale
+    if stream_all:
+        sales, next_cursor = iter_sales(filters), None
+    else:
+        sales, next_cursor = sales_page(filters, request.args.get('cursor'))
+
+    # Best performing products and totals come from the sales rollups
+    best_products = rollups.best_products(limit=5)
+    total_sales = rollups.total_revenue()
+
+    context = dict(
+        sales=sales,
+        best_products=best_products,
+        total_sales=total_sales,
+        filters=filter_args,
+        payment_methods=rollups.payment_methods(),
+        next_cursor=next_cursor,
+        stream_all=stream_all
+    )
+    if stream_all:
+        return Response(stream_template('sales_list.html', **context))
+    return render_template('sales_list.html', **context)
+
+@bp.route('/sales/export')
+@login_required(role='admin')
+def export_sales():
+    filters = parse_filters(request.args)
+    header = ['id', 'timestamp', 'product', 'quantity', 'total_price', 'payment_method', 'customer_name', 'customer_contact']
+    rows = (
+        (sale.id, sale.timestamp, sale.product_name, sale.quantity, sale.total_price, sale.payment_method, sale.customer_name, sale.customer_contact)
+        for sale in iter_sales(filters)
+    )
+    return exports.csv_response('sales.csv', header, rows, gzip=request.args.get('gzip') == '1')
+
+@bp.route('/download_receipt/<int:sale_id>')
+@login_required()
+def download_receipt(sale_id):
+    pdf = receipts.receipt_pdf(sale_id)
+    if pdf is None:
+        abort(404)
+    return send_file(BytesIO(pdf), as_attachment=True, download_name=f"receipt_{sale_id}.pdf", mimetype='application/pdf')
+
+@bp.route('/receipts/<int:sale_id>/escpos')
+@login_required()
+def receipt_escpos(sale_id):
+    # ?paper=58 for narrow rolls; the body is raw printer bytes
+    try:
+        data = receipts.receipt_escpos(sale_id, paper=request.args.get('paper', type=int), qr=request.args.get('qr'))
+    except ValueError as e:
+        return str(e), 400
+    if data is None:
+        abort(404)
+    return send_file(BytesIO(data), as_attachment=True, download_name=f'receipt_{sale_id}.bin', mimetype='application/octet-stream')
+
+@bp.route('/receipts/<int:sale_id>/print', methods=['POST'])
+@login_required()
+def print_receipt(sale_id):
+    target = current_app.config['RECEIPT_PRINTER']
+    if not target:
+        return jsonify({'error': 'No receipt printer is configured.'}), 503
+    try:
+        data = receipts.receipt_escpos(sale_id)
+    except ValueError as e:
+        # An unsupported RECEIPT_PAPER_MM
+        return jsonify({'error': str(e)}), 503
+    if data is None:
+        return jsonify({'error': 'Unknown sale.'}), 404
+    try:
+        escpos.send(target, f'receipt_{sale_id}.bin', data)
+    except OSError as e:
+        return jsonify({'error': f'Printer unavailable: {e}'}), 502
+    return jsonify({'sale_id': sale_id, 'bytes': len(data)})
+
+@bp.route('/receipts/batch')
+@login_required(role='admin')
+def batch_receipts():
+    # e.g. /receipts/batch?start=2024-05-01&end=2024-05-01&format=zip
+    filters = parse_filters(request.args)
+    if not filters['start'] and not filters['end']:
+        return 'start or end date is required', 400
+    limit = current_app.config['RECEIPT_BATCH_LIMIT']
+    sales = receipts.fetch_range(filters, limit + 1)
+    if not sales:
+        return 'No sales in this date range', 404
+    if len(sales) > limit:
+        return f'More than {limit} receipts in this range; narrow the dates', 400
+    started = time.perf_counter()
+    name = f"receipts_{filters['start'] or ''}_{filters['end'] or ''}"
+    if request.args.get('format') == 'zip':
+        response = send_file(BytesIO(receipts.batch_zip(sales)), as_attachment=True, download_name=f'{name}.zip', mimetype='application/zip')
+    else:
+        response = send_file(BytesIO(receipts.batch_pdf(sales)), as_attachment=True, download_name=f'{name}.pdf', mimetype='application/pdf')
+    seconds = time.perf_counter() - started
+    current_app.logger.info('Rendered %d receipts in %.2fs (%.0f receipts/s)', len(sales), seconds, len(sales) / max(seconds, 1e-9))
+    return response
@@ -0,0 +1,224 @@
+# Product search
+# On SQLite builds with FTS5 products are indexed in the product_fts virtual
+# table (created by migration 2); elsewhere an in-process inverted index is
+# used, one per app. Both match every search term as a prefix and rank name
+# hits above barcode hits above description hits. A term that is an exact
+# barcode skips full-text search and goes straight to the ix_product_barcode
+# index.
+#
+# Write paths call index_products()/remove_products() before committing.
+
+import bisect
+import re
+import threading
+import time
+from flask import current_app
+from sqlalchemy import text, bindparam
+from models import db, Product
+from database import IN_CHUNK, app_state
+
+# Column weights used for ranking: name, barcode, description
+WEIGHTS = (10.0, 5.0, 1.0)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(value):
+    return TOKEN_RE.findall((value or '').lower())
+
+
+def fts5_available(session):
+    if session.get_bind().dialect.name != 'sqlite':
+        return False
+    options = {row[0] for row in session.execute(text('PRAGMA compile_options'))}
+    return 'ENABLE_FTS5' in options
+
+
+def create_fts_table(session):
+    # Migration step: create and fill product_fts where FTS5 is available
+    if not fts5_available(session):
+        return
+    session.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(name, barcode, description, tokenize='unicode61')"
+    ))
+    session.execute(text('DELETE FROM product_fts'))
+    session.execute(text(
+        'INSERT INTO product_fts (rowid, name, barcode, description) SELECT id, name, barcode, description FROM product'
+    ))
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), IN_CHUNK):
+        yield ids[start:start + IN_CHUNK]
+
+
+class FtsBackend:
+    def index(self, ids):
+        self.remove(ids)
+        for chunk in _chunks(ids):
+            db.session.execute(text(
+                'INSERT INTO product_fts (rowid, name, barcode, description) '
+                'SELECT id, name, barcode, description FROM product WHERE id IN :ids'
+            ).bindparams(bindparam('ids', expanding=True)), {'ids': chunk})
+
+    def remove(self, ids):
+        for chunk in _chunks(ids):
+            db.session.execute(
+                text('DELETE FROM product_fts WHERE rowid IN :ids').bindparams(bindparam('ids', expanding=True)),
+                {'ids': chunk}
+            )
+
+    def rebuild(self):
+        create_fts_table(db.session)
+
+    def search(self, terms, limit=None):
+        match = ' AND '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+        # A negative LIMIT means no limit in SQLite
+        rows = db.session.execute(text(
+            'SELECT rowid FROM product_fts WHERE product_fts MATCH :match '
+            'ORDER BY bm25(product_fts, :w_name, :w_barcode, :w_description) LIMIT :limit'
+        ), {'match': match, 'w_name': WEIGHTS[0], 'w_barcode': WEIGHTS[1], 'w_description': WEIGHTS[2],
+            'limit': -1 if limit is None else limit})
+        return [row[0] for row in rows]
+
+
+class InvertedIndexBackend:
+    # token -> {product_id: score}; sorted token list for prefix lookups
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._tokens = []
+        self._docs = {}
+        self._built_at = None
+
+    def _add(self, product_id, fields):
+        tokens = set()
+        for weight, value in zip(WEIGHTS, fields):
+            for token in tokenize(value):
+                postings = self._postings.setdefault(token, {})
+                postings[product_id] = postings.get(product_id, 0) + weight
+                tokens.add(token)
+        self._docs[product_id] = tokens
+
+    def _discard(self, product_id):
+        for token in self._docs.pop(product_id, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[token]
+
+    def _fetch(self, ids=None):
+        query = db.session.query(Product.id, Product.name, Product.barcode, Product.description)
+        if ids is None:
+            return query.all()
+        return [row for chunk in _chunks(ids) for row in query.filter(Product.id.in_(chunk))]
+
+    def rebuild(self):
+        rows = self._fetch()
+        with self._lock:
+            self._postings, self._docs = {}, {}
+            for product_id, *fields in rows:
+                self._add(product_id, fields)
+            self._tokens = sorted(self._postings)
+            self._built_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        if self._built_at is None or time.monotonic() - self._built_at > current_app.config['SEARCH_INDEX_TTL']:
+            self.rebuild()
+
+    def index(self, ids):
+        if self._built_at is None:
+            return
+        rows = self._fetch(ids)
+        with self._lock:
+            for product_id in ids:
+                self._discard(int(product_id))
+            for product_id, *fields in rows:
+                self._add(product_id, fields)
+            self._tokens = sorted(self._postings)
+
+    def remove(self, ids):
+        if self._built_at is None:
+            return
+        with self._lock:
+            for product_id in ids:
+                self._discard(int(product_id))
+            self._tokens = sorted(self._postings)
+
+    def _prefix_scores(self, term):
+        scores = {}
+        start = bisect.bisect_left(self._tokens, term)
+        for token in self._tokens[start:]:
+            if not token.startswith(term):
+                break
+            for product_id, score in self._postings[token].items():
+                scores[product_id] = max(scores.get(product_id, 0), score)
+        return scores
+
+    def search(self, terms, limit=None):
+        self._ensure_fresh()
+        with self._lock:
+            totals = None
+            for term in terms:
+                scores = self._prefix_scores(term)
+                if totals is None:
+                    totals = scores
+                else:
+                    totals = {pid: totals[pid] + score for pid, score in scores.items() if pid in totals}
+                if not totals:
+                    return []
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+        return [product_id for product_id, _ in ranked[:limit]]
+
+
+_fts = FtsBackend()
+
+
+class _State:
+    def __init__(self):
+        self.fallback = InvertedIndexBackend()
+        self.fts_ready = None  # whether product_fts exists, checked on first use
+
+
+def backend():
+    state = app_state('search', _State)
+    if state.fts_ready is None:
+        state.fts_ready = db.session.get_bind().dialect.name == 'sqlite' and db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_fts'")
+        ).first() is not None
+    return _fts if state.fts_ready else state.fallback
+
+
+def index_products(ids):
+    ids = [int(pid) for pid in ids]
+    if ids:
+        db.session.flush()
+        backend().index(ids)
+
+
+def remove_products(ids):
+    ids = [int(pid) for pid in ids]
+    if ids:
+        backend().remove(ids)
+
+
+def rebuild():
+    backend().rebuild()
+
+
+def search_products(term, limit=None):
+    # Returns matching product ids, best match first; every match unless a
+    # limit is given, since the products page filters and pages this list
+    term = (term or '').strip()
+    if not term:
+        return []
+    exact = [row[0] for row in db.session.query(Product.id).filter(Product.barcode == term)]
+    if exact:
+        return exact
+    terms = tokenize(term)
+    if not terms:
+        return []
+    return backend().search(terms, limit)
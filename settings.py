@@ -0,0 +1,116 @@
+# Application settings
+# Every Setting row is read with one query into a typed in-process cache.
+# Defaults are declared once in SETTINGS and are only written to the database
+# when an admin saves a value, so reading settings never commits. Committing
+# a change to any Setting row invalidates this process's cache; other worker
+# processes pick the change up within SETTINGS_TTL seconds.
+
+import time
+from flask import current_app
+from models import db, Setting
+from database import Cached, app_state, invalidate_on_commit
+
+
+def _text(value):
+    return value
+
+
+def _int(value):
+    number = int(value)
+    if number < 0:
+        raise ValueError('cannot be negative')
+    return number
+
+
+def _list(value):
+    items = [item.strip() for item in value.split(',') if item.strip()]
+    if not items:
+        raise ValueError('needs at least one comma-separated entry')
+    return items
+
+
+def _yes_no(value):
+    if value not in ('yes', 'no'):
+        raise ValueError("must be 'yes' or 'no'")
+    return value == 'yes'
+
+
+# key -> (default as stored, parser)
+SETTINGS = {
+    'business_name': ('', _text),
+    'business_address': ('', _text),
+    'business_email': ('', _text),
+    'business_phone': ('', _text),
+    'business_logo': ('', _text),
+    'bank_name': ('', _text),
+    'bank_account_name': ('', _text),
+    'bank_account_number': ('', _text),
+    'tax_id': ('', _text),
+    'currency_symbol': ('KES', _text),
+    'receipt_footer': ('', _text),
+    'date_format': ('%Y-%m-%d %H:%M:%S', _text),
+    'low_stock_threshold': ('5', _int),
+    'payment_methods': ('Cash,Mpesa,Other', _list),
+    'password_policy': ('8', _int),
+    'signup_enabled': ('yes', _yes_no),
+    'session_timeout': ('30', _int),
+}
+
+def _state():
+    # value: (loaded_at, raw values, typed values)
+    return app_state('settings', Cached)
+
+
+def _load():
+    state = _state()
+    with state.lock:
+        if state.value is not None and time.monotonic() - state.value[0] < current_app.config['SETTINGS_TTL']:
+            return state.value
+        raw = {key: default for key, (default, _) in SETTINGS.items()}
+        raw.update(db.session.query(Setting.key, Setting.value).filter(Setting.key.in_(list(SETTINGS))))
+        typed = {}
+        for key, value in raw.items():
+            default, parse = SETTINGS[key]
+            try:
+                typed[key] = parse(value or default)
+            except ValueError:
+                typed[key] = parse(default)
+        state.value = (time.monotonic(), raw, typed)
+        return state.value
+
+
+def get(key):
+    return _load()[2][key]
+
+
+def raw_values():
+    # Stored strings for every setting, with defaults filled in, for forms
+    return dict(_load()[1])
+
+
+def invalidate():
+    state = _state()
+    with state.lock:
+        state.value = None
+
+
+def update(values):
+    # values: {key: string}. Validates everything before writing anything;
+    # raises ValueError naming the first bad setting.
+    for key, value in values.items():
+        if key not in SETTINGS:
+            raise ValueError(f'Unknown setting {key!r}')
+        try:
+            SETTINGS[key][1](value)
+        except ValueError as e:
+            raise ValueError(f"Invalid value for {key.replace('_', ' ')}: {value!r} ({e})")
+    existing = {s.key: s for s in Setting.query.filter(Setting.key.in_(list(values)))}
+    for key, value in values.items():
+        if key in existing:
+            existing[key].value = value
+        else:
+            db.session.add(Setting(key=key, value=value))
+    db.session.commit()
+
+
+invalidate_on_commit([Setting], lambda ids: invalidate())
@@ -0,0 +1,145 @@
+# Settings pages: business details, inventory, sales, user & security and
+# other settings
+
+from flask import Blueprint, request, render_template, redirect, url_for, flash
+from models import db, Category
+from auth import login_required
+import audit
+import images
+import refdata
+import reorder
+import settings
+
+bp = Blueprint('settings', __name__)
+
+BUSINESS_KEYS = [
+    'business_name', 'business_address', 'business_email', 'business_phone',
+    'bank_name', 'bank_account_name', 'bank_account_number', 'tax_id', 'currency_symbol',
+    'receipt_footer', 'date_format', 'session_timeout', 'password_policy', 'signup_enabled'
+]
+
+def save_settings(form_keys, message):
+    # form_keys maps form field -> setting key; returns False after flashing an error
+    values = {key: request.form[field] for field, key in form_keys.items() if field in request.form}
+    if 'business_logo' in request.files:
+        file = request.files['business_logo']
+        if file and images.allowed_file(file.filename):
+            try:
+                values['business_logo'] = images.save_upload(file)
+            except ValueError as e:
+                flash(str(e), 'danger')
+                return False
+    before = settings.raw_values()
+    try:
+        settings.update(values)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return False
+    changed = [key for key, value in values.items() if before.get(key) != value]
+    if changed:
+        audit.log(f"Changed settings: {', '.join(changed)}")
+    if 'low_stock_threshold' in changed:
+        reorder.refresh()
+        db.session.commit()
+    flash(message, 'success')
+    return True
+
+@bp.route('/admin/settings', methods=['GET', 'POST'])
+@login_required(role='admin')
+def system_settings():
+    if request.method == 'POST':
+        form_keys = {key: key for key in BUSINESS_KEYS + ['payment_methods']}
+        form_keys['threshold'] = 'low_stock_threshold'
+        save_settings(form_keys, 'Settings updated.')
+        return redirect(url_for('settings.system_settings'))
+
+    values = settings.raw_values()
+    return render_template(
+        'system_settings.html',
+        settings={key: values[key] for key in BUSINESS_KEYS},
+        threshold=values['low_stock_threshold'],
+        payment_methods=values['payment_methods'],
+        categories=refdata.get().categories,
+        logo=values['business_logo']
+    )
+
+@bp.route('/admin/settings/overview')
+@login_required(role='admin')
+def system_settings_overview():
+    return render_template('system_settings_overview.html')
+
+@bp.route('/admin/settings/business', methods=['GET', 'POST'])
+@login_required(role='admin')
+def edit_business_details():
+    if request.method == 'POST':
+        save_settings({key: key for key in BUSINESS_KEYS}, 'Business details updated.')
+        return redirect(url_for('settings.edit_business_details'))
+
+    values = settings.raw_values()
+    return render_template('edit_business_details.html', settings=values, logo=values['business_logo'])
+
+@bp.route('/admin/settings/inventory', methods=['GET', 'POST'])
+@login_required(role='admin')
+def edit_inventory_settings():
+    if request.method == 'POST':
+        if save_settings({'threshold': 'low_stock_threshold', 'currency_symbol': 'currency_symbol'}, 'Inventory settings updated.'):
+            if 'add_category' in request.form and request.form['add_category'].strip():
+                cat = request.form['add_category'].strip()
+                if not Category.query.filter_by(name=cat).first():
+                    db.session.add(Category(name=cat))
+                    audit.log(f'Added category {cat}')
+            if 'delete_category' in request.form:
+                cat_id = int(request.form['delete_category'])
+                cat = Category.query.get(cat_id)
+                if cat:
+                    db.session.delete(cat)
+                    audit.log(f'Deleted category {cat.name}')
+            db.session.commit()
+        return redirect(url_for('settings.edit_inventory_settings'))
+
+    values = settings.raw_values()
+    return render_template(
+        'edit_inventory_settings.html',
+        threshold=values['low_stock_threshold'],
+        settings=values,
+        categories=refdata.get().categories
+    )
+
+@bp.route('/admin/settings/sales', methods=['GET', 'POST'])
+@login_required(role='admin')
+def edit_sales_settings():
+    if request.method == 'POST':
+        save_settings({'payment_methods': 'payment_methods', 'receipt_footer': 'receipt_footer'}, 'Sales settings updated.')
+        return redirect(url_for('settings.edit_sales_settings'))
+
+    values = settings.raw_values()
+    return render_template(
+        'edit_sales_settings.html',
+        payment_methods=values['payment_methods'],
+        settings=values
+    )
+
+@bp.route('/admin/settings/user-security', methods=['GET', 'POST'])
+@login_required(role='admin')
+def edit_user_security_settings():
+    if request.method == 'POST':
+        form_keys = {key: key for key in ('password_policy', 'signup_enabled', 'session_timeout')}
+        save_settings(form_keys, 'User & security settings updated.')
+        return redirect(url_for('settings.edit_user_security_settings'))
+
+    return render_template(
+        'edit_user_security_settings.html',
+        settings=settings.raw_values()
+    )
+
+@bp.route('/admin/settings/other', methods=['GET', 'POST'])
+@login_required(role='admin')
+def edit_other_settings():
+    if request.method == 'POST':
+        save_settings({'date_format': 'date_format'}, 'Other settings updated.')
+        return redirect(url_for('settings.edit_other_settings'))
+
+    return render_template(
+        'edit_other_settings.html',
+        settings=settings.raw_values()
+    )
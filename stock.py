@@ -0,0 +1,43 @@
+# Atomic stock changes
+# Stock is decremented with a single conditional UPDATE so two workers can
+# never both sell the last unit: the row only changes if enough stock is left
+# at the moment the UPDATE runs, and rowcount tells the caller whether it did.
+
+import random
+import time
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+from models import db, Product
+
+LOCK_RETRIES = 5
+LOCK_BACKOFF = 0.05  # seconds, doubled on every retry
+
+
+def decrement_stock(product_id, quantity):
+    # Returns True if the stock was decremented, False if there was not enough
+    result = db.session.execute(
+        update(Product)
+        .where(Product.id == product_id, Product.stock >= quantity)
+        .values(stock=Product.stock - quantity),
+        execution_options={'changed_ids': (product_id,)}
+    )
+    return result.rowcount == 1
+
+
+def is_lock_error(error):
+    message = str(getattr(error, 'orig', error)).lower()
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+def run_with_retry(operation, retries=LOCK_RETRIES, backoff=LOCK_BACKOFF):
+    # Runs operation(), retrying with jittered exponential backoff when SQLite
+    # reports the database as locked. operation must be safe to re-run from
+    # the start after a rollback.
+    for attempt in range(retries + 1):
+        try:
+            return operation()
+        except OperationalError as e:
+            db.session.rollback()
+            if not is_lock_error(e) or attempt == retries:
+                raise
+            time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
@@ -0,0 +1,167 @@
+# Supplier scorecards and order history
+# Totals, outstanding value, lead times and on-time rate for every supplier
+# come from one GROUP BY over supplier_order, cached in-process like
+# refdata.py: committing a change to a SupplierOrder or Supplier row,
+# including set-based writes such as reorder.py's drafts, invalidates this
+# process's scorecards, and other worker processes reload after
+# SCORECARD_TTL seconds. The dashboard's supplier widgets read the
+# same scorecards. Per-supplier pages add one grouped spend-per-month query
+# (cached the same way) and a page of orders; no page loads all of a
+# supplier's orders.
+#
+# Draft orders (see reorder.py) are proposals and are left out of purchases;
+# an order is outstanding while it is Pending, and on time when it was
+# delivered within REORDER_LEAD_DAYS of being ordered.
+
+import time
+from flask import current_app
+from sqlalchemy import case, func
+from sqlalchemy.orm import joinedload
+from models import db, Supplier, SupplierOrder
+from database import Cached, app_state, days_between, invalidate_on_commit, month_key
+ORDERS_PAGE_SIZE = 50
+OUTSTANDING_LIMIT = 20
+PURCHASE_STATUSES = ('Pending', 'Delivered')
+
+
+class Scorecard:
+    def __init__(self, supplier_id, name, orders=0, delivered_quantity=0, total_purchases=0.0,
+                 outstanding_orders=0, outstanding_value=0.0, draft_orders=0,
+                 timed_deliveries=0, on_time_deliveries=0, avg_lead_days=None, max_lead_days=None,
+                 last_order_date=None):
+        self.id = supplier_id
+        self.name = name
+        self.orders = orders
+        self.delivered_quantity = delivered_quantity
+        self.total_purchases = total_purchases
+        self.outstanding_orders = outstanding_orders
+        self.outstanding_value = outstanding_value
+        self.draft_orders = draft_orders
+        self.timed_deliveries = timed_deliveries
+        self.on_time_deliveries = on_time_deliveries
+        self.avg_lead_days = avg_lead_days
+        self.max_lead_days = max_lead_days
+        self.last_order_date = last_order_date
+
+    @property
+    def on_time_percent(self):
+        return int(self.on_time_deliveries / self.timed_deliveries * 100) if self.timed_deliveries else 0
+
+    def to_dict(self):
+        return {
+            'supplier_id': self.id,
+            'name': self.name,
+            'orders': self.orders,
+            'delivered_quantity': self.delivered_quantity,
+            'total_purchases': round(self.total_purchases, 2),
+            'outstanding_orders': self.outstanding_orders,
+            'outstanding_value': round(self.outstanding_value, 2),
+            'draft_orders': self.draft_orders,
+            'on_time_percent': self.on_time_percent,
+            'avg_lead_days': None if self.avg_lead_days is None else round(self.avg_lead_days, 2),
+            'max_lead_days': None if self.max_lead_days is None else round(self.max_lead_days, 2),
+            'last_order_date': self.last_order_date.isoformat() if self.last_order_date else None,
+        }
+
+
+def scorecard_query(on_time_days):
+    # One row per supplier with the Scorecard fields, in supplier id order
+    status = SupplierOrder.status
+    delivered = status == 'Delivered'
+    pending = status == 'Pending'
+    timed = delivered & SupplierOrder.delivery_date.isnot(None)
+    lead_days = days_between(SupplierOrder.order_date, SupplierOrder.delivery_date)
+    return db.session.query(
+        Supplier.id,
+        Supplier.name,
+        func.count(case((status != 'Draft', SupplierOrder.id))),
+        func.coalesce(func.sum(case((delivered, SupplierOrder.quantity))), 0),
+        func.coalesce(func.sum(case((status.in_(PURCHASE_STATUSES), SupplierOrder.cost))), 0),
+        func.count(case((pending, 1))),
+        func.coalesce(func.sum(case((pending, SupplierOrder.cost))), 0),
+        func.count(case((status == 'Draft', 1))),
+        func.count(case((timed, 1))),
+        func.count(case((timed & (lead_days <= on_time_days), 1))),
+        func.avg(case((timed, lead_days))),
+        func.max(case((timed, lead_days))),
+        func.max(case((status != 'Draft', SupplierOrder.order_date))),
+    ).outerjoin(SupplierOrder, SupplierOrder.supplier_id == Supplier.id).group_by(Supplier.id, Supplier.name).order_by(Supplier.id)
+
+
+def _load(on_time_days):
+    return {row[0]: Scorecard(*row) for row in scorecard_query(on_time_days)}
+
+
+class _Cache(Cached):
+    # value: (loaded_at, {supplier_id: Scorecard})
+    def __init__(self):
+        super().__init__()
+        self.spend = {}  # supplier_id -> (loaded_at, spend_by_month rows)
+
+
+def _state():
+    return app_state('supplier_analytics', _Cache)
+
+
+def scorecards():
+    # {supplier_id: Scorecard} for every supplier, in id order
+    state = _state()
+    with state.lock:
+        if state.value is None or time.monotonic() - state.value[0] >= current_app.config['SCORECARD_TTL']:
+            state.value = (time.monotonic(), _load(current_app.config['REORDER_LEAD_DAYS']))
+        return state.value[1]
+
+
+def scorecard(supplier):
+    return scorecards().get(supplier.id) or Scorecard(supplier.id, supplier.name)
+
+
+def invalidate():
+    state = _state()
+    with state.lock:
+        state.value = None
+        state.spend.clear()
+
+
+def spend_by_month(supplier_id):
+    # [(month 'YYYY-MM', orders, quantity, cost)] of Pending and Delivered
+    # orders; cached and invalidated with the scorecards
+    state = _state()
+    with state.lock:
+        cached = state.spend.get(supplier_id)
+        if cached is not None and time.monotonic() - cached[0] < current_app.config['SCORECARD_TTL']:
+            return cached[1]
+    rows = [tuple(row) for row in _spend_query(supplier_id)]
+    with state.lock:
+        state.spend[supplier_id] = (time.monotonic(), rows)
+    return rows
+
+
+def _spend_query(supplier_id):
+    month = month_key(SupplierOrder.order_date).label('month')
+    return db.session.query(
+        month,
+        func.count(SupplierOrder.id),
+        func.sum(SupplierOrder.quantity),
+        func.sum(SupplierOrder.cost),
+    ).filter(
+        SupplierOrder.supplier_id == supplier_id,
+        SupplierOrder.status.in_(PURCHASE_STATUSES)
+    ).group_by(month).order_by(month).all()
+
+
+def outstanding_orders(supplier_id, limit=OUTSTANDING_LIMIT):
+    # Oldest Pending orders first; served by ix_supplier_order_supplier_id_status
+    return SupplierOrder.query.options(joinedload(SupplierOrder.product)).filter(
+        SupplierOrder.supplier_id == supplier_id, SupplierOrder.status == 'Pending'
+    ).order_by(SupplierOrder.order_date, SupplierOrder.id).limit(limit).all()
+
+
+def orders_page(supplier_id, page, per_page=ORDERS_PAGE_SIZE):
+    # Newest first; served by ix_supplier_order_supplier_id_order_date
+    return SupplierOrder.query.options(joinedload(SupplierOrder.product)).filter(
+        SupplierOrder.supplier_id == supplier_id
+    ).order_by(SupplierOrder.order_date.desc(), SupplierOrder.id.desc()).paginate(page=page, per_page=per_page)
+
+
+invalidate_on_commit([Supplier, SupplierOrder], lambda ids: invalidate())
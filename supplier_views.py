@@ -0,0 +1,138 @@
+# Supplier pages: suppliers, their products and orders, and the supplier
+# report
+
+from flask import Blueprint, request, render_template, redirect, url_for, flash, jsonify
+from sqlalchemy import func
+from models import db, Product, Supplier, SupplierOrder
+from auth import login_required
+import reorder
+import supplier_analytics
+
+bp = Blueprint('suppliers', __name__)
+
+@bp.route('/suppliers')
+@login_required(role='admin')
+def suppliers_list():
+    suppliers = Supplier.query.all()
+    return render_template('suppliers_list.html', suppliers=suppliers)
+
+@bp.route('/suppliers/add', methods=['GET', 'POST'])
+@login_required(role='admin')
+def add_supplier():
+    if request.method == 'POST':
+        supplier = Supplier(
+            name=request.form['name'],
+            company=request.form.get('company'),
+            contact_email=request.form.get('contact_email'),
+            contact_phone=request.form.get('contact_phone'),
+            address=request.form.get('address'),
+            bank_name=request.form.get('bank_name'),
+            bank_account=request.form.get('bank_account'),
+            notes=request.form.get('notes')
+        )
+        db.session.add(supplier)
+        db.session.commit()
+        flash('Supplier added.', 'success')
+        return redirect(url_for('suppliers.suppliers_list'))
+    return render_template('add_supplier.html')
+
+@bp.route('/suppliers/edit/<int:supplier_id>', methods=['GET', 'POST'])
+@login_required(role='admin')
+def edit_supplier(supplier_id):
+    supplier = Supplier.query.get_or_404(supplier_id)
+    if request.method == 'POST':
+        supplier.name = request.form['name']
+        supplier.company = request.form.get('company')
+        supplier.contact_email = request.form.get('contact_email')
+        supplier.contact_phone = request.form.get('contact_phone')
+        supplier.address = request.form.get('address')
+        supplier.bank_name = request.form.get('bank_name')
+        supplier.bank_account = request.form.get('bank_account')
+        supplier.notes = request.form.get('notes')
+        db.session.commit()
+        flash('Supplier updated.', 'success')
+        return redirect(url_for('suppliers.suppliers_list'))
+    return render_template('edit_supplier.html', supplier=supplier)
+
+@bp.route('/suppliers/delete/<int:supplier_id>')
+@login_required(role='admin')
+def delete_supplier(supplier_id):
+    supplier = Supplier.query.get_or_404(supplier_id)
+    db.session.delete(supplier)
+    db.session.commit()
+    flash('Supplier deleted.', 'success')
+    return redirect(url_for('suppliers.suppliers_list'))
+
+@bp.route('/suppliers/<int:supplier_id>/products', methods=['GET', 'POST'])
+@login_required(role='admin')
+def supplier_products(supplier_id):
+    supplier = Supplier.query.get_or_404(supplier_id)
+    if request.method == 'POST':
+        product_id = int(request.form['product_id'])
+        product = Product.query.get(product_id)
+        if product:
+            product.supplier_id = supplier.id
+            reorder.refresh([product.id])
+            db.session.commit()
+            flash('Product linked to supplier.', 'success')
+        return redirect(url_for('suppliers.supplier_products', supplier_id=supplier.id))
+    # Only ids and names are needed for the dropdown
+    products = db.session.query(Product.id, Product.name).order_by(Product.name).all()
+    return render_template('supplier_products.html', supplier=supplier, products=products)
+
+@bp.route('/suppliers/<int:supplier_id>/orders', methods=['GET', 'POST'])
+@login_required(role='admin')
+def supplier_orders(supplier_id):
+    supplier = Supplier.query.get_or_404(supplier_id)
+    products = Product.query.filter_by(supplier_id=supplier.id).all()
+    if request.method == 'POST':
+        product_id = int(request.form['product_id'])
+        quantity = int(request.form['quantity'])
+        cost = float(request.form['cost'])
+        order = SupplierOrder(
+            supplier_id=supplier.id,
+            product_id=product_id,
+            quantity=quantity,
+            cost=cost,
+            status=request.form.get('status', 'Pending')
+        )
+        db.session.add(order)
+        db.session.flush()
+        reorder.refresh([product_id])
+        db.session.commit()
+        flash('Order recorded.', 'success')
+        return redirect(url_for('suppliers.supplier_orders', supplier_id=supplier.id))
+    orders = SupplierOrder.query.filter_by(supplier_id=supplier.id).all()
+    return render_template('supplier_orders.html', supplier=supplier, products=products, orders=orders)
+
+def render_supplier_report(supplier, endpoint, **extra):
+    # ?format=json returns the scorecard and spend per month
+    card = supplier_analytics.scorecard(supplier)
+    spend = supplier_analytics.spend_by_month(supplier.id)
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'scorecard': card.to_dict(),
+            'spend_by_month': [{'month': month, 'orders': orders, 'quantity': quantity, 'cost': cost} for month, orders, quantity, cost in spend],
+        })
+    return render_template(
+        'supplier_report.html',
+        supplier=supplier,
+        scorecard=card,
+        spend_by_month=spend,
+        outstanding_orders=supplier_analytics.outstanding_orders(supplier.id),
+        orders=supplier_analytics.orders_page(supplier.id, request.args.get('page', 1, type=int)),
+        endpoint=endpoint,
+        **extra
+    )
+
+@bp.route('/suppliers/<int:supplier_id>/report')
+@login_required(role='admin')
+def supplier_report(supplier_id):
+    return render_supplier_report(Supplier.query.get_or_404(supplier_id), 'suppliers.supplier_report')
+
+@bp.route('/suppliers/<int:supplier_id>/details')
+@login_required(role='admin')
+def supplier_details(supplier_id):
+    supplier = Supplier.query.get_or_404(supplier_id)
+    product_count = db.session.query(func.count(Product.id)).filter(Product.supplier_id == supplier.id).scalar()
+    return render_supplier_report(supplier, 'suppliers.supplier_details', product_count=product_count)
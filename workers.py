@@ -0,0 +1,21 @@
+# Background thread pools
+# One pool per kind of work, created on first use and sized from the
+# matching *_WORKERS setting (RECEIPT_WORKERS, IMAGE_WORKERS), so receipt
+# rendering that a request waits on never queues behind image resizing. The
+# pools belong to the process; work that needs the database opens its own
+# app context.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+_lock = threading.Lock()
+_pools = {}
+
+
+def executor(name):
+    with _lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = ThreadPoolExecutor(max_workers=current_app.config[f'{name.upper()}_WORKERS'], thread_name_prefix=name)
+        return pool